@@ -1,12 +1,14 @@
+import datetime
 import os
 import streamlit as st
-import tempfile
+import time
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
-from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStoreManager
-from utils.chatbot import RAGChatbot
+from utils.clients import get_answer_cache, get_ingest_queue, get_vector_store_manager
+from utils.ingest_manifest import hash_bytes
+from utils.tracing import collect_spans
+from utils.vector_store import build_filter
 
 # Load environment variables
 load_dotenv()
@@ -41,6 +43,19 @@ if "current_namespace" not in st.session_state:
 if "initialization_attempted" not in st.session_state:
     st.session_state.initialization_attempted = False
 
+if "last_trace" not in st.session_state:
+    st.session_state.last_trace = []
+
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = []
+
+if "vector_counts" not in st.session_state:
+    st.session_state.vector_counts = {}
+    st.session_state.vector_counts_at = 0.0
+
+if "ingest_active" not in st.session_state:
+    st.session_state.ingest_active = False
+
 # Pre-fill API keys from environment variables or Streamlit secrets
 if "openai_api_key" not in st.session_state:
     # Try to get from Streamlit secrets first, then fall back to env vars
@@ -75,8 +90,10 @@ if "pinecone_index_name" not in st.session_state:
 # Function to initialize the vector store manager
 def initialize_vector_store():
     try:
-        # Create the vector store manager with current session state values
-        vector_store_manager = VectorStoreManager(
+        # Get the vector store manager for the current session state values.
+        # Sessions with the same settings share one manager, and with it the
+        # API clients, caches and index connections
+        vector_store_manager = get_vector_store_manager(
             openai_api_key=st.session_state.openai_api_key,
             pinecone_api_key=st.session_state.pinecone_api_key,
             pinecone_environment=st.session_state.pinecone_environment,
@@ -102,17 +119,42 @@ def initialize_vector_store():
 
         # Store the vector store manager in session state
         st.session_state.vector_store_manager = vector_store_manager
+        st.session_state.vector_counts_at = 0.0
 
-        # Initialize the chatbot
+        # Initialize the chatbot. LangChain's chains are imported here, so
+        # the page renders before they are loaded
         try:
+            from utils.chatbot import RAGChatbot
+
             vector_store = vector_store_manager.get_vector_store()
+
+            # Opt-in cache of answers to repeated questions, shared by every
+            # session using the same index and invalidated whenever a
+            # namespace's documents change
+            answer_cache = None
+            if os.getenv("ANSWER_CACHE", "false").lower() == "true":
+                answer_cache = get_answer_cache(
+                    (
+                        vector_store_manager.backend,
+                        vector_store_manager.pinecone_index_name,
+                    ),
+                    vector_store_manager.embeddings,
+                    similarity_threshold=float(
+                        os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")
+                    ),
+                    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+                )
+                vector_store_manager.add_change_listener(answer_cache.invalidate)
+
             st.session_state.chatbot = RAGChatbot(
-                vector_store, api_key=st.session_state.openai_api_key
+                vector_store,
+                api_key=st.session_state.openai_api_key,
+                answer_cache=answer_cache,
+                lexical_index=vector_store_manager.lexical_index,
             )
 
-            # Set default namespace if available
-            st.session_state.namespaces = ["default"]
-            st.session_state.current_namespace = "default"
+            # Offer the namespaces the index already holds
+            refresh_namespaces()
 
             return True
         except Exception as e:
@@ -123,38 +165,159 @@ def initialize_vector_store():
         return False
 
 
-# Function to process uploaded files
-def process_files(files, namespace):
+# Function to list the namespaces of the index
+def refresh_namespaces():
     try:
-        # Create a temporary directory to store the uploaded files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            file_paths = []
-
-            # Save the uploaded files to the temporary directory
-            for file in files:
-                file_path = os.path.join(temp_dir, file.name)
-                with open(file_path, "wb") as f:
-                    f.write(file.getbuffer())
-                file_paths.append(file_path)
-
-            # Process the documents
-            document_processor = DocumentProcessor()
-            documents = document_processor.process_documents(file_paths)
-
-            # Add the documents to the vector store
-            st.session_state.vector_store_manager.add_documents(
-                documents, namespace=namespace
+        namespaces = st.session_state.vector_store_manager.list_namespaces()
+    except Exception as e:
+        st.warning(f"Could not list namespaces: {e}")
+        namespaces = []
+
+    # The index lists its default namespace as ""
+    st.session_state.namespaces = [name for name in namespaces if name] or ["default"]
+    if st.session_state.current_namespace not in st.session_state.namespaces:
+        st.session_state.current_namespace = (
+            "default"
+            if "default" in st.session_state.namespaces
+            else st.session_state.namespaces[0]
+        )
+
+
+def namespace_vector_counts(refresh: bool = False) -> Dict[str, int]:
+    """
+    Get the number of chunks of every namespace.
+
+    The counts come from the index stats, a round trip to Pinecone, so they
+    are kept in the session for NAMESPACE_STATS_TTL seconds instead of being
+    fetched on every rerun, e.g. for each chat message.
+
+    Args:
+        refresh: Fetch the counts even if the kept ones are recent
+
+    Returns:
+        Dict of namespace names to chunk counts
+    """
+    ttl = float(os.getenv("NAMESPACE_STATS_TTL", "60"))
+    if refresh or time.time() - st.session_state.vector_counts_at > ttl:
+        try:
+            st.session_state.vector_counts = (
+                st.session_state.vector_store_manager.namespace_stats()
             )
+        except Exception:
+            st.session_state.vector_counts = {}
+        st.session_state.vector_counts_at = time.time()
+    return st.session_state.vector_counts
+
+
+def filter_controls(namespace: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Show the metadata filter inputs of the sidebar.
+
+    Args:
+        namespace: The namespace whose files can be selected
+
+    Returns:
+        The metadata filter of the chosen conditions, or None
+    """
+    manager = st.session_state.vector_store_manager
+    sources = st.multiselect("Files", options=manager.list_sources(namespace))
+    file_types = st.multiselect("File types", options=["pdf", "txt", "csv", "md"])
+
+    pages = None
+    if st.checkbox("Limit PDF pages"):
+        first_column, last_column = st.columns(2)
+        first = first_column.number_input("From page", min_value=1, value=1)
+        last = last_column.number_input("To page", min_value=1, value=max(first, 10))
+        pages = (int(first), int(last))
+
+    ingested = st.date_input("Ingested between", value=())
+    ingested_after = ingested_before = None
+    if len(ingested) == 2:
+        start, end = ingested
+        ingested_after = datetime.datetime.combine(start, datetime.time()).timestamp()
+        ingested_before = datetime.datetime.combine(
+            end + datetime.timedelta(days=1), datetime.time()
+        ).timestamp()
+
+    return build_filter(
+        sources=sources,
+        file_types=file_types,
+        pages=pages,
+        ingested_after=ingested_after,
+        ingested_before=ingested_before,
+    )
 
-            # Add the namespace to the list if it's not already there
-            if namespace not in st.session_state.namespaces:
-                st.session_state.namespaces.append(namespace)
-                st.session_state.current_namespace = namespace
 
-            return len(documents)
+# Function to queue uploaded files for ingestion in the background
+def process_files(files, namespace):
+    try:
+        manager = st.session_state.vector_store_manager
+        uploads = []
+        skipped = 0
+
+        # Skip files this namespace already holds unchanged
+        for file in files:
+            # A view of the upload's memory, so it is never copied
+            data = file.getbuffer()
+            if manager.is_file_current(file.name, hash_bytes(data), namespace=namespace):
+                skipped += 1
+                continue
+            uploads.append((file.name, data))
+
+        if skipped:
+            st.info(f"Skipped {skipped} file(s) already ingested unchanged.")
+        if not uploads:
+            return None
+
+        # Parsing, embedding and upserting run in the job queue's workers, so
+        # this session can keep chatting and the job survives reruns
+        job_id = get_ingest_queue(manager).submit(uploads, namespace=namespace)
+        st.session_state.ingest_jobs.append(job_id)
+        return job_id
     except Exception as e:
-        st.error(f"Error processing files: {e}")
-        return 0
+        st.error(f"Error queueing files: {e}")
+        return None
+
+
+def show_ingest_jobs() -> bool:
+    """
+    Show the progress of this session's recent ingestion jobs.
+
+    Returns:
+        True if a job is still queued or running
+    """
+    queue = get_ingest_queue(st.session_state.vector_store_manager)
+    active = False
+    st.header("Ingestion Jobs")
+    for job_id in reversed(st.session_state.ingest_jobs[-5:]):
+        job = queue.status(job_id)
+        if job is None:
+            continue
+
+        files = job["files"]
+        finished = sum(f["status"] != "queued" for f in files)
+        st.progress(
+            job["progress"],
+            text=f"{job['namespace']}: {finished}/{len(files)} files, {job['status']}",
+        )
+        if job["status"] in ("queued", "running"):
+            active = True
+            if st.button("Cancel", key=f"cancel-{job_id}"):
+                queue.cancel(job_id)
+        elif (
+            job["status"] == "completed"
+            and job["namespace"] not in st.session_state.namespaces
+        ):
+            # Offer the namespace once its documents are in
+            st.session_state.namespaces.append(job["namespace"])
+            st.session_state.current_namespace = job["namespace"]
+
+        failed = [f for f in files if f["status"] == "failed"]
+        if failed:
+            with st.expander(f"{len(failed)} file(s) failed"):
+                for f in failed:
+                    st.markdown(f"**{f['file_name']}:** {f['error']}")
+    return active
 
 
 # Function to save API keys to .env file
@@ -186,11 +349,46 @@ def save_api_keys(
         return False
 
 
+def format_spans(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Turn finished tracing spans into rows of the stage timing panel.
+
+    Args:
+        spans: Span dicts collected by collect_spans
+
+    Returns:
+        List of rows with the stage, its duration and its token counts
+    """
+    rows = []
+    for span in sorted(spans, key=lambda span: span["start_time"]):
+        attributes = span["attributes"]
+        rows.append(
+            {
+                "stage": "· " * span["depth"] + span["name"],
+                "ms": round(span["duration_ms"], 1),
+                "tokens": "{}/{}".format(
+                    attributes.get("prompt_tokens", "-"),
+                    attributes.get("completion_tokens", "-"),
+                ),
+                "cache hits": attributes.get(
+                    "cache_hits", attributes.get("answer_cache_hit", "")
+                ),
+            }
+        )
+    return rows
+
+
 # Main application
 def main():
     # Check if we're in iframe mode (embedded)
     is_iframe = st.query_params.get("embedded", "false").lower() == "true"
 
+    # Debug mode shows timings such as time to first token
+    is_debug = (
+        st.query_params.get("debug", "false").lower() == "true"
+        or os.getenv("DEBUG", "false").lower() == "true"
+    )
+
     if is_iframe:
         # Simplified interface for iframe embedding
         st.markdown(
@@ -206,6 +404,15 @@ def main():
         with st.spinner("Initializing vector store..."):
             initialize_vector_store()
 
+    # Panel of per-stage timings, filled while an answer streams
+    timing_panel = None
+
+    # Metadata filter of the chunks searched for the next answer
+    chat_filter = None
+
+    # Whether ingestion jobs are running whose progress needs polling
+    active_jobs = False
+
     # Only show sidebar in full mode
     if not is_iframe:
         with st.sidebar:
@@ -263,20 +470,38 @@ def main():
                         st.error("Please initialize the vector store first!")
                         return
 
-                num_chunks = process_files(uploaded_files, namespace)
-                if num_chunks > 0:
+                if process_files(uploaded_files, namespace):
                     st.success(
-                        f"Successfully processed {len(uploaded_files)} files into {num_chunks} chunks!"
+                        "Files queued for ingestion. You can keep chatting "
+                        "while they are processed."
                     )
 
+            # Progress of the files being ingested in the background
+            if st.session_state.ingest_jobs and st.session_state.vector_store_manager:
+                active_jobs = show_ingest_jobs()
+            # The chunk counts change once the running jobs are done
+            jobs_finished = st.session_state.ingest_active and not active_jobs
+            st.session_state.ingest_active = active_jobs
+
             st.divider()
 
             # Namespace selection
             if st.session_state.namespaces:
                 st.header("Select Namespace")
+                vector_counts = {}
+                if st.session_state.vector_store_manager:
+                    refresh = st.button("Refresh Namespaces")
+                    if refresh:
+                        refresh_namespaces()
+                    vector_counts = namespace_vector_counts(refresh or jobs_finished)
                 selected_namespace = st.selectbox(
                     "Namespace",
                     options=st.session_state.namespaces,
+                    format_func=lambda name: (
+                        f"{name} ({vector_counts[name]} chunks)"
+                        if name in vector_counts
+                        else name
+                    ),
                     index=(
                         st.session_state.namespaces.index(
                             st.session_state.current_namespace
@@ -291,6 +516,11 @@ def main():
                     st.session_state.current_namespace = selected_namespace
                     st.success(f"Namespace set to {selected_namespace}")
 
+            # Narrow the search to some files, pages, types or ingest dates
+            if st.session_state.vector_store_manager:
+                with st.expander("Filters"):
+                    chat_filter = filter_controls(st.session_state.current_namespace)
+
             # Reset conversation button
             if st.session_state.chatbot:
                 if st.button("Reset Conversation"):
@@ -303,6 +533,32 @@ def main():
                 if initialize_vector_store():
                     st.success("Vector store reinitialized successfully!")
 
+            # Embedding cache statistics
+            stats = (
+                st.session_state.vector_store_manager.embedding_cache_stats()
+                if st.session_state.vector_store_manager
+                else None
+            )
+            if stats is not None:
+                with st.expander("Embedding Cache"):
+                    st.markdown(
+                        f"**Hits:** {stats['hits']} "
+                        f"(memory {stats['memory_hits']}, disk {stats['disk_hits']})"
+                    )
+                    st.markdown(f"**Misses:** {stats['misses']}")
+                    st.markdown(f"**Hit rate:** {stats['hit_rate']:.0%}")
+                    st.markdown(f"**Disk size:** {stats['disk_bytes'] / 1e6:.1f} MB")
+
+            # Per-stage latency and token counts of the last answer
+            if st.toggle(
+                "Show stage timings",
+                value=is_debug or os.getenv("TRACE_PANEL", "false").lower() == "true",
+            ):
+                st.subheader("Stage Timings")
+                timing_panel = st.empty()
+                if st.session_state.last_trace:
+                    timing_panel.table(format_spans(st.session_state.last_trace))
+
     # Main chat interface
     if not is_iframe:
         st.header("Chat")
@@ -367,23 +623,48 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Get response from chatbot
+        # Stream the response from the chatbot as tokens arrive
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chatbot.chat(
-                    prompt, namespace=st.session_state.current_namespace
+            placeholder = st.empty()
+            placeholder.markdown("Thinking...")
+            streamed_answer = ""
+            response = None
+            shown_spans = 0
+            with collect_spans() as spans:
+                for event in st.session_state.chatbot.stream_chat(
+                    prompt,
+                    namespace=st.session_state.current_namespace,
+                    filter=chat_filter,
+                ):
+                    if event["type"] == "token":
+                        streamed_answer += event["content"]
+                        placeholder.markdown(streamed_answer + "▌")
+                    else:
+                        response = event
+
+                    # Show stages as they finish, e.g. retrieval before the answer
+                    if timing_panel is not None and len(spans) != shown_spans:
+                        shown_spans = len(spans)
+                        timing_panel.table(format_spans(spans))
+
+            placeholder.markdown(response["answer"])
+            st.session_state.last_trace = list(spans)
+            if timing_panel is not None and spans:
+                timing_panel.table(format_spans(spans))
+
+            if is_debug and response["time_to_first_token"] is not None:
+                st.caption(
+                    f"Time to first token: {response['time_to_first_token']:.2f}s"
                 )
 
-                st.markdown(response["answer"])
-
-                # Display source documents (only in full mode)
-                if not is_iframe and response["source_documents"]:
-                    with st.expander("Source Documents"):
-                        for i, doc in enumerate(response["source_documents"]):
-                            st.markdown(f"**Source {i+1}:**")
-                            st.markdown(f"```\n{doc.page_content}\n```")
-                            st.markdown(f"**Metadata:** {doc.metadata}")
-                            st.divider()
+            # Display source documents (only in full mode)
+            if not is_iframe and response["source_documents"]:
+                with st.expander("Source Documents"):
+                    for i, doc in enumerate(response["source_documents"]):
+                        st.markdown(f"**Source {i+1}:**")
+                        st.markdown(f"```\n{doc.page_content}\n```")
+                        st.markdown(f"**Metadata:** {doc.metadata}")
+                        st.divider()
 
         # Add assistant message to chat history
         st.session_state.messages.append(
@@ -394,6 +675,11 @@ def main():
             }
         )
 
+    # Rerun while ingestion jobs are in progress so their progress updates
+    if active_jobs:
+        time.sleep(float(os.getenv("INGEST_POLL_INTERVAL", "1.0")))
+        st.rerun()
+
 
 if __name__ == "__main__":
     main()
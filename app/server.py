@@ -0,0 +1,308 @@
+"""
+Headless HTTP/JSON API of the RAG chatbot.
+
+Exposes chat (plain and server-sent-event streaming), ingest, ingestion job
+and namespace endpoints over RAGChatbot and VectorStoreManager. Requests are
+served concurrently by one worker process: the ingest manifest, the BM25
+index and the local vector index are loaded into its memory and written back
+on flush, so several workers would miss each other's ingests and overwrite
+each other's files. Conversation histories live in a session store outside
+process memory, so they survive restarts:
+
+    python main.py serve
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from utils.async_utils import get_executor, run_blocking
+from utils.clients import (
+    get_answer_cache,
+    get_ingest_queue,
+    get_vector_store_manager,
+    shared,
+)
+from utils.document_processor import DocumentProcessor
+from utils.ingest_manifest import hash_bytes
+from utils.session_store import create_session_store
+from utils.vector_store import build_filter
+
+load_dotenv()
+
+# Modules imported in the background at startup rather than before it
+PRELOAD_MODULES = ("utils.chatbot",)
+
+
+def preload_modules():
+    """Import the chat pipeline, which pulls in LangChain's chains and OpenAI."""
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve health checks at once; requests arriving before the preload is
+    # done wait for the modules they need
+    asyncio.get_running_loop().run_in_executor(get_executor(), preload_modules)
+    yield
+
+
+app = FastAPI(title="RAG Chatbot API", lifespan=lifespan)
+
+
+class ChatFilters(BaseModel):
+    sources: Optional[List[str]] = None
+    file_types: Optional[List[str]] = None
+    pages: Optional[Tuple[int, int]] = None
+    ingested_after: Optional[float] = None
+    ingested_before: Optional[float] = None
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    namespace: Optional[str] = None
+    filters: Optional[ChatFilters] = None
+
+    def metadata_filter(self) -> Optional[Dict[str, Any]]:
+        """Get the metadata filter of the request's filters."""
+        return build_filter(**self.filters.dict()) if self.filters else None
+
+
+def get_manager():
+    """Get the shared vector store manager configured by the environment."""
+    try:
+        manager = get_vector_store_manager(
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            pinecone_api_key=os.getenv("PINECONE_API_KEY"),
+            pinecone_environment=os.getenv("PINECONE_ENVIRONMENT"),
+            pinecone_index_name=os.getenv("PINECONE_INDEX_NAME"),
+        )
+        manager.initialize_index()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Vector store unavailable: {e}")
+    return manager
+
+
+def get_session_store():
+    """Get this worker's connection to the session store."""
+    return shared("session_store", (), create_session_store)
+
+
+def create_chatbot(manager, session_id: str):
+    """Create a chatbot holding a session's conversation history."""
+    from utils.chatbot import RAGChatbot
+
+    answer_cache = None
+    if os.getenv("ANSWER_CACHE", "false").lower() == "true":
+        answer_cache = get_answer_cache(
+            (manager.backend, manager.pinecone_index_name),
+            manager.embeddings,
+            similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        )
+        manager.add_change_listener(answer_cache.invalidate)
+
+    chatbot = RAGChatbot(
+        manager.get_vector_store(),
+        model_name=os.getenv("CHAT_MODEL", "gpt-3.5-turbo"),
+        api_key=manager.openai_api_key,
+        answer_cache=answer_cache,
+        lexical_index=manager.lexical_index,
+    )
+    state = get_session_store().load(session_id)
+    if state:
+        chatbot.restore_memory(state)
+    return chatbot
+
+
+async def save_session(session_id: str, chatbot):
+    """
+    Write a chatbot's conversation history back to the session store.
+
+    Every request restores the conversation into a new chatbot, so a summary
+    of older turns still running in the background would be lost with it and
+    redone on the next request. The save waits for it, at most
+    SESSION_SUMMARY_TIMEOUT seconds, after which the turns are stored verbatim.
+    """
+    await run_blocking(
+        chatbot.memory.wait, float(os.getenv("SESSION_SUMMARY_TIMEOUT", "30"))
+    )
+    await run_blocking(get_session_store().save, session_id, chatbot.memory_state())
+
+
+def serialize_sources(documents) -> List[Dict[str, Any]]:
+    """Convert source documents to JSON-serializable dicts."""
+    return [
+        {"content": document.page_content, "metadata": document.metadata}
+        for document in documents
+    ]
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/namespaces")
+async def namespaces():
+    manager = get_manager()
+    vector_counts = await run_blocking(manager.namespace_stats)
+    return {"namespaces": sorted(vector_counts), "vector_counts": vector_counts}
+
+
+@app.get("/sources")
+async def sources(namespace: Optional[str] = None):
+    manager = get_manager()
+    return {
+        "namespace": namespace,
+        "sources": await run_blocking(manager.list_sources, namespace),
+    }
+
+
+@app.delete("/namespaces/{namespace}")
+async def delete_namespace(namespace: str):
+    manager = get_manager()
+    result = await run_blocking(manager.delete_namespace, namespace)
+    return {"namespace": namespace, **result}
+
+
+@app.delete("/sources")
+async def delete_source(source: str, namespace: Optional[str] = None):
+    manager = get_manager()
+    result = await run_blocking(manager.delete_source, source, namespace)
+    return {"namespace": namespace, "source": source, **result}
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    manager = get_manager()
+    session_id = request.session_id or uuid.uuid4().hex
+    chatbot = await run_blocking(create_chatbot, manager, session_id)
+
+    response = await chatbot.achat(
+        request.message,
+        namespace=request.namespace,
+        filter=request.metadata_filter(),
+    )
+    await save_session(session_id, chatbot)
+
+    return {
+        "session_id": session_id,
+        "answer": response["answer"],
+        "sources": serialize_sources(response["source_documents"]),
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    manager = get_manager()
+    session_id = request.session_id or uuid.uuid4().hex
+    chatbot = await run_blocking(create_chatbot, manager, session_id)
+
+    async def events():
+        async for event in chatbot.astream_chat(
+            request.message,
+            namespace=request.namespace,
+            filter=request.metadata_filter(),
+        ):
+            if event["type"] == "token":
+                yield sse_event("token", {"content": event["content"]})
+            else:
+                await save_session(session_id, chatbot)
+                yield sse_event(
+                    "result",
+                    {
+                        "session_id": session_id,
+                        "answer": event["answer"],
+                        "sources": serialize_sources(event["source_documents"]),
+                        "time_to_first_token": event["time_to_first_token"],
+                    },
+                )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Session-Id": session_id},
+    )
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await run_blocking(get_session_store().delete, session_id)
+    return {"session_id": session_id, "deleted": True}
+
+
+@app.post("/ingest")
+async def ingest(
+    files: List[UploadFile] = File(...), namespace: Optional[str] = Form(None)
+):
+    manager = get_manager()
+    uploads = [(file.filename, await file.read()) for file in files]
+
+    def process():
+        # Skip files this namespace already holds unchanged, and parse the
+        # rest straight from memory
+        pending = [
+            (file_name, data)
+            for file_name, data in uploads
+            if not manager.is_file_current(
+                file_name, hash_bytes(data), namespace=namespace
+            )
+        ]
+        result = manager.add_document_batches(
+            DocumentProcessor().iter_chunk_batches(pending), namespace=namespace
+        )
+        return {**result, "skipped_files": len(uploads) - len(pending)}
+
+    try:
+        result = await run_blocking(process)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing files: {e}")
+    return {"namespace": namespace, **result}
+
+
+@app.post("/jobs")
+async def submit_job(
+    files: List[UploadFile] = File(...), namespace: Optional[str] = Form(None)
+):
+    manager = get_manager()
+    uploads = [(file.filename, await file.read()) for file in files]
+    queue = get_ingest_queue(manager)
+    job_id = await run_blocking(queue.submit, uploads, namespace)
+    return await run_blocking(queue.status, job_id)
+
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 20):
+    queue = get_ingest_queue(get_manager())
+    return {"jobs": await run_blocking(queue.list_jobs, limit)}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await run_blocking(get_ingest_queue(get_manager()).status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    cancelled = await run_blocking(get_ingest_queue(get_manager()).cancel, job_id)
+    return {"job_id": job_id, "cancelled": cancelled}
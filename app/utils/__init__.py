@@ -1,9 +1,58 @@
 """
 Utility modules for the RAG chatbot application.
+
+The classes below are imported from their modules on first access, so
+importing the package, or one light module of it, does not import LangChain,
+OpenAI and Pinecone.
 """
 
-from .document_processor import DocumentProcessor
-from .vector_store import VectorStoreManager
-from .chatbot import RAGChatbot
+import importlib
+
+_EXPORTS = {
+    "DocumentProcessor": ".document_processor",
+    "TokenChunker": ".chunker",
+    "ParseCache": ".parse_cache",
+    "VectorStoreManager": ".vector_store",
+    "SnapshotReader": ".snapshot",
+    "SnapshotWriter": ".snapshot",
+    "RAGChatbot": ".chatbot",
+    "CachedEmbeddings": ".embedding_cache",
+    "IngestManifest": ".ingest_manifest",
+    "BulkIngestor": ".bulk_ingest",
+    "IngestJobQueue": ".ingest_jobs",
+    "LocalVectorIndex": ".local_index",
+    "LocalVectorStore": ".local_index",
+    "TruncatedEmbeddings": ".embedding_compression",
+    "VectorQuantizer": ".embedding_compression",
+    "SemanticAnswerCache": ".answer_cache",
+    "TokenBudgetMemory": ".memory",
+    "BM25Index": ".lexical_index",
+    "HybridRetriever": ".hybrid_retriever",
+    "FanOutRetriever": ".multi_query",
+    "QueryExpander": ".multi_query",
+    "ContextPacker": ".context_packer",
+    "ContextPackingRetriever": ".context_packer",
+    "FastConversationalRetrievalChain": ".retrieval_chain",
+    "SQLiteSessionStore": ".session_store",
+    "RedisSessionStore": ".session_store",
+    "Tracer": ".tracing",
+    "TracingCallbackHandler": ".tracing",
+    "JsonLinesSink": ".tracing",
+    "OpenTelemetrySink": ".tracing",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    """Import an exported class from its module on first access."""
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ["DocumentProcessor", "VectorStoreManager", "RAGChatbot"]
+def __dir__():
+    """List the module's attributes including the exports not imported yet."""
+    return sorted(list(globals()) + __all__)
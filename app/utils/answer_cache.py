@@ -0,0 +1,207 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cache of chat answers keyed by namespace and query embedding."""
+
+    def __init__(
+        self,
+        embeddings,
+        similarity_threshold: float = 0.95,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+    ):
+        """
+        Initialize the answer cache.
+
+        Args:
+            embeddings: Embeddings model used to embed the queries
+            similarity_threshold: Minimum cosine similarity for a query to hit
+            ttl: Seconds an answer stays valid
+            max_entries: Maximum number of answers kept per namespace
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def lookup(self, query: str, namespace: Optional[str] = None) -> Optional[Dict]:
+        """
+        Find a cached answer for a query similar enough to an earlier one.
+
+        Args:
+            query: The user's query
+            namespace: The namespace the query is asked against
+
+        Returns:
+            Dict with "answer" and "source_documents", or None on a miss
+        """
+        return self._lookup_vector(
+            self._normalize(self.embeddings.embed_query(query)), namespace
+        )
+
+    async def alookup(
+        self, query: str, namespace: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Find a cached answer, embedding the query with the async client.
+
+        Args:
+            query: The user's query
+            namespace: The namespace the query is asked against
+
+        Returns:
+            Dict with "answer" and "source_documents", or None on a miss
+        """
+        return self._lookup_vector(
+            self._normalize(await self.embeddings.aembed_query(query)), namespace
+        )
+
+    def store(
+        self,
+        query: str,
+        answer: str,
+        source_documents: List,
+        namespace: Optional[str] = None,
+    ):
+        """
+        Cache the answer to a query.
+
+        Args:
+            query: The user's query
+            answer: The generated answer
+            source_documents: The documents the answer was based on
+            namespace: The namespace the query was asked against
+        """
+        self._store_vector(
+            self._normalize(self.embeddings.embed_query(query)),
+            answer,
+            source_documents,
+            namespace,
+        )
+
+    async def astore(
+        self,
+        query: str,
+        answer: str,
+        source_documents: List,
+        namespace: Optional[str] = None,
+    ):
+        """
+        Cache the answer to a query, embedding it with the async client.
+
+        Args:
+            query: The user's query
+            answer: The generated answer
+            source_documents: The documents the answer was based on
+            namespace: The namespace the query was asked against
+        """
+        self._store_vector(
+            self._normalize(await self.embeddings.aembed_query(query)),
+            answer,
+            source_documents,
+            namespace,
+        )
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """
+        Drop every cached answer of a namespace.
+
+        Args:
+            namespace: The namespace whose documents changed
+        """
+        key = namespace or ""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+            self._vectors.pop(key, None)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters of the cache.
+
+        Returns:
+            Dict with hit, miss and invalidation counters
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _lookup_vector(
+        self, vector: np.ndarray, namespace: Optional[str]
+    ) -> Optional[Dict]:
+        """Find the cached answer closest to a normalized query vector."""
+        key = namespace or ""
+        now = time.time()
+        with self._lock:
+            self._expire(key, now)
+            entries = self._entries.get(key)
+            if entries:
+                scores = self._vectors[key] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self._stats["hits"] += 1
+                    entry = entries[best]
+                    return {
+                        "answer": entry["answer"],
+                        "source_documents": entry["source_documents"],
+                    }
+            self._stats["misses"] += 1
+        return None
+
+    def _store_vector(
+        self,
+        vector: np.ndarray,
+        answer: str,
+        source_documents: List,
+        namespace: Optional[str],
+    ):
+        """Cache an answer under a normalized query vector."""
+        key = namespace or ""
+        with self._lock:
+            entries = self._entries.setdefault(key, [])
+            entries.append(
+                {
+                    "answer": answer,
+                    "source_documents": list(source_documents),
+                    "created": time.time(),
+                }
+            )
+            vectors = self._vectors.get(key)
+            self._vectors[key] = (
+                vector[None, :] if vectors is None else np.vstack([vectors, vector])
+            )
+            # Drop the oldest answers once the namespace is full
+            overflow = len(entries) - self.max_entries
+            if overflow > 0:
+                del entries[:overflow]
+                self._vectors[key] = self._vectors[key][overflow:]
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, key: str, now: float):
+        """Drop the answers of a namespace that are older than the TTL."""
+        entries = self._entries.get(key)
+        if not entries:
+            return
+        # Entries are appended in creation order, so expired ones are a prefix
+        expired = 0
+        while expired < len(entries) and now - entries[expired]["created"] > self.ttl:
+            expired += 1
+        if expired:
+            del entries[:expired]
+            self._vectors[key] = self._vectors[key][expired:]
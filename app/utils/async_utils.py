@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide thread pool for blocking calls made from async code.
+
+    Returns:
+        ThreadPoolExecutor sized by the BLOCKING_POOL_SIZE environment variable
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("BLOCKING_POOL_SIZE", "64")),
+                thread_name_prefix="rag-blocking",
+            )
+    return _executor
+
+
+async def run_blocking(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking function in the shared pool without blocking the event loop.
+
+    Args:
+        func: The blocking function
+        *args: Positional arguments for the function
+        **kwargs: Keyword arguments for the function
+
+    Returns:
+        The function's return value
+    """
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so tracing spans nest correctly
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+class AsyncSearchMixin:
+    """
+    Async similarity search for vector stores with a by-vector search method.
+
+    The query is embedded with the embeddings model's async client, and only
+    the index query itself runs in the shared thread pool.
+    """
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the documents closest to a query.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of (Document, score) tuples
+        """
+        embedding = await self._embedding.aembed_query(query)
+        return await run_blocking(
+            self.similarity_search_by_vector_with_score,
+            embedding,
+            k=k,
+            filter=filter,
+            namespace=namespace,
+        )
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        Find the documents closest to a query.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of Document objects
+        """
+        results = await self.asimilarity_search_with_score(
+            query, k=k, filter=filter, namespace=namespace
+        )
+        return [document for document, _ in results]
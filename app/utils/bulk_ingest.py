@@ -0,0 +1,481 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from .async_utils import run_blocking
+from .tracing import trace
+
+
+def count_tokens_fallback(text: str) -> int:
+    """Estimate the token count of a text at about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def default_token_counter() -> Callable[[str], int]:
+    """
+    Get a token counter matching OpenAI's embedding models.
+
+    Returns:
+        Function returning the number of tokens in a text
+    """
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return count_tokens_fallback
+
+
+def payload_size(records: List[Dict]) -> Dict[str, int]:
+    """Get the vector count and approximate float32 size of an upsert request."""
+    values = sum(len(record["values"]) for record in records)
+    return {"vectors": len(records), "payload_bytes": values * 4}
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether an error is a rate limit or a transient server error.
+
+    Args:
+        error: The exception raised by the embedding or upsert call
+
+    Returns:
+        True if the call should be retried after a backoff
+    """
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+class BulkIngestor:
+    """Batched, concurrent embedding and upsert engine for a Pinecone-style index."""
+
+    def __init__(
+        self,
+        embeddings,
+        index,
+        text_key: str = "text",
+        batch_tokens: int = 8000,
+        max_batch_size: int = 512,
+        upsert_batch_size: int = 100,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        checkpoint_dir: Optional[str] = None,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        Initialize the bulk ingestor.
+
+        Args:
+            embeddings: Embeddings model used to embed the chunks
+            index: Index with a Pinecone-compatible upsert() method
+            text_key: Metadata key the chunk text is stored under
+            batch_tokens: Maximum number of tokens per embedding request
+            max_batch_size: Maximum number of texts per embedding request
+            upsert_batch_size: Number of vectors per upsert request
+            max_concurrency: Number of embedding batches processed at the same time
+            max_retries: Attempts per request before giving up on rate limits
+            base_delay: Initial backoff delay in seconds
+            max_delay: Upper bound of the backoff delay in seconds
+            checkpoint_dir: Directory for resumable progress checkpoints
+            token_counter: Function counting the tokens of a text
+        """
+        self.embeddings = embeddings
+        self.index = index
+        self.text_key = text_key
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint_dir = checkpoint_dir
+        self.token_counter = token_counter or default_token_counter()
+
+        self._lock = threading.Lock()
+
+    def ingest(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        namespace: Optional[str] = None,
+    ) -> Dict[str, float]:
+        """
+        Embed and upsert documents with bounded concurrency and retries.
+
+        Progress is checkpointed after every upserted batch. If an ingest of
+        the same IDs into the same namespace was interrupted, the chunks it
+        already upserted are skipped.
+
+        Args:
+            documents: List of Document objects to add
+            ids: Vector IDs, one per document
+            namespace: Optional namespace for the documents
+
+        Returns:
+            Dict with counters and throughput of the ingest
+        """
+        if len(documents) != len(ids):
+            raise ValueError("Number of documents and IDs must match.")
+
+        started = time.perf_counter()
+        stats, checkpoint_path, pending = self._prepare(documents, ids, namespace)
+        self._run_concurrently(
+            (self._process_batch, batch, namespace, checkpoint_path, stats)
+            for batch in self._token_batches(pending)
+        )
+        return self._finish(stats, checkpoint_path, started)
+
+    async def aingest(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        namespace: Optional[str] = None,
+    ) -> Dict[str, float]:
+        """
+        Async counterpart of ingest, embedding with the async client.
+
+        Up to max_concurrency batches are embedded at the same time on the
+        event loop; upserts run in the shared thread pool.
+
+        Args:
+            documents: List of Document objects to add
+            ids: Vector IDs, one per document
+            namespace: Optional namespace for the documents
+
+        Returns:
+            Dict with counters and throughput of the ingest
+        """
+        if len(documents) != len(ids):
+            raise ValueError("Number of documents and IDs must match.")
+
+        started = time.perf_counter()
+        stats, checkpoint_path, pending = self._prepare(documents, ids, namespace)
+
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks = []
+        try:
+            for batch in self._token_batches(pending):
+                await slots.acquire()
+                task = asyncio.create_task(
+                    self._aprocess_batch(batch, namespace, checkpoint_path, stats)
+                )
+                task.add_done_callback(lambda _: slots.release())
+                tasks.append(task)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return self._finish(stats, checkpoint_path, started)
+
+    def upsert_vectors(
+        self, batches: Iterable[List[Dict]], namespace: Optional[str] = None
+    ) -> Dict[str, float]:
+        """
+        Upsert vectors that are already embedded, with bounded concurrency and retries.
+
+        Used to import exported namespaces, so no embedding calls are made.
+        Batches are consumed as upserts complete, so a generator reading a
+        large snapshot is never held in memory at once. Upserts are
+        idempotent, so an interrupted import can simply be run again.
+
+        Args:
+            batches: Iterable of lists of records with "id", "values" and "metadata"
+            namespace: Optional namespace for the vectors
+
+        Returns:
+            Dict with counters and throughput of the upserts
+        """
+        started = time.perf_counter()
+        stats = {"vectors": 0, "upsert_requests": 0, "retries": 0}
+        size = self.upsert_batch_size
+        self._run_concurrently(
+            (self._upsert_records, batch[start : start + size], namespace, stats)
+            for batch in batches
+            for start in range(0, len(batch), size)
+        )
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = elapsed
+        stats["vectors_per_second"] = stats["vectors"] / elapsed if elapsed else 0.0
+        return stats
+
+    def fetch_vectors(
+        self, id_batches: Iterable[List[str]], namespace: Optional[str] = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Fetch vectors by ID with bounded concurrency and retries.
+
+        Up to max_concurrency fetches run ahead of the consumer, and batches
+        are yielded in the order of their IDs.
+
+        Args:
+            id_batches: Iterable of lists of vector IDs
+            namespace: Optional namespace to fetch from
+
+        Yields:
+            Lists of records with "id", "values" and "metadata", without the
+            IDs the index does not hold
+        """
+        stats = {"retries": 0}
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            try:
+                for ids in id_batches:
+                    in_flight.append(
+                        executor.submit(
+                            contextvars.copy_context().run,
+                            self._fetch,
+                            ids,
+                            namespace,
+                            stats,
+                        )
+                    )
+                    if len(in_flight) > self.max_concurrency:
+                        yield in_flight.popleft().result()
+                while in_flight:
+                    yield in_flight.popleft().result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def _prepare(self, documents, ids, namespace):
+        """Set up the counters and skip the chunks an interrupted ingest completed."""
+        stats = {
+            "chunks": 0,
+            "skipped": 0,
+            "embedding_requests": 0,
+            "upsert_requests": 0,
+            "retries": 0,
+        }
+
+        checkpoint_path = self._checkpoint_path(ids, namespace)
+        completed = self._load_checkpoint(checkpoint_path)
+        pending = [
+            (chunk_id, document)
+            for chunk_id, document in zip(ids, documents)
+            if chunk_id not in completed
+        ]
+        stats["skipped"] = len(documents) - len(pending)
+        return stats, checkpoint_path, pending
+
+    def _finish(self, stats, checkpoint_path, started):
+        """Remove the checkpoint of a completed ingest and add throughput to the stats."""
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = elapsed
+        stats["chunks_per_second"] = stats["chunks"] / elapsed if elapsed else 0.0
+        return stats
+
+    def _token_batches(self, pending):
+        """Group (id, document) pairs into embedding batches within the token budget."""
+        batch, tokens = [], 0
+        for chunk_id, document in pending:
+            size = self.token_counter(document.page_content)
+            if batch and (
+                tokens + size > self.batch_tokens or len(batch) >= self.max_batch_size
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append((chunk_id, document))
+            tokens += size
+        if batch:
+            yield batch
+
+    def _process_batch(self, batch, namespace, checkpoint_path, stats):
+        """Embed one batch, upsert its vectors and checkpoint the IDs."""
+        texts = [document.page_content for _, document in batch]
+        with trace("ingest.batch", chunks=len(batch), chars=sum(map(len, texts))):
+            vectors = self._with_retries(
+                lambda: self.embeddings.embed_documents(texts), stats
+            )
+            self._count(stats, "embedding_requests")
+
+            records = self._records(batch, vectors)
+            for start in range(0, len(records), self.upsert_batch_size):
+                self._upsert(
+                    records[start : start + self.upsert_batch_size], namespace, stats
+                )
+
+            self._save_checkpoint(checkpoint_path, [chunk_id for chunk_id, _ in batch])
+            self._count(stats, "chunks", len(batch))
+
+    async def _aprocess_batch(self, batch, namespace, checkpoint_path, stats):
+        """Async counterpart of _process_batch."""
+        texts = [document.page_content for _, document in batch]
+        with trace("ingest.batch", chunks=len(batch), chars=sum(map(len, texts))):
+            vectors = await self._awith_retries(
+                lambda: self.embeddings.aembed_documents(texts), stats
+            )
+            self._count(stats, "embedding_requests")
+
+            records = self._records(batch, vectors)
+            for start in range(0, len(records), self.upsert_batch_size):
+                chunk = records[start : start + self.upsert_batch_size]
+                with trace("vector.upsert", **payload_size(chunk)):
+                    await self._awith_retries(
+                        lambda: run_blocking(
+                            self.index.upsert, vectors=chunk, namespace=namespace
+                        ),
+                        stats,
+                    )
+                self._count(stats, "upsert_requests")
+
+            self._save_checkpoint(checkpoint_path, [chunk_id for chunk_id, _ in batch])
+            self._count(stats, "chunks", len(batch))
+
+    def _records(self, batch, vectors) -> List[Dict]:
+        """Build Pinecone upsert records with the chunk text in the metadata."""
+        return [
+            {
+                "id": chunk_id,
+                "values": list(vector),
+                "metadata": {**document.metadata, self.text_key: document.page_content},
+            }
+            for (chunk_id, document), vector in zip(batch, vectors)
+        ]
+
+    def _upsert(self, records, namespace, stats):
+        """Upsert one batch of vectors with retries."""
+        with trace("vector.upsert", **payload_size(records)):
+            self._with_retries(
+                lambda: self.index.upsert(vectors=records, namespace=namespace), stats
+            )
+        self._count(stats, "upsert_requests")
+
+    def _upsert_records(self, records, namespace, stats):
+        """Upsert one batch of embedded vectors and count them."""
+        self._upsert(records, namespace, stats)
+        self._count(stats, "vectors", len(records))
+
+    def _fetch(self, ids, namespace, stats) -> List[Dict]:
+        """Fetch one batch of vectors with retries, in the order of the IDs."""
+        with trace("vector.fetch", vectors=len(ids)):
+            response = self._with_retries(
+                lambda: self.index.fetch(ids=ids, namespace=namespace), stats
+            )
+        vectors = response["vectors"]
+        return [
+            {
+                "id": vector_id,
+                "values": vectors[vector_id]["values"],
+                "metadata": vectors[vector_id].get("metadata") or {},
+            }
+            for vector_id in ids
+            if vector_id in vectors
+        ]
+
+    def _run_concurrently(self, calls):
+        """Run (function, *args) calls in a thread pool and raise the first error."""
+        # Bound the number of calls in flight so a large ingest applies
+        # backpressure instead of queueing every batch in memory
+        slots = threading.BoundedSemaphore(self.max_concurrency * 2)
+        failed = threading.Event()
+
+        def on_done(future):
+            slots.release()
+            if not future.cancelled() and future.exception():
+                failed.set()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for function, *args in calls:
+                slots.acquire()
+                # Stop submitting as soon as a call has failed for good
+                if failed.is_set():
+                    slots.release()
+                    break
+                future = executor.submit(contextvars.copy_context().run, function, *args)
+                future.add_done_callback(on_done)
+                futures.append(future)
+
+            if failed.is_set():
+                for future in futures:
+                    future.cancel()
+
+        errors = [f.exception() for f in futures if not f.cancelled() and f.exception()]
+        if errors:
+            raise errors[0]
+
+    def _with_retries(self, call, stats):
+        """Run a call, retrying retryable errors with full-jitter exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self._count(stats, "retries")
+                delay = min(self.max_delay, self.base_delay * 2**attempt)
+                time.sleep(random.uniform(0, delay))
+
+    async def _awith_retries(self, call, stats):
+        """Async counterpart of _with_retries; `call` returns an awaitable."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await call()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self._count(stats, "retries")
+                delay = min(self.max_delay, self.base_delay * 2**attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+
+    def _count(self, stats, key, amount=1):
+        """Increment a shared counter from a worker thread."""
+        with self._lock:
+            stats[key] += amount
+
+    def _checkpoint_path(self, ids: List[str], namespace: Optional[str]) -> Optional[str]:
+        """Get the checkpoint file of an ingest, keyed by namespace and IDs."""
+        if not self.checkpoint_dir:
+            return None
+        digest = hashlib.sha256()
+        digest.update((namespace or "").encode("utf-8"))
+        for chunk_id in ids:
+            digest.update(b"\0" + chunk_id.encode("utf-8"))
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()[:32]}.jsonl")
+
+    def _load_checkpoint(self, checkpoint_path: Optional[str]) -> Set[str]:
+        """Read the IDs an interrupted ingest already upserted."""
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return set()
+        completed = set()
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    completed.update(json.loads(line))
+                except ValueError:
+                    # A crash can leave a partially written last line
+                    continue
+        return completed
+
+    def _save_checkpoint(self, checkpoint_path: Optional[str], ids: List[str]):
+        """Append the IDs of an upserted batch to the checkpoint."""
+        if not checkpoint_path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+            with open(checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(ids) + "\n")
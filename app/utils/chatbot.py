@@ -1,20 +1,64 @@
+import asyncio
+import contextvars
 import os
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 
-from langchain.docstore.document import Document
-from langchain_openai import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain_core.documents import Document
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+from .clients import get_chat_model
+from .context_packer import ContextPacker, ContextPackingRetriever
+from .hybrid_retriever import HybridRetriever
+from .memory import TokenBudgetMemory
+from .multi_query import EXPANSION_MODES, FanOutRetriever, QueryExpander
+from .retrieval_chain import FastConversationalRetrievalChain
+from .tracing import TracingCallbackHandler, get_tracer
 
 load_dotenv()
 
 
+class _TokenQueueHandler(BaseCallbackHandler):
+    """Callback handler forwarding streamed LLM tokens to a queue."""
+
+    def __init__(self, token_queue: queue.Queue):
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        self.token_queue.put(("token", token))
+
+
+class _AsyncTokenQueueHandler(AsyncCallbackHandler):
+    """Async callback handler forwarding streamed LLM tokens to an asyncio queue."""
+
+    def __init__(self, token_queue: asyncio.Queue):
+        self.token_queue = token_queue
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any):
+        await self.token_queue.put(("token", token))
+
+
 class RAGChatbot:
     """Utility class for the RAG chatbot."""
 
     def __init__(
-        self, vector_store, model_name: str = "gpt-3.5-turbo", api_key: str = None
+        self,
+        vector_store,
+        model_name: str = "gpt-3.5-turbo",
+        api_key: str = None,
+        answer_cache=None,
+        memory_token_limit: Optional[int] = None,
+        lexical_index=None,
+        llm=None,
+        condense_llm=None,
+        retriever_k: Optional[int] = None,
+        condense_mode: Optional[str] = None,
+        context_tokens: Optional[int] = None,
+        fetch_k: Optional[int] = None,
+        multi_query: Optional[str] = None,
     ):
         """
         Initialize the RAG chatbot.
@@ -23,77 +67,567 @@ class RAGChatbot:
             vector_store: The vector store to use for retrieval
             model_name: The OpenAI model to use
             api_key: OpenAI API key (optional, will use env var if not provided)
+            answer_cache: Optional SemanticAnswerCache for repeated questions
+            memory_token_limit: Tokens of recent conversation kept verbatim
+                (optional, will use MEMORY_TOKEN_LIMIT if not provided)
+            lexical_index: Optional BM25Index fused with vector search
+            llm: Optional chat model used in place of OpenAI, e.g. FakeChatModel
+            condense_llm: Optional non-streaming chat model condensing
+                follow-up questions (defaults to llm)
+            retriever_k: Number of chunks retrieved per question
+                (optional, will use RETRIEVER_K if not provided)
+            condense_mode: "auto" to condense only follow-ups that refer to
+                earlier turns, or "always" (optional, will use CONDENSE_MODE
+                if not provided)
+            context_tokens: Token budget of the retrieved context; candidates
+                are re-ranked, deduplicated and packed into it, 0 disables
+                packing (optional, will use CONTEXT_TOKEN_BUDGET if not provided)
+            fetch_k: Number of candidate chunks retrieved for packing
+                (optional, will use CONTEXT_FETCH_K if not provided)
+            multi_query: "off", or "heuristic" or "llm" to search sub-queries
+                of broad questions concurrently (optional, will use
+                MULTI_QUERY if not provided)
         """
         # Use provided API key or fall back to environment variable
         self.openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
 
-        if not self.openai_api_key:
+        if not self.openai_api_key and llm is None:
             raise ValueError("Missing OpenAI API key. Please check your .env file.")
 
         self.vector_store = vector_store
         self.model_name = model_name
+        self.answer_cache = answer_cache
+        self.lexical_index = lexical_index
+        self.retriever_k = retriever_k or int(os.getenv("RETRIEVER_K", "4"))
+        self.condense_mode = condense_mode or os.getenv("CONDENSE_MODE", "auto")
+        if self.condense_mode not in ("auto", "always"):
+            raise ValueError(f"Unsupported condense mode: {self.condense_mode}")
+        # Retrieving for the raw follow-up while it is condensed only pays
+        # off when the rewrite adds no terms, which is rare
+        self.speculative_retrieval = (
+            os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+        )
 
-        # Initialize the language model
-        self.llm = ChatOpenAI(
-            model_name=model_name, temperature=0.7, api_key=self.openai_api_key
+        # Over-fetch candidates and pack the best of them into a token budget
+        # of at most retriever_k chunks
+        if context_tokens is None:
+            context_tokens = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+        self.fetch_k = fetch_k or int(os.getenv("CONTEXT_FETCH_K", "12"))
+        self.context_packer = (
+            ContextPacker(token_budget=context_tokens, max_documents=self.retriever_k)
+            if context_tokens > 0
+            else None
         )
 
-        # Initialize conversation memory with explicit output_key
-        self.memory = ConversationBufferMemory(
+        # Initialize the language model. Answers are streamed; the question
+        # condensing model is not, so its output never reaches the user. Both
+        # clients are shared by every chatbot using the same key and model
+        if llm is not None:
+            self.llm = llm
+            self.condense_llm = condense_llm or llm
+        else:
+            self.llm = get_chat_model(
+                self.openai_api_key, model_name, temperature=0.7, streaming=True
+            )
+            self.condense_llm = get_chat_model(
+                self.openai_api_key, model_name, temperature=0.7
+            )
+
+        # Broad questions can be split into sub-queries searched concurrently
+        multi_query = (multi_query or os.getenv("MULTI_QUERY", "off")).lower()
+        if multi_query not in EXPANSION_MODES:
+            raise ValueError(f"Unsupported multi-query mode: {multi_query}")
+        self.multi_query_timeout = float(os.getenv("MULTI_QUERY_TIMEOUT", "2.0"))
+        self.query_expander = (
+            QueryExpander(
+                mode=multi_query,
+                llm=self.condense_llm,
+                max_queries=int(os.getenv("MULTI_QUERY_MAX", "4")),
+                timeout=self.multi_query_timeout,
+            )
+            if multi_query != "off"
+            else None
+        )
+
+        # Initialize conversation memory with explicit output_key. Recent turns
+        # are kept verbatim within a token budget and older ones summarized,
+        # so the condensing prompt stays the same size however long the
+        # conversation runs
+        self.memory = TokenBudgetMemory(
+            llm=self.condense_llm,
             memory_key="chat_history",
             return_messages=True,
             output_key="answer",  # Explicitly set the output key to "answer"
+            max_token_limit=memory_token_limit
+            or int(os.getenv("MEMORY_TOKEN_LIMIT", "1000")),
         )
 
         # Initialize the conversational chain
+        self._namespace: Optional[str] = None
+        self._filter: Optional[Dict] = None
         self.chain = self._create_chain()
+        self.tracer = get_tracer()
 
     def _create_chain(self):
         """
         Create the conversational retrieval chain.
 
         Returns:
-            ConversationalRetrievalChain
+            FastConversationalRetrievalChain
         """
-        return ConversationalRetrievalChain.from_llm(
+        return FastConversationalRetrievalChain.from_llm(
             llm=self.llm,
-            retriever=self.vector_store.as_retriever(search_kwargs={"k": 4}),
+            condense_question_llm=self.condense_llm,
+            retriever=self._build_retriever(),
             memory=self.memory,
             return_source_documents=True,
+            condense_mode=self.condense_mode,
+            speculative_retrieval=self.speculative_retrieval,
         )
 
-    def chat(self, query: str, namespace: Optional[str] = None):
+    def chat(
+        self,
+        query: str,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ):
         """
         Chat with the RAG chatbot.
 
         Args:
             query: The user's query
             namespace: Optional namespace to search in
+            filter: Optional metadata filter of the chunks to search, e.g.
+                from build_filter
 
         Returns:
             Dict containing the response and source documents
         """
-        # If namespace is provided, update the retriever
-        if namespace:
-            self.chain.retriever = self.vector_store.as_retriever(
-                search_kwargs={"k": 4, "namespace": namespace}
-            )
+        with self._chat_span(query, namespace, filter) as span:
+            self._set_namespace(namespace, filter)
+            use_cache = self._use_cache(filter)
+
+            # Get the response
+            try:
+                if use_cache:
+                    cached = self._cached_answer(query, namespace)
+                    span.set_attribute("answer_cache_hit", bool(cached))
+                    if cached:
+                        return cached
+
+                response = self.chain(
+                    {"question": query}, callbacks=[TracingCallbackHandler(self.tracer)]
+                )
+
+                if use_cache:
+                    self.answer_cache.store(
+                        query,
+                        response["answer"],
+                        response["source_documents"],
+                        namespace=namespace,
+                    )
+
+                self._record_response(span, response)
+                return {
+                    "answer": response["answer"],
+                    "source_documents": response["source_documents"],
+                }
+            except Exception as e:
+                span.record_error(e)
+                error_message = f"Error generating response: {str(e)}"
+                return {
+                    "answer": error_message,
+                    "source_documents": [],
+                }
+
+    def stream_chat(
+        self,
+        query: str,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Chat with the RAG chatbot, yielding answer tokens as they are generated.
+
+        Args:
+            query: The user's query
+            namespace: Optional namespace to search in
+            filter: Optional metadata filter of the chunks to search, e.g.
+                from build_filter
 
-        # Get the response
+        Yields:
+            {"type": "token", "content": ...} for every generated token, then one
+            {"type": "result", "answer": ..., "source_documents": ...,
+            "time_to_first_token": ...} with the complete response
+        """
+        started = time.perf_counter()
+        # The span is ended explicitly rather than made current, since the
+        # consumer of this generator runs between its yields
+        span = self.tracer.start_span(
+            "chat",
+            namespace=namespace or "",
+            query_chars=len(query),
+            filtered=bool(filter),
+        )
         try:
-            response = self.chain({"question": query})
-
-            return {
-                "answer": response["answer"],
-                "source_documents": response["source_documents"],
-            }
-        except Exception as e:
-            error_message = f"Error generating response: {str(e)}"
-            return {
-                "answer": error_message,
-                "source_documents": [],
-            }
+            with self.tracer.use_span(span):
+                self._set_namespace(namespace, filter)
+                use_cache = self._use_cache(filter)
+
+                cached = None
+                if use_cache:
+                    try:
+                        cached = self._cached_answer(query, namespace)
+                    except Exception:
+                        cached = None
+                    span.set_attribute("answer_cache_hit", bool(cached))
+            if cached:
+                yield {"type": "token", "content": cached["answer"]}
+                yield {
+                    "type": "result",
+                    **cached,
+                    "time_to_first_token": time.perf_counter() - started,
+                }
+                return
+
+            # Run the chain in a worker thread and relay its tokens from a queue
+            events: queue.Queue = queue.Queue()
+
+            def run_chain():
+                with self.tracer.use_span(span):
+                    try:
+                        response = self.chain(
+                            {"question": query},
+                            callbacks=[
+                                _TokenQueueHandler(events),
+                                TracingCallbackHandler(self.tracer),
+                            ],
+                        )
+                        events.put(("done", response))
+                    except Exception as e:
+                        events.put(("error", e))
+
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(run_chain,), daemon=True).start()
+
+            time_to_first_token = None
+            while True:
+                kind, payload = events.get()
+                if kind == "token":
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - started
+                        span.set_attribute(
+                            "time_to_first_token_ms", time_to_first_token * 1000
+                        )
+                    yield {"type": "token", "content": payload}
+                elif kind == "done":
+                    if use_cache:
+                        self.answer_cache.store(
+                            query,
+                            payload["answer"],
+                            payload["source_documents"],
+                            namespace=namespace,
+                        )
+                    self._record_response(span, payload)
+                    self.tracer.end_span(span)
+                    yield {
+                        "type": "result",
+                        "answer": payload["answer"],
+                        "source_documents": payload["source_documents"],
+                        "time_to_first_token": time_to_first_token,
+                    }
+                    return
+                else:
+                    span.record_error(payload)
+                    self.tracer.end_span(span)
+                    error_message = f"Error generating response: {str(payload)}"
+                    yield {"type": "token", "content": error_message}
+                    yield {
+                        "type": "result",
+                        "answer": error_message,
+                        "source_documents": [],
+                        "time_to_first_token": time_to_first_token,
+                    }
+                    return
+        finally:
+            self.tracer.end_span(span)
+
+    async def achat(
+        self,
+        query: str,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Async counterpart of chat.
+
+        Args:
+            query: The user's query
+            namespace: Optional namespace to search in
+            filter: Optional metadata filter of the chunks to search, e.g.
+                from build_filter
+
+        Returns:
+            Dict containing the response and source documents
+        """
+        with self._chat_span(query, namespace, filter) as span:
+            self._set_namespace(namespace, filter)
+            use_cache = self._use_cache(filter)
+
+            try:
+                if use_cache:
+                    cached = await self._acached_answer(query, namespace)
+                    span.set_attribute("answer_cache_hit", bool(cached))
+                    if cached:
+                        return cached
+
+                response = await self.chain.acall(
+                    {"question": query}, callbacks=[TracingCallbackHandler(self.tracer)]
+                )
+
+                if use_cache:
+                    await self.answer_cache.astore(
+                        query,
+                        response["answer"],
+                        response["source_documents"],
+                        namespace=namespace,
+                    )
+
+                self._record_response(span, response)
+                return {
+                    "answer": response["answer"],
+                    "source_documents": response["source_documents"],
+                }
+            except Exception as e:
+                span.record_error(e)
+                error_message = f"Error generating response: {str(e)}"
+                return {
+                    "answer": error_message,
+                    "source_documents": [],
+                }
+
+    async def astream_chat(
+        self,
+        query: str,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Async counterpart of stream_chat.
+
+        Args:
+            query: The user's query
+            namespace: Optional namespace to search in
+            filter: Optional metadata filter of the chunks to search, e.g.
+                from build_filter
+
+        Yields:
+            The same events as stream_chat
+        """
+        started = time.perf_counter()
+        span = self.tracer.start_span(
+            "chat",
+            namespace=namespace or "",
+            query_chars=len(query),
+            filtered=bool(filter),
+        )
+        task = None
+        try:
+            with self.tracer.use_span(span):
+                self._set_namespace(namespace, filter)
+                use_cache = self._use_cache(filter)
+
+                cached = None
+                if use_cache:
+                    try:
+                        cached = await self._acached_answer(query, namespace)
+                    except Exception:
+                        cached = None
+                    span.set_attribute("answer_cache_hit", bool(cached))
+            if cached:
+                yield {"type": "token", "content": cached["answer"]}
+                yield {
+                    "type": "result",
+                    **cached,
+                    "time_to_first_token": time.perf_counter() - started,
+                }
+                return
+
+            events: asyncio.Queue = asyncio.Queue()
+            # The task copies the context, so the chain's spans nest under span
+            with self.tracer.use_span(span):
+                task = asyncio.create_task(
+                    self.chain.acall(
+                        {"question": query},
+                        callbacks=[
+                            _AsyncTokenQueueHandler(events),
+                            TracingCallbackHandler(self.tracer),
+                        ],
+                    )
+                )
+            task.add_done_callback(lambda _: events.put_nowait(("done", None)))
+
+            time_to_first_token = None
+            while True:
+                kind, payload = await events.get()
+                if kind == "token":
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - started
+                        span.set_attribute(
+                            "time_to_first_token_ms", time_to_first_token * 1000
+                        )
+                    yield {"type": "token", "content": payload}
+                    continue
+
+                try:
+                    response = task.result()
+                except Exception as e:
+                    span.record_error(e)
+                    self.tracer.end_span(span)
+                    error_message = f"Error generating response: {str(e)}"
+                    yield {"type": "token", "content": error_message}
+                    yield {
+                        "type": "result",
+                        "answer": error_message,
+                        "source_documents": [],
+                        "time_to_first_token": time_to_first_token,
+                    }
+                    return
+
+                if use_cache:
+                    await self.answer_cache.astore(
+                        query,
+                        response["answer"],
+                        response["source_documents"],
+                        namespace=namespace,
+                    )
+                self._record_response(span, response)
+                self.tracer.end_span(span)
+                yield {
+                    "type": "result",
+                    "answer": response["answer"],
+                    "source_documents": response["source_documents"],
+                    "time_to_first_token": time_to_first_token,
+                }
+                return
+        finally:
+            # The client went away before the answer was complete
+            if task is not None and not task.done():
+                task.cancel()
+                span.set_attribute("cancelled", True)
+            self.tracer.end_span(span)
+
+    def _chat_span(self, query: str, namespace: Optional[str], filter: Optional[Dict]):
+        """Start the root span of a chat turn."""
+        return self.tracer.span(
+            "chat",
+            namespace=namespace or "",
+            query_chars=len(query),
+            filtered=bool(filter),
+        )
+
+    @staticmethod
+    def _record_response(span, response: Dict[str, Any]):
+        """Record the sizes of a generated answer and its sources on a span."""
+        span.set_attributes(
+            answer_chars=len(response["answer"]),
+            source_documents=len(response["source_documents"]),
+            context_chars=sum(
+                len(document.page_content) for document in response["source_documents"]
+            ),
+        )
+
+    def _set_namespace(self, namespace: Optional[str], filter: Optional[Dict] = None):
+        """Point the chain's retriever at a namespace and metadata filter."""
+        # Without a namespace, keep searching the previous one. The filter
+        # applies to this turn only
+        namespace = namespace or self._namespace
+        if (namespace, filter) != (self._namespace, self._filter):
+            self.chain.retriever = self._build_retriever(namespace, filter)
+            self._namespace, self._filter = namespace, filter
+
+    def _build_retriever(
+        self, namespace: Optional[str] = None, filter: Optional[Dict] = None
+    ):
+        """Create the retriever for a namespace and metadata filter."""
+        k = self.retriever_k if self.context_packer is None else self.fetch_k
+        if self.lexical_index is not None:
+            retriever = HybridRetriever(
+                vector_store=self.vector_store,
+                lexical_index=self.lexical_index,
+                k=k,
+                namespace=namespace,
+                filter=filter,
+            )
+        else:
+            search_kwargs = {"k": k}
+            if namespace:
+                search_kwargs["namespace"] = namespace
+            if filter:
+                search_kwargs["filter"] = filter
+            retriever = self.vector_store.as_retriever(search_kwargs=search_kwargs)
+
+        if self.query_expander is not None:
+            retriever = FanOutRetriever(
+                retriever=retriever,
+                vector_store=self.vector_store,
+                expander=self.query_expander,
+                lexical_index=self.lexical_index,
+                k=k,
+                timeout=self.multi_query_timeout,
+                namespace=namespace,
+                filter=filter,
+            )
+
+        if self.context_packer is None:
+            return retriever
+        return ContextPackingRetriever(retriever=retriever, packer=self.context_packer)
+
+    def _use_cache(self, filter: Optional[Dict] = None) -> bool:
+        """Check whether the current turn may be answered from the answer cache."""
+        # Follow-up questions depend on the conversation, so only the first
+        # turn can be answered from the semantic cache. Cached answers were
+        # generated from the whole namespace, so filtered turns skip it
+        return (
+            self.answer_cache is not None
+            and not filter
+            and not self.memory.chat_memory.messages
+        )
+
+    def _cached_answer(self, query: str, namespace: Optional[str]) -> Optional[Dict]:
+        """Look up a cached answer and record the turn in memory on a hit."""
+        cached = self.answer_cache.lookup(query, namespace=namespace)
+        if cached:
+            self.memory.save_context({"question": query}, {"answer": cached["answer"]})
+        return cached
+
+    async def _acached_answer(
+        self, query: str, namespace: Optional[str]
+    ) -> Optional[Dict]:
+        """Async counterpart of _cached_answer."""
+        cached = await self.answer_cache.alookup(query, namespace=namespace)
+        if cached:
+            self.memory.save_context({"question": query}, {"answer": cached["answer"]})
+        return cached
 
     def reset_conversation(self):
         """Reset the conversation history."""
         self.memory.clear()
+
+    def memory_state(self) -> Dict[str, Any]:
+        """
+        Get the conversation history, e.g. to persist a session.
+
+        Returns:
+            JSON-serializable dict of the conversation memory
+        """
+        return self.memory.to_dict()
+
+    def restore_memory(self, state: Dict[str, Any]):
+        """
+        Restore a conversation history returned by memory_state.
+
+        Args:
+            state: Dict of the conversation memory
+        """
+        self.memory.load_dict(state)
@@ -0,0 +1,430 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .bulk_ingest import count_tokens_fallback
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_MARKDOWN_HEADING = re.compile(r"(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_MARKDOWN_FENCE = re.compile(r"[ \t]*(```|~~~)")
+# Numbered ("2.1 Results") or upper case ("INTRODUCTION") lines of PDF pages
+_TEXT_HEADING = re.compile(
+    r"(?:\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{0,80}|[A-Z][A-Z0-9 \t\-:,&]{3,80})"
+)
+# Finer and finer places to cut a block that exceeds the chunk size
+_SPLIT_PATTERNS = [re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+")]
+
+# Token counts of recently seen blocks, shared by every chunker of the process
+_token_cache: Dict[str, int] = {}
+_token_cache_lock = threading.Lock()
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Get the tiktoken encoding of OpenAI's models, or None without tiktoken."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(texts: List[str], cache_size: int = 100000) -> List[int]:
+    """
+    Count the tokens of several texts, reusing the counts of texts seen before.
+
+    Uncached texts are encoded in one multithreaded tiktoken batch.
+
+    Args:
+        texts: The texts to count
+        cache_size: Number of counts kept before the cache is cleared
+
+    Returns:
+        Number of tokens of each text
+    """
+    with _token_cache_lock:
+        counts = [_token_cache.get(text) for text in texts]
+    missing = [text for text, count in zip(texts, counts) if count is None]
+    if not missing:
+        return counts
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        computed = [len(tokens) for tokens in encoding.encode_ordinary_batch(missing)]
+    else:
+        computed = [count_tokens_fallback(text) for text in missing]
+
+    new_counts = dict(zip(missing, computed))
+    with _token_cache_lock:
+        if len(_token_cache) + len(new_counts) > cache_size:
+            _token_cache.clear()
+        _token_cache.update(new_counts)
+    return [
+        new_counts[text] if count is None else count
+        for text, count in zip(texts, counts)
+    ]
+
+
+class _Unit:
+    """A span of one loaded document that is never split across chunks."""
+
+    __slots__ = (
+        "doc", "start", "end", "tokens", "section", "hard_break", "sticky", "atomic"
+    )
+
+    def __init__(
+        self, doc, start, end, section="", hard_break=False, sticky=False, atomic=False
+    ):
+        self.doc = doc
+        self.start = start
+        self.end = end
+        self.tokens = 0
+        self.section = section
+        # Start a new chunk here, e.g. at a top-level Markdown heading
+        self.hard_break = hard_break
+        # Keep with the next unit, e.g. a heading with its first paragraph
+        self.sticky = sticky
+        # Never cut to fill up a chunk, e.g. a CSV row
+        self.atomic = atomic
+
+
+class TokenChunker:
+    """
+    Splits documents into chunks sized in tokens along their structure.
+
+    Each file is cut into units that are never split, i.e. paragraphs,
+    Markdown sections and code blocks, or CSV rows, and consecutive units are
+    packed into chunks of up to chunk_tokens tokens. Chunks cross PDF page and
+    CSV row boundaries, but a top-level Markdown heading always starts a new
+    chunk, other headings start one once the current chunk is half full, and
+    headings stay with the text that follows them. Only units larger than a
+    chunk are cut, at line, sentence or word boundaries.
+    """
+
+    def __init__(self, chunk_tokens: int = 300, overlap_tokens: int = 30):
+        """
+        Initialize the chunker.
+
+        Args:
+            chunk_tokens: Maximum number of tokens per chunk
+            overlap_tokens: Maximum number of tokens of trailing sentences
+                repeated at the start of the next chunk of the same section
+        """
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size.")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split loaded documents into chunks.
+
+        Consecutive documents of the same source, e.g. the pages of a PDF or
+        the rows of a CSV file, are chunked together.
+
+        Args:
+            documents: Documents returned by DocumentProcessor.load_document
+
+        Returns:
+            List of chunks. Besides the metadata of the document a chunk starts
+            in, each carries "start_index" and "end_index", its character
+            offsets in the file's documents joined by blank lines, "tokens",
+            the section heading it belongs to if any, and "page_end" or
+            "row_end" when it spans several pages or rows.
+        """
+        chunks: List[Document] = []
+        start = 0
+        for i in range(1, len(documents) + 1):
+            if i == len(documents) or (
+                documents[i].metadata.get("source")
+                != documents[start].metadata.get("source")
+            ):
+                chunks.extend(self._split_file(documents[start:i]))
+                start = i
+        return chunks
+
+    def _split_file(self, documents: List[Document]) -> List[Document]:
+        """Chunk the documents of one file."""
+        source = str(documents[0].metadata.get("source", ""))
+        extension = os.path.splitext(source)[1].lower()
+
+        units: List[_Unit] = []
+        for i, document in enumerate(documents):
+            text = document.page_content
+            if extension in (".md", ".markdown"):
+                units.extend(self._markdown_units(i, text))
+            elif extension == ".csv":
+                # A row is one unit, and rows are packed into row groups
+                if text.strip():
+                    units.append(_Unit(i, 0, len(text), atomic=True))
+            else:
+                section = units[-1].section if units else ""
+                units.extend(self._text_units(i, text, section))
+
+        texts = [documents[u.doc].page_content[u.start : u.end] for u in units]
+        for unit, tokens in zip(units, count_tokens(texts)):
+            unit.tokens = tokens
+
+        units = [
+            piece
+            for unit in units
+            for piece in (
+                self._split_unit(unit, documents[unit.doc].page_content)
+                if unit.tokens > self.chunk_tokens
+                else [unit]
+            )
+        ]
+        return self._build_chunks(documents, self._pack(documents, units))
+
+    def _markdown_units(self, doc: int, text: str) -> List[_Unit]:
+        """Cut Markdown into paragraphs, code blocks and headings."""
+        units: List[_Unit] = []
+        headings: List[Tuple[int, str]] = []
+        block_start: Optional[int] = None
+        in_fence = False
+        offset = 0
+
+        def close(end):
+            nonlocal block_start
+            if block_start is not None and text[block_start:end].strip():
+                end = block_start + len(text[block_start:end].rstrip())
+                units.append(_Unit(doc, block_start, end, section_of(headings)))
+            block_start = None
+
+        def section_of(stack):
+            return " > ".join(title for _, title in stack)
+
+        for line in text.splitlines(keepends=True):
+            line_end = offset + len(line.rstrip("\r\n"))
+            if _MARKDOWN_FENCE.match(line):
+                if block_start is None:
+                    block_start = offset
+                in_fence = not in_fence
+            elif not in_fence and _MARKDOWN_HEADING.match(line.strip()):
+                close(offset)
+                match = _MARKDOWN_HEADING.match(line.strip())
+                level = len(match.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, match.group(2)))
+                units.append(
+                    _Unit(
+                        doc,
+                        offset,
+                        line_end,
+                        section_of(headings),
+                        hard_break=level == 1,
+                        sticky=True,
+                    )
+                )
+            elif not in_fence and not line.strip():
+                close(offset)
+            elif block_start is None:
+                block_start = offset
+            offset += len(line)
+        close(len(text.rstrip()))
+        return [unit for unit in units if unit.end > unit.start]
+
+    def _text_units(self, doc: int, text: str, section: str) -> List[_Unit]:
+        """Cut plain or PDF text into paragraphs and heading-like lines."""
+        units: List[_Unit] = []
+        start = 0
+        breaks = [(m.start(), m.end()) for m in _PARAGRAPH_BREAK.finditer(text)]
+        for break_start, break_end in breaks + [(len(text), len(text))]:
+            paragraph = text[start:break_start]
+            stripped = paragraph.strip()
+            if stripped:
+                first = start + len(paragraph) - len(paragraph.lstrip())
+                last = start + len(paragraph.rstrip())
+                is_heading = "\n" not in stripped and _TEXT_HEADING.fullmatch(stripped)
+                if is_heading:
+                    section = stripped
+                units.append(_Unit(doc, first, last, section, sticky=bool(is_heading)))
+            start = break_end
+        return units
+
+    def _split_unit(self, unit: _Unit, text: str, level: int = 0) -> List[_Unit]:
+        """Cut a unit larger than a chunk at line, sentence or word boundaries."""
+        if level == len(_SPLIT_PATTERNS):
+            # A single word longer than a chunk: cut it by characters
+            size = max(1, (unit.end - unit.start) * self.chunk_tokens // unit.tokens)
+            pieces = []
+            for start in range(unit.start, unit.end, size):
+                piece = _Unit(unit.doc, start, min(start + size, unit.end), unit.section)
+                piece.tokens = min(self.chunk_tokens, unit.tokens)
+                pieces.append(piece)
+            pieces[0].hard_break = unit.hard_break
+            return pieces
+
+        spans, start = [], unit.start
+        for match in _SPLIT_PATTERNS[level].finditer(text, unit.start, unit.end):
+            if match.start() > start:
+                spans.append((start, match.start()))
+            start = match.end()
+        if start < unit.end:
+            spans.append((start, unit.end))
+
+        parts = []
+        counts = count_tokens([text[s:e] for s, e in spans])
+        for (s, e), tokens in zip(spans, counts):
+            part = _Unit(unit.doc, s, e, unit.section)
+            part.tokens = tokens
+            if tokens > self.chunk_tokens:
+                parts.extend(self._split_unit(part, text, level + 1))
+            else:
+                parts.append(part)
+
+        # Merge the parts back into pieces as large as a chunk allows
+        pieces: List[_Unit] = []
+        for part in parts:
+            last = pieces[-1] if pieces else None
+            if last is not None and last.tokens + part.tokens + 1 <= self.chunk_tokens:
+                last.end = part.end
+                last.tokens += part.tokens + 1
+            else:
+                pieces.append(part)
+        pieces[0].hard_break = unit.hard_break
+        return pieces
+
+    def _pack(self, documents: List[Document], units: List[_Unit]) -> List[List[_Unit]]:
+        """Group consecutive units into chunks of at most chunk_tokens tokens."""
+        groups: List[List[_Unit]] = []
+        current: List[_Unit] = []
+        tokens = 0
+        for unit in units:
+            if current and self._starts_chunk(current, tokens, unit):
+                # Fill the chunk with the first sentences of the unit
+                head = self._fill(documents, unit, self.chunk_tokens - tokens - 1)
+                if head is not None:
+                    current.append(head)
+                    unit = _Unit(unit.doc, head.end, unit.end, unit.section)
+                    text = documents[unit.doc].page_content
+                    unit.start += len(text[unit.start : unit.end]) - len(
+                        text[unit.start : unit.end].lstrip()
+                    )
+                    unit.tokens = count_tokens([text[unit.start : unit.end]])[0]
+
+                # Move trailing headings to the next chunk if they fit there
+                carried: List[_Unit] = []
+                if not unit.hard_break:
+                    while len(current) > 1 and current[-1].sticky:
+                        carried.insert(0, current.pop())
+                    carried_tokens = sum(u.tokens + 1 for u in carried)
+                    if carried_tokens + unit.tokens + 1 > self.chunk_tokens:
+                        current.extend(carried)
+                        carried = []
+                groups.append(current)
+
+                overlap = None
+                if not carried and not unit.hard_break:
+                    overlap = self._overlap(documents, current[-1], unit)
+                    if overlap and overlap.tokens + unit.tokens + 2 > self.chunk_tokens:
+                        overlap = None
+                current = ([overlap] if overlap else []) + carried
+                tokens = sum(u.tokens + 1 for u in current)
+            current.append(unit)
+            tokens += unit.tokens + 1
+        if current:
+            groups.append(current)
+        return groups
+
+    def _fill(self, documents: List[Document], unit: _Unit, room: int) -> Optional[_Unit]:
+        """Get the leading sentences of a unit that fit the room left in a chunk."""
+        if unit.atomic or unit.sticky or unit.hard_break or room < self.chunk_tokens // 4:
+            return None
+        text = documents[unit.doc].page_content
+        ends = [
+            match.start()
+            for match in _SPLIT_PATTERNS[1].finditer(text, unit.start, unit.end)
+        ]
+        if not ends:
+            return None
+        counts = count_tokens([text[unit.start : end] for end in ends])
+        fitting = [(end, tokens) for end, tokens in zip(ends, counts) if tokens <= room]
+        if not fitting:
+            return None
+        head = _Unit(unit.doc, unit.start, fitting[-1][0], unit.section)
+        head.tokens = fitting[-1][1]
+        return head
+
+    def _starts_chunk(self, current: List[_Unit], tokens: int, unit: _Unit) -> bool:
+        """Check whether a unit has to start a new chunk."""
+        if unit.hard_break and not all(u.sticky for u in current):
+            return True
+        # Prefer cutting at a heading once the chunk is half full
+        if unit.sticky and not current[-1].sticky and tokens >= self.chunk_tokens // 2:
+            return True
+        return tokens + unit.tokens + 1 > self.chunk_tokens
+
+    def _overlap(
+        self, documents: List[Document], last: _Unit, following: _Unit
+    ) -> Optional[_Unit]:
+        """Get the trailing sentences of a unit to repeat before the next unit."""
+        if (
+            not self.overlap_tokens
+            or last.doc != following.doc
+            or last.section != following.section
+        ):
+            return None
+        text = documents[last.doc].page_content
+        starts = [
+            match.end()
+            for match in _SPLIT_PATTERNS[1].finditer(text, last.start, last.end)
+        ]
+        best = None
+        for start in reversed(starts):
+            tokens = count_tokens([text[start : last.end]])[0]
+            if tokens > self.overlap_tokens:
+                break
+            best = _Unit(last.doc, start, last.end, last.section)
+            best.tokens = tokens
+        return best
+
+    def _build_chunks(
+        self, documents: List[Document], groups: List[List[_Unit]]
+    ) -> List[Document]:
+        """Turn groups of units into chunk documents with offset metadata."""
+        # Offsets of each document in the file's documents joined by blank lines
+        bases, offset = [], 0
+        for document in documents:
+            bases.append(offset)
+            offset += len(document.page_content) + 2
+
+        texts, metadatas = [], []
+        for group in groups:
+            parts, run_start = [], 0
+            for i in range(1, len(group) + 1):
+                if i == len(group) or group[i].doc != group[run_start].doc:
+                    text = documents[group[run_start].doc].page_content
+                    parts.append(text[group[run_start].start : group[i - 1].end])
+                    run_start = i
+            first, last = group[0], group[-1]
+            metadata = dict(documents[first.doc].metadata)
+            metadata["start_index"] = bases[first.doc] + first.start
+            metadata["end_index"] = bases[last.doc] + last.end
+            section = next((u.section for u in group if u.section), "")
+            if section:
+                metadata["section"] = section
+            if last.doc != first.doc:
+                last_metadata = documents[last.doc].metadata
+                for key in ("page", "row"):
+                    if key in last_metadata:
+                        metadata[f"{key}_end"] = last_metadata[key]
+            texts.append("\n\n".join(parts))
+            metadatas.append(metadata)
+
+        for metadata, tokens in zip(metadatas, count_tokens(texts)):
+            metadata["tokens"] = tokens
+        return [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas)
+        ]
@@ -0,0 +1,303 @@
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .answer_cache import SemanticAnswerCache
+from .embedding_cache import CachedEmbeddings
+from .ingest_jobs import IngestJobQueue
+from .ingest_manifest import IngestManifest
+from .lexical_index import BM25Index
+from .local_index import LocalVectorIndex
+
+_registry: Dict[Tuple, Any] = {}
+_registry_lock = threading.RLock()
+
+
+def _secret(value: Optional[str]) -> str:
+    """Hash a credential so raw API keys are never used as registry keys."""
+    return hashlib.sha256((value or "").encode("utf-8")).hexdigest()
+
+
+def shared(kind: str, key: Tuple, factory: Callable[[], Any]) -> Any:
+    """
+    Get a process-wide shared object, creating it on first use.
+
+    Args:
+        kind: Kind of object, e.g. "pinecone_index"
+        key: Tuple identifying the object within its kind
+        factory: Function creating the object
+
+    Returns:
+        The shared object
+    """
+    registry_key = (kind,) + tuple(key)
+    with _registry_lock:
+        if registry_key not in _registry:
+            _registry[registry_key] = factory()
+        return _registry[registry_key]
+
+
+def clear_registry():
+    """Forget every shared object, e.g. after credentials were rotated."""
+    with _registry_lock:
+        _registry.clear()
+
+
+def get_openai_embeddings(api_key: str, model: str):
+    """
+    Get the shared OpenAI embeddings client for an API key and model.
+
+    Args:
+        api_key: OpenAI API key
+        model: Embedding model name
+
+    Returns:
+        OpenAIEmbeddings instance
+    """
+    # The OpenAI and Pinecone SDKs take most of the import time of the app,
+    # so they are imported when the first client is created
+    from langchain_openai import OpenAIEmbeddings
+
+    return shared(
+        "openai_embeddings",
+        (_secret(api_key), model),
+        lambda: OpenAIEmbeddings(api_key=api_key, model=model),
+    )
+
+
+def get_cached_embeddings(
+    api_key: str, model: str, cache_path: str, quantization: str = "none"
+):
+    """
+    Get the shared cached embeddings for an API key, model and cache file.
+
+    Args:
+        api_key: OpenAI API key
+        model: Embedding model name
+        cache_path: Path to the embedding cache database
+        quantization: "int8" to store new vectors quantized, or "none"
+
+    Returns:
+        CachedEmbeddings instance
+    """
+    return shared(
+        "cached_embeddings",
+        (_secret(api_key), model, os.path.abspath(cache_path), quantization),
+        lambda: CachedEmbeddings(
+            get_openai_embeddings(api_key, model),
+            model_name=model,
+            cache_path=cache_path,
+            quantization=quantization,
+        ),
+    )
+
+
+def get_chat_model(
+    api_key: str, model_name: str, temperature: float = 0.7, streaming: bool = False
+):
+    """
+    Get the shared chat model client for an API key and settings.
+
+    Args:
+        api_key: OpenAI API key
+        model_name: Chat model name
+        temperature: Sampling temperature
+        streaming: Whether the model streams tokens to callbacks
+
+    Returns:
+        ChatOpenAI instance
+    """
+    from langchain_openai import ChatOpenAI
+
+    return shared(
+        "chat_model",
+        (_secret(api_key), model_name, temperature, streaming),
+        lambda: ChatOpenAI(
+            model_name=model_name,
+            temperature=temperature,
+            api_key=api_key,
+            streaming=streaming,
+        ),
+    )
+
+
+def get_pinecone_client(api_key: str):
+    """
+    Get the shared Pinecone client for an API key.
+
+    Args:
+        api_key: Pinecone API key
+
+    Returns:
+        Pinecone instance
+    """
+    from pinecone import Pinecone
+
+    return shared("pinecone_client", (_secret(api_key),), lambda: Pinecone(api_key=api_key))
+
+
+def get_pinecone_index(api_key: str, index_name: str):
+    """
+    Get the shared connection to a Pinecone index.
+
+    Args:
+        api_key: Pinecone API key
+        index_name: Name of the index
+
+    Returns:
+        Pinecone Index instance
+    """
+    return shared(
+        "pinecone_index",
+        (_secret(api_key), index_name),
+        lambda: get_pinecone_client(api_key).Index(index_name),
+    )
+
+
+def get_local_index(directory: str, **kwargs):
+    """
+    Get the shared local vector index for a directory.
+
+    Every user of a directory must share one instance, otherwise their
+    in-memory copies would diverge and overwrite each other on flush.
+
+    Args:
+        directory: Directory the index is persisted to
+        **kwargs: Further LocalVectorIndex settings
+
+    Returns:
+        LocalVectorIndex instance
+    """
+    return shared(
+        "local_index",
+        (os.path.abspath(directory),),
+        lambda: LocalVectorIndex(directory=directory, **kwargs),
+    )
+
+
+def get_lexical_index(directory: str, **kwargs):
+    """
+    Get the shared lexical index for a directory.
+
+    Args:
+        directory: Directory the index is persisted to
+        **kwargs: Further BM25Index settings
+
+    Returns:
+        BM25Index instance
+    """
+    return shared(
+        "lexical_index",
+        (os.path.abspath(directory),),
+        lambda: BM25Index(directory=directory, **kwargs),
+    )
+
+
+def get_manifest(manifest_dir: str, index_name: str):
+    """
+    Get the shared ingest manifest of an index.
+
+    Args:
+        manifest_dir: Directory holding the manifests
+        index_name: Name of the index
+
+    Returns:
+        IngestManifest instance
+    """
+    return shared(
+        "manifest",
+        (os.path.abspath(manifest_dir), index_name),
+        lambda: IngestManifest(manifest_dir, index_name=index_name),
+    )
+
+
+def get_vector_store_manager(
+    openai_api_key: Optional[str] = None,
+    pinecone_api_key: Optional[str] = None,
+    pinecone_environment: Optional[str] = None,
+    pinecone_index_name: Optional[str] = None,
+    **kwargs,
+):
+    """
+    Get the shared vector store manager for a set of credentials and index.
+
+    Args:
+        openai_api_key: OpenAI API key
+        pinecone_api_key: Pinecone API key
+        pinecone_environment: Pinecone environment
+        pinecone_index_name: Name of the index
+        **kwargs: Further VectorStoreManager settings
+
+    Returns:
+        VectorStoreManager instance
+    """
+    # Imported here because vector_store itself builds on this module
+    from .vector_store import VectorStoreManager
+
+    key = (
+        _secret(openai_api_key),
+        _secret(pinecone_api_key),
+        pinecone_environment,
+        pinecone_index_name,
+        tuple(sorted(kwargs.items())),
+    )
+    return shared(
+        "vector_store_manager",
+        key,
+        lambda: VectorStoreManager(
+            openai_api_key=openai_api_key,
+            pinecone_api_key=pinecone_api_key,
+            pinecone_environment=pinecone_environment,
+            pinecone_index_name=pinecone_index_name,
+            **kwargs,
+        ),
+    )
+
+
+def get_answer_cache(scope: Tuple, embeddings, **kwargs):
+    """
+    Get the shared semantic answer cache of an index.
+
+    Args:
+        scope: Tuple identifying the index, e.g. (backend, index name)
+        embeddings: Embeddings model used to embed the queries
+        **kwargs: Further SemanticAnswerCache settings
+
+    Returns:
+        SemanticAnswerCache instance
+    """
+    return shared(
+        "answer_cache",
+        tuple(scope),
+        lambda: SemanticAnswerCache(embeddings, **kwargs),
+    )
+
+
+def get_ingest_queue(manager, **kwargs):
+    """
+    Get the shared ingestion job queue of a vector store manager's index.
+
+    The queue's workers start with it and resume jobs left unfinished by an
+    earlier run.
+
+    Args:
+        manager: VectorStoreManager the jobs ingest into
+        **kwargs: Further IngestJobQueue settings
+
+    Returns:
+        IngestJobQueue instance
+    """
+    path = os.getenv("INGEST_JOBS_DB", ".cache/ingest_jobs.sqlite")
+    return shared(
+        "ingest_queue",
+        (manager.backend, manager.pinecone_index_name, os.path.abspath(path)),
+        lambda: IngestJobQueue(
+            manager,
+            path=path,
+            spool_dir=os.getenv("INGEST_SPOOL_DIR", ".cache/ingest_spool"),
+            workers=int(os.getenv("INGEST_WORKERS", "1")),
+            flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", "30")),
+            **kwargs,
+        ),
+    )
@@ -0,0 +1,259 @@
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.retrievers import BaseRetriever
+
+from .chunker import count_tokens
+from .lexical_index import tokenize
+from .tracing import trace
+
+_WORD_PATTERN = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class ContextPacker:
+    """
+    Re-ranks retrieved chunks, drops redundant text and fits the rest into a
+    token budget.
+
+    Candidates are scored by BM25 of the question within the candidate set
+    blended with their retrieval rank. In score order, chunks whose MinHash
+    signature is close to an already selected chunk are dropped, sentences
+    already selected, e.g. the overlap of neighbouring chunks, are cut out,
+    and what remains is added while it fits the budget.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 800,
+        max_documents: Optional[int] = None,
+        lexical_weight: float = 0.5,
+        duplicate_threshold: float = 0.7,
+        num_permutations: int = 64,
+        shingle_size: int = 3,
+        min_sentence_words: int = 4,
+    ):
+        """
+        Initialize the context packer.
+
+        Args:
+            token_budget: Maximum number of tokens of packed context
+            max_documents: Maximum number of chunks to keep
+            lexical_weight: Weight of the BM25 score against the retrieval rank
+            duplicate_threshold: Estimated Jaccard similarity of word shingles
+                from which a chunk counts as a near-duplicate
+            num_permutations: Number of MinHash permutations
+            shingle_size: Number of words per shingle
+            min_sentence_words: Minimum number of words of a sentence to be
+                cut out when it was already selected
+        """
+        self.token_budget = token_budget
+        self.max_documents = max_documents
+        self.lexical_weight = lexical_weight
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.min_sentence_words = min_sentence_words
+
+        rng = np.random.default_rng(0)
+        self._a = rng.integers(1, 1 << 32, num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_permutations, dtype=np.uint64)
+
+    def pack(self, query: str, documents: List[Document]) -> List[Document]:
+        """
+        Select the context to answer a question with.
+
+        Args:
+            query: The question
+            documents: Retrieved chunks, best first
+
+        Returns:
+            The selected chunks, best first, with a "rerank_score" and
+            "tokens" in their metadata. Chunks with text cut out are copies.
+        """
+        with trace("rerank", candidates=len(documents)) as span:
+            selected: List[Document] = []
+            signatures: List[np.ndarray] = []
+            seen_sentences = set()
+            used = duplicates = trimmed = 0
+
+            for document, score in self.rerank(query, documents):
+                if self.max_documents and len(selected) >= self.max_documents:
+                    break
+
+                signature = self.signature(document.page_content)
+                if any(
+                    np.mean(signature == other) >= self.duplicate_threshold
+                    for other in signatures
+                ):
+                    duplicates += 1
+                    continue
+
+                text, sentences = self._new_sentences(document.page_content, seen_sentences)
+                if not text.strip():
+                    duplicates += 1
+                    continue
+                tokens = count_tokens([text])[0]
+                if tokens > self.token_budget - used:
+                    if selected:
+                        continue
+                    # Keep the leading sentences of the best chunk at least
+                    text, tokens = self._truncate(text, self.token_budget)
+                    if not text:
+                        continue
+
+                trimmed += text != document.page_content
+                selected.append(
+                    Document(
+                        page_content=text,
+                        metadata={
+                            **document.metadata,
+                            "rerank_score": round(score, 4),
+                            "tokens": tokens,
+                        },
+                    )
+                )
+                signatures.append(signature)
+                seen_sentences.update(sentences)
+                used += tokens
+
+            span.set_attributes(
+                selected=len(selected),
+                duplicates=duplicates,
+                trimmed=trimmed,
+                context_tokens=used,
+            )
+            return selected
+
+    def rerank(self, query: str, documents: List[Document]) -> List[Tuple[Document, float]]:
+        """
+        Score candidates by BM25 within the candidate set and retrieval rank.
+
+        Args:
+            query: The question
+            documents: Retrieved chunks, best first
+
+        Returns:
+            List of (Document, score) tuples, best first
+        """
+        if not documents:
+            return []
+        query_terms = set(tokenize(query))
+        term_counts = [Counter(tokenize(d.page_content)) for d in documents]
+        lengths = [sum(counts.values()) or 1 for counts in term_counts]
+        average_length = sum(lengths) / len(lengths)
+        document_frequency = Counter(
+            term for counts in term_counts for term in query_terms & counts.keys()
+        )
+
+        count = len(documents)
+        bm25 = []
+        for counts, length in zip(term_counts, lengths):
+            score = 0.0
+            for term in query_terms & counts.keys():
+                idf = math.log(
+                    1 + (count - document_frequency[term] + 0.5)
+                    / (document_frequency[term] + 0.5)
+                )
+                frequency = counts[term]
+                norm = 1.2 * (0.25 + 0.75 * length / average_length)
+                score += idf * frequency * 2.2 / (frequency + norm)
+            bm25.append(score)
+
+        best = max(bm25) or 1.0
+        scores = [
+            self.lexical_weight * lexical / best
+            + (1 - self.lexical_weight) * (1 - rank / count)
+            for rank, lexical in enumerate(bm25)
+        ]
+        order = sorted(range(count), key=lambda i: scores[i], reverse=True)
+        return [(documents[i], scores[i]) for i in order]
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Get the MinHash signature of a text's word shingles.
+
+        Args:
+            text: The text
+
+        Returns:
+            Array of minimum hash values, one per permutation
+        """
+        words = _WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {
+            " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def _new_sentences(self, text: str, seen: set) -> Tuple[str, List[str]]:
+        """Cut sentences out of a text that were already selected."""
+        spans, start = [], 0
+        for match in _SENTENCE_END.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+
+        parts, keys = [], []
+        previous_end = None
+        for start, end in spans:
+            words = _WORD_PATTERN.findall(text[start:end].lower())
+            key = " ".join(words)
+            if len(words) >= self.min_sentence_words:
+                if key in seen:
+                    previous_end = None
+                    continue
+                keys.append(key)
+            if parts:
+                # Keep the original separator between neighbouring sentences
+                parts.append(text[previous_end:start] if previous_end is not None else " ")
+            parts.append(text[start:end])
+            previous_end = end
+        return "".join(parts), keys
+
+    def _truncate(self, text: str, budget: int) -> Tuple[str, int]:
+        """Keep the leading sentences of a text that fit a token budget."""
+        ends = [match.start() for match in _SENTENCE_END.finditer(text)]
+        prefixes = [text[:end] for end in ends]
+        for prefix, tokens in reversed(list(zip(prefixes, count_tokens(prefixes)))):
+            if tokens <= budget:
+                return prefix, tokens
+        return "", 0
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """Retriever over-fetching from another retriever and packing the results."""
+
+    retriever: Any
+    packer: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = self.retriever.get_relevant_documents(
+            query, callbacks=run_manager.get_child()
+        )
+        return self.packer.pack(query, documents)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = await self.retriever.aget_relevant_documents(
+            query, callbacks=run_manager.get_child()
+        )
+        return self.packer.pack(query, documents)
@@ -1,77 +1,488 @@
+import csv
+import io
 import os
-from typing import List, Dict, Any
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    CSVLoader,
-    UnstructuredMarkdownLoader,
-)
+from langchain_core.documents import Document
+
+from .chunker import TokenChunker
+from .ingest_manifest import hash_bytes, hash_file, hash_stream
+from .parse_cache import ParseCache
+from .tracing import trace
+
+# A file to load: a path, or a (file name, contents) pair where the contents
+# are bytes, bytearray, memoryview or a seekable binary file-like object
+FileInput = Union[str, Tuple[str, Any]]
+
+_SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".csv", ".md", ".markdown")
+
+# Formats whose parsing costs more than reading its cached result; text,
+# Markdown and CSV files are only decoded
+_CACHED_EXTENSIONS = (".pdf",)
 
 
 class DocumentProcessor:
     """Utility class for processing documents of various formats."""
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        chunking: Optional[str] = None,
+        chunk_tokens: Optional[int] = None,
+        chunk_overlap_tokens: Optional[int] = None,
+        parse_cache_dir: Optional[str] = None,
+        parse_cache_max_bytes: Optional[int] = None,
+    ):
         """
         Initialize the document processor.
 
         Args:
-            chunk_size: The size of each text chunk
-            chunk_overlap: The overlap between chunks
+            chunk_size: The size of each text chunk in characters
+            chunk_overlap: The overlap between chunks in characters
+            chunking: "tokens" to split along document structure into chunks
+                sized in tokens, or "characters" to split by character count
+                (optional, will use CHUNKING if not provided)
+            chunk_tokens: The size of each text chunk in tokens
+                (optional, will use CHUNK_TOKENS if not provided)
+            chunk_overlap_tokens: The overlap between chunks in tokens
+                (optional, will use CHUNK_OVERLAP_TOKENS if not provided)
+            parse_cache_dir: Directory caching the pages extracted from PDFs
+                by content hash, "" to disable (optional, will use
+                PARSE_CACHE_DIR if not provided)
+            parse_cache_max_bytes: Size limit of the parse cache (optional,
+                will use PARSE_CACHE_MAX_MB if not provided)
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
+        self.chunking = chunking or os.getenv("CHUNKING", "tokens")
+        if self.chunking not in ("tokens", "characters"):
+            raise ValueError(f"Unsupported chunking: {self.chunking}")
+        self.chunk_tokens = chunk_tokens or int(os.getenv("CHUNK_TOKENS", "300"))
+        self.chunk_overlap_tokens = (
+            chunk_overlap_tokens
+            if chunk_overlap_tokens is not None
+            else int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+        )
+        self._text_splitter = None
+
+        # Re-uploads and re-chunking with new settings reuse extracted pages
+        if parse_cache_dir is None:
+            parse_cache_dir = os.getenv("PARSE_CACHE_DIR", ".cache/parsed")
+        self.parse_cache_dir = parse_cache_dir
+        self.parse_cache_max_bytes = parse_cache_max_bytes or (
+            int(os.getenv("PARSE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+        )
+        self.parse_cache = (
+            ParseCache(parse_cache_dir, max_bytes=self.parse_cache_max_bytes)
+            if parse_cache_dir
+            else None
+        )
+        self.chunker = TokenChunker(
+            chunk_tokens=self.chunk_tokens, overlap_tokens=self.chunk_overlap_tokens
         )
 
-    def load_document(self, file_path: str) -> List[Document]:
+    @property
+    def text_splitter(self):
+        """Character splitter of the "characters" chunking, created on first use."""
+        if self._text_splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                length_function=len,
+            )
+        return self._text_splitter
+
+    def load_document(self, source: Any, file_name: Optional[str] = None) -> List[Document]:
         """
         Load a document based on its file extension.
 
+        Files held in memory, e.g. uploads, are parsed straight from their
+        buffer without being written to disk or copied. The pages of PDFs are
+        cached by content hash, so loading the same file again, e.g. to
+        re-chunk it with other settings, skips parsing.
+
         Args:
-            file_path: Path to the document
+            source: Path to the document, its contents as bytes, bytearray or
+                memoryview, or a seekable binary file-like object
+            file_name: Name of the file, required unless source is a path
 
         Returns:
-            List of Document objects
+            List of Document objects: one per PDF page, one per CSV row, or
+            one for a text or Markdown file
         """
-        _, file_extension = os.path.splitext(file_path)
-
-        if file_extension.lower() == ".pdf":
-            loader = PyPDFLoader(file_path)
-        elif file_extension.lower() == ".txt":
-            loader = TextLoader(file_path)
-        elif file_extension.lower() == ".csv":
-            loader = CSVLoader(file_path)
-        elif file_extension.lower() in [".md", ".markdown"]:
-            loader = UnstructuredMarkdownLoader(file_path)
-        else:
+        if file_name is None:
+            if not isinstance(source, (str, os.PathLike)):
+                raise ValueError("A file name is required for in-memory documents.")
+            file_name = os.fspath(source)
+        file_extension = os.path.splitext(file_name)[1].lower()
+        if file_extension not in _SUPPORTED_EXTENSIONS:
             raise ValueError(f"Unsupported file extension: {file_extension}")
 
-        return loader.load()
+        file_hash = _hash(source)
+        cache_key = None
+        if self.parse_cache is not None and file_extension in _CACHED_EXTENSIONS:
+            cache_key = ParseCache.key(file_hash, file_extension)
+
+        with trace(
+            "load_document", file_type=file_extension, file_bytes=_size(source)
+        ) as span:
+            documents = None
+            if cache_key is not None:
+                documents = self.parse_cache.load(cache_key, file_name)
+                span.set_attribute("parse_cache_hit", documents is not None)
+            if documents is None:
+                documents = list(self.iter_document(source, file_name))
+                if cache_key is not None:
+                    self.parse_cache.store(cache_key, documents)
+            span.set_attributes(
+                pages=len(documents),
+                chars=sum(len(document.page_content) for document in documents),
+            )
+
+        # Tag every page with the file it came from so re-uploads can be
+        # diffed, and with its type and ingest time so searches can filter
+        file_name = os.path.basename(file_name)
+        ingested_at = int(time.time())
+        for document in documents:
+            document.metadata["file_name"] = file_name
+            document.metadata["file_hash"] = file_hash
+            document.metadata["file_type"] = file_extension.lstrip(".")
+            document.metadata["ingested_at"] = ingested_at
+
+        return documents
+
+    def iter_document(self, source: Any, file_name: str) -> Iterator[Document]:
+        """
+        Parse a document incrementally.
+
+        PDF pages are read and extracted one at a time from the file or
+        buffer, and CSV rows are decoded as they are read, so the file is
+        never held in memory a second time.
+
+        Args:
+            source: Path to the document, its contents as bytes, bytearray or
+                memoryview, or a seekable binary file-like object
+            file_name: Name of the file, whose extension selects the parser
+
+        Yields:
+            Document objects with the "source" file name and the "page" or
+            "row" they came from, like LangChain's PDF and CSV loaders
+        """
+        file_extension = os.path.splitext(file_name)[1].lower()
+        with _open_binary(source) as stream:
+            if file_extension == ".pdf":
+                # Parsers are imported by the first file needing them
+                import pypdf
+
+                reader = pypdf.PdfReader(stream)
+                for page_number, page in enumerate(reader.pages):
+                    yield Document(
+                        page_content=page.extract_text(),
+                        metadata={"source": file_name, "page": page_number},
+                    )
+            elif file_extension == ".csv":
+                with _text_stream(stream) as text:
+                    for row_number, row in enumerate(csv.DictReader(text)):
+                        content = "\n".join(
+                            f"{key.strip()}: {value.strip() if value is not None else value}"
+                            for key, value in row.items()
+                        )
+                        yield Document(
+                            page_content=content,
+                            metadata={"source": file_name, "row": row_number},
+                        )
+            elif file_extension in (".txt", ".md", ".markdown"):
+                # Markdown keeps its source so headings can guide the chunking
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    content = str(source, "utf-8")
+                else:
+                    with _text_stream(stream) as text:
+                        content = text.read()
+                yield Document(page_content=content, metadata={"source": file_name})
+            else:
+                raise ValueError(f"Unsupported file extension: {file_extension}")
 
-    def process_documents(self, file_paths: List[str]) -> List[Document]:
+    def process_documents(self, files: List[FileInput]) -> List[Document]:
         """
         Process multiple documents and split them into chunks.
 
         Args:
-            file_paths: List of paths to documents
+            files: List of paths to documents, or of (file name, contents)
+                pairs of files held in memory
 
         Returns:
             List of chunked Document objects
         """
         documents = []
 
-        for file_path in file_paths:
-            try:
-                docs = self.load_document(file_path)
-                documents.extend(docs)
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
+        with trace("process_documents", files=len(files)) as span:
+            for file in files:
+                try:
+                    docs = self.load_document(*_source(file))
+                    documents.extend(docs)
+                except Exception as e:
+                    print(f"Error processing {_name(file)}: {e}")
+                    span.increment("errors")
+
+            with trace("split", pages=len(documents)) as split_span:
+                chunks = self.split_documents(documents)
+                split_span.set_attribute("chunks", len(chunks))
+            span.set_attribute("chunks", len(chunks))
+            return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split loaded documents into chunks.
+
+        Args:
+            documents: Documents returned by load_document
 
+        Returns:
+            List of chunked Document objects
+        """
+        if self.chunking == "tokens":
+            return self.chunker.split_documents(documents)
         return self.text_splitter.split_documents(documents)
+
+    def iter_chunk_batches(
+        self,
+        files: List[FileInput],
+        batch_size: int = 256,
+        max_workers: Optional[int] = None,
+    ) -> Iterator[List[Document]]:
+        """
+        Load and split documents in parallel, yielding chunks as files finish.
+
+        Files are parsed and split in a process pool, with at most two files
+        per worker in flight so memory stays bounded regardless of corpus size.
+        All chunks of a file are always yielded in the same batch, so every
+        batch can be diffed per file by VectorStoreManager.add_documents.
+
+        Args:
+            files: List of paths to documents, or of (file name, contents)
+                pairs of files held in memory
+            batch_size: Target number of chunks per batch
+            max_workers: Number of worker processes (defaults to the CPU count)
+
+        Yields:
+            Lists of chunked Document objects
+        """
+        yield from self._batch_chunks(
+            self.iter_file_chunks(files, max_workers=max_workers), batch_size
+        )
+
+    def iter_file_chunks(
+        self,
+        files: List[FileInput],
+        max_workers: Optional[int] = None,
+        low_priority: bool = False,
+    ) -> Iterator[Tuple[str, List[Document], Optional[str]]]:
+        """
+        Load and split documents in parallel, yielding each file's chunks.
+
+        Args:
+            files: List of paths to documents, or of (file name, contents)
+                pairs of files held in memory. Worker processes read paths
+                themselves, while in-memory contents are sent to them as bytes
+            max_workers: Number of worker processes (defaults to the CPU count)
+            low_priority: Whether the worker processes run at a lower CPU
+                priority, so parsing in the background does not slow down
+                serving
+
+        Yields:
+            (name, chunks, error) tuples in the order files finish, where name
+            is the path or file name given for the file and error is None or
+            the message of the exception the file raised
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+
+        # A pool is not worth starting for a single file or a single worker,
+        # unless parsing must stay off this process's CPU time
+        if not low_priority and (max_workers == 1 or len(files) <= 1):
+            for file in files:
+                yield (_name(file), *self._try_load_and_split(file))
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_lower_priority if low_priority else None,
+        ) as executor:
+            yield from self._pool_results(executor, files, max_workers * 2)
+
+    def _pool_results(self, executor, files: List[FileInput], max_in_flight: int):
+        """Submit files to the pool and yield their results as they complete."""
+        remaining = iter(files)
+        pending = {}
+
+        def submit_next():
+            file = next(remaining, None)
+            if file is not None:
+                future = executor.submit(
+                    _load_and_split, _picklable(file), self._settings()
+                )
+                pending[future] = _name(file)
+
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    chunks, error = future.result(), None
+                except Exception as e:
+                    print(f"Error processing {name}: {e}")
+                    chunks, error = [], str(e)
+                submit_next()
+                yield name, chunks, error
+
+    def _try_load_and_split(
+        self, file: FileInput
+    ) -> Tuple[List[Document], Optional[str]]:
+        """Load and split one file, reporting errors like process_documents does."""
+        try:
+            return self.split_documents(self.load_document(*_source(file))), None
+        except Exception as e:
+            print(f"Error processing {_name(file)}: {e}")
+            return [], str(e)
+
+    def _settings(self) -> Dict[str, Any]:
+        """Get the arguments recreating this processor in a worker process."""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunking": self.chunking,
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap_tokens": self.chunk_overlap_tokens,
+            "parse_cache_dir": self.parse_cache_dir,
+            "parse_cache_max_bytes": self.parse_cache_max_bytes,
+        }
+
+    @staticmethod
+    def _batch_chunks(results, batch_size: int) -> Iterator[List[Document]]:
+        """Group per-file chunk lists into batches without splitting a file."""
+        batch: List[Document] = []
+        for _, chunks, _ in results:
+            if batch and len(batch) + len(chunks) > batch_size:
+                yield batch
+                batch = []
+            batch.extend(chunks)
+        if batch:
+            yield batch
+
+
+def _lower_priority():
+    """Lower the CPU priority of a worker process where the OS supports it."""
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def _load_and_split(file: FileInput, settings: Dict[str, Any]) -> List[Document]:
+    """Load and split one file inside a worker process."""
+    processor = DocumentProcessor(**settings)
+    return processor.split_documents(processor.load_document(*_source(file)))
+
+
+def _source(file: FileInput) -> Tuple[Any, Optional[str]]:
+    """Get the load_document arguments of a path or (file name, contents) pair."""
+    if isinstance(file, tuple):
+        file_name, contents = file
+        return contents, file_name
+    return file, None
+
+
+def _name(file: FileInput) -> str:
+    """Get the path or file name of a file."""
+    return file[0] if isinstance(file, tuple) else file
+
+
+def _picklable(file: FileInput) -> FileInput:
+    """Turn in-memory contents that cannot be sent to a worker process into bytes."""
+    if not isinstance(file, tuple) or isinstance(file[1], bytes):
+        return file
+    file_name, contents = file
+    if isinstance(contents, (bytearray, memoryview)):
+        return file_name, bytes(contents)
+    contents.seek(0)
+    return file_name, contents.read()
+
+
+def _size(source: Any) -> int:
+    """Get the size in bytes of a path, buffer or file-like object."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    return source.seek(0, io.SEEK_END)
+
+
+def _hash(source: Any) -> str:
+    """Hash the contents of a path, buffer or file-like object."""
+    if isinstance(source, (str, os.PathLike)):
+        return hash_file(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hash_bytes(source)
+    return hash_stream(source)
+
+
+@contextmanager
+def _open_binary(source: Any) -> Iterator[io.BufferedIOBase]:
+    """Open a path, buffer or file-like object as a seekable binary stream."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with io.BufferedReader(_BufferReader(source)) as f:
+            yield f
+    else:
+        source.seek(0)
+        yield source
+
+
+@contextmanager
+def _text_stream(stream: io.BufferedIOBase) -> Iterator[io.TextIOWrapper]:
+    """Decode a binary stream as UTF-8 text without closing it afterwards."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        yield text
+    finally:
+        # Leave the stream, which may be the caller's file object, open
+        text.detach()
+
+
+class _BufferReader(io.RawIOBase):
+    """Read-only binary stream over an in-memory buffer that never copies it whole."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        data = self._view[self._position : self._position + len(target)]
+        target[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
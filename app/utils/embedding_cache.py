@@ -0,0 +1,349 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .embedding_compression import VectorQuantizer
+from .tracing import trace
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed embedding cache in front of another embeddings model."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_path: str = ".cache/embeddings.sqlite",
+        max_memory_items: int = 10000,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        quantization: str = "none",
+    ):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            embeddings: The underlying embeddings model to call on a cache miss
+            model_name: Name of the embedding model, part of every cache key
+            cache_path: Path to the SQLite file backing the persistent cache
+            max_memory_items: Number of vectors kept in the in-process LRU tier
+            max_disk_bytes: Size limit of the stored vectors before eviction
+            quantization: "int8" to store new vectors as int8 codes with a
+                scale, a quarter of their float32 size, or "none". Vectors
+                are returned as decoded from storage either way, so hits from
+                memory and disk agree
+        """
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Unsupported embedding cache quantization: {quantization}")
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.quantization = quantization
+        self._quantizer = VectorQuantizer("int8")
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access "
+            "ON embeddings (last_access)"
+        )
+        # Caches created before quantization support hold float32 vectors only
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if "encoding" not in columns:
+            self._conn.execute(
+                "ALTER TABLE embeddings ADD COLUMN encoding TEXT NOT NULL DEFAULT 'none'"
+            )
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def cache_key(self, text: str) -> str:
+        """
+        Build the cache key for a text.
+
+        Args:
+            text: The text to embed
+
+        Returns:
+            Hex digest of the model name and the text
+        """
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents, calling the underlying model only for misses.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            List of embeddings, one per text
+        """
+        with trace("embed", texts=len(texts), chars=sum(map(len, texts))) as span:
+            keys = [self.cache_key(text) for text in texts]
+            found = self._lookup(keys)
+
+            # Embed every missing text once, even if it appears several times
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            span.set_attributes(cache_hits=len(found), cache_misses=len(missing))
+
+            if missing:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+                new_entries = dict(zip(missing.keys(), vectors))
+                found.update(self._store(new_entries))
+
+            return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, calling the underlying model only on a miss.
+
+        Args:
+            text: The query text
+
+        Returns:
+            The query embedding
+        """
+        with trace("embed", texts=1, chars=len(text)) as span:
+            key = self.cache_key(text)
+            found = self._lookup([key])
+            span.set_attributes(cache_hits=len(found), cache_misses=1 - len(found))
+            if key in found:
+                return found[key]
+
+            vector = self.embeddings.embed_query(text)
+            return self._store({key: vector})[key]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents with the underlying model's async client.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            List of embeddings, one per text
+        """
+        with trace("embed", texts=len(texts), chars=sum(map(len, texts))) as span:
+            keys = [self.cache_key(text) for text in texts]
+            found = self._lookup(keys)
+
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            span.set_attributes(cache_hits=len(found), cache_misses=len(missing))
+
+            if missing:
+                vectors = await self.embeddings.aembed_documents(list(missing.values()))
+                new_entries = dict(zip(missing.keys(), vectors))
+                found.update(self._store(new_entries))
+
+            return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embed a query with the underlying model's async client.
+
+        Args:
+            text: The query text
+
+        Returns:
+            The query embedding
+        """
+        with trace("embed", texts=1, chars=len(text)) as span:
+            key = self.cache_key(text)
+            found = self._lookup([key])
+            span.set_attributes(cache_hits=len(found), cache_misses=1 - len(found))
+            if key in found:
+                return found[key]
+
+            vector = await self.embeddings.aembed_query(text)
+            return self._store({key: vector})[key]
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit and miss counters of the cache.
+
+        Returns:
+            Dict with hit, miss and size counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["memory_items"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def clear(self):
+        """Remove every cached embedding from memory and disk."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._disk_bytes = 0
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Find the cached vectors for the given keys in memory, then on disk."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            disk_keys = []
+            for key in dict.fromkeys(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+                else:
+                    disk_keys.append(key)
+
+            now = time.time()
+            # Stay below SQLite's limit on the number of bound parameters
+            for start in range(0, len(disk_keys), 500):
+                batch = disk_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, encoding FROM embeddings "
+                    f"WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob, encoding in rows:
+                    found[key] = self._decode(blob, encoding)
+                    self._remember(key, found[key])
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key, _, _ in rows],
+                )
+                self._stats["disk_hits"] += len(rows)
+                self._stats["misses"] += len(batch) - len(rows)
+            if disk_keys:
+                self._conn.commit()
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Write new vectors to both cache tiers and return them as a hit would."""
+        now = time.time()
+        stored: Dict[str, List[float]] = {}
+        with self._lock:
+            rows = []
+            for key, vector in entries.items():
+                blob = self._encode(vector)
+                rows.append(
+                    (key, self.model_name, blob, len(blob), now, self.quantization)
+                )
+                # Keep what a later disk hit would return
+                if self.quantization == "none":
+                    stored[key] = list(vector)
+                else:
+                    stored[key] = self._decode(blob, self.quantization)
+                self._remember(key, stored[key])
+
+            # Concurrent misses of the same text replace rows another caller
+            # already stored, so only the growth counts towards the size
+            replaced = 0
+            keys = list(entries)
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings "
+                    f"WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(key, model, vector, size, last_access, encoding) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._disk_bytes += sum(row[3] for row in rows) - replaced
+
+            if self._disk_bytes > self.max_disk_bytes:
+                # Other processes sharing the file change its size too
+                self._disk_bytes = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+                ).fetchone()[0]
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict()
+        return stored
+
+    def _encode(self, vector: List[float]) -> bytes:
+        """Serialize a vector in the cache's storage encoding."""
+        if self.quantization == "none":
+            return array("f", vector).tobytes()
+        codes, scales = self._quantizer.encode(np.asarray([vector], dtype=np.float32))
+        return scales.tobytes() + codes.tobytes()
+
+    def _decode(self, blob: bytes, encoding: str) -> List[float]:
+        """Deserialize a stored vector."""
+        if encoding == "none":
+            vector = array("f")
+            vector.frombytes(blob)
+            return vector.tolist()
+        # A float32 scale followed by one int8 code per dimension
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)
+        codes = np.frombuffer(blob, dtype=np.int8, offset=4)
+        return self._quantizer.decode(codes[None, :], scale, len(codes))[0].tolist()
+
+    def _remember(self, key: str, vector: List[float]):
+        """Put a vector in the in-process LRU tier."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Drop the least recently used vectors until the store is at 90% of its limit."""
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY last_access ASC"
+        )
+        evicted = []
+        remaining = self._disk_bytes
+        for key, size in rows:
+            if remaining <= target:
+                break
+            evicted.append((key,))
+            remaining -= size
+
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self._conn.commit()
+        for (key,) in evicted:
+            self._memory.pop(key, None)
+        self._disk_bytes = remaining
+        self._stats["evictions"] += len(evicted)
@@ -0,0 +1,234 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Code elements scored per block, so temporary arrays stay cache-sized
+_BLOCK_ELEMENTS = 1 << 18
+
+
+def truncate(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """
+    Shorten embeddings to their leading dimensions, Matryoshka style.
+
+    Models trained with Matryoshka representation learning, such as
+    text-embedding-3-small and -large, front-load information in the leading
+    dimensions, so the shortened vector rescaled to unit length is itself a
+    usable embedding. This is what the OpenAI API's `dimensions` parameter does.
+
+    Args:
+        vectors: Array of shape (n, d) or (d,)
+        dimension: Number of leading dimensions to keep
+
+    Returns:
+        Unit-length float32 array of the same rank with `dimension` columns
+    """
+    shortened = np.asarray(vectors, dtype=np.float32)[..., :dimension]
+    norms = np.linalg.norm(shortened, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return shortened / norms
+
+
+class TruncatedEmbeddings(Embeddings):
+    """Embeddings model returning Matryoshka-truncated vectors of another model."""
+
+    def __init__(self, embeddings: Embeddings, dimension: int):
+        """
+        Initialize the truncated embeddings.
+
+        Wrapping a CachedEmbeddings keeps full vectors in the cache, so the
+        dimension can be changed later without embedding anything again.
+
+        Args:
+            embeddings: The underlying embeddings model
+            dimension: Number of leading dimensions to keep
+        """
+        self.embeddings = embeddings
+        self.dimension = dimension
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            List of truncated embeddings, one per text
+        """
+        vectors = self.embeddings.embed_documents(texts)
+        if not vectors:
+            return []
+        return truncate(vectors, self.dimension).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query.
+
+        Args:
+            text: The query text
+
+        Returns:
+            The truncated query embedding
+        """
+        return truncate(self.embeddings.embed_query(text), self.dimension).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents with the underlying model's async client.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            List of truncated embeddings, one per text
+        """
+        vectors = await self.embeddings.aembed_documents(texts)
+        if not vectors:
+            return []
+        return truncate(vectors, self.dimension).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embed a query with the underlying model's async client.
+
+        Args:
+            text: The query text
+
+        Returns:
+            The truncated query embedding
+        """
+        vector = await self.embeddings.aembed_query(text)
+        return truncate(vector, self.dimension).tolist()
+
+
+class VectorQuantizer:
+    """
+    Compact codes of unit vectors and approximate dot products against them.
+
+    "int8" stores each vector as one byte per dimension plus a float32 scale,
+    a quarter of its float32 size. "binary" stores one bit per dimension, the
+    sign, a 32nd of its float32 size. Queries stay in float32: binary codes are
+    scored asymmetrically with per-byte lookup tables of the query, which
+    ranks far better than the Hamming distance between two sign vectors.
+    """
+
+    def __init__(self, method: str = "int8"):
+        """
+        Initialize the quantizer.
+
+        Args:
+            method: "int8" or "binary"
+        """
+        if method not in QUANTIZATIONS[1:]:
+            raise ValueError(f"Unsupported quantization: {method}")
+        self.method = method
+
+    def code_shape(self, dimension: int) -> Tuple[int, np.dtype]:
+        """
+        Get the width and type of the code of one vector.
+
+        Args:
+            dimension: Dimension of the vectors
+
+        Returns:
+            (number of code elements, NumPy dtype) tuple
+        """
+        if self.method == "int8":
+            return dimension, np.dtype(np.int8)
+        return (dimension + 7) // 8, np.dtype(np.uint8)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quantize vectors.
+
+        Args:
+            vectors: float32 array of shape (n, d)
+
+        Returns:
+            (codes, scales) tuple of an (n, code width) array and the float32
+            factor each row's decoded code is multiplied by
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+
+        # Signs of a unit vector decode to +-1/sqrt(d), keeping unit length
+        codes = np.packbits(vectors > 0, axis=1)
+        scales = np.full(len(vectors), 1 / np.sqrt(vectors.shape[1]), dtype=np.float32)
+        return codes, scales
+
+    def decode(self, codes: np.ndarray, scales: np.ndarray, dimension: int) -> np.ndarray:
+        """
+        Reconstruct approximate vectors from their codes.
+
+        Args:
+            codes: Codes returned by encode
+            scales: Scales returned by encode
+            dimension: Dimension of the original vectors
+
+        Returns:
+            float32 array of shape (n, dimension)
+        """
+        if self.method == "int8":
+            return codes.astype(np.float32) * scales[:, None]
+        signs = np.unpackbits(codes, axis=1, count=dimension).astype(np.float32) * 2 - 1
+        return signs * scales[:, None]
+
+    def scores(self, codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate the dot products of a query with quantized vectors.
+
+        Args:
+            codes: Codes of the vectors to score
+            scales: Scales of the vectors to score
+            query: Unit-length float32 query vector
+
+        Returns:
+            float32 array of one score per row of codes
+        """
+        scores = np.empty(len(codes), dtype=np.float32)
+        rows = max(1, _BLOCK_ELEMENTS // max(1, codes.shape[1]))
+        if self.method == "int8":
+            # Widen block by block so the float copy stays small
+            for start in range(0, len(codes), rows):
+                block = codes[start : start + rows]
+                scores[start : start + len(block)] = block.astype(np.float32) @ query
+            return scores * scales
+
+        # Each byte of a code indexes its own 256-entry slice of the tables
+        tables = self._lookup_tables(query).ravel()
+        offsets = np.arange(codes.shape[1], dtype=np.int32) * 256
+        for start in range(0, len(codes), rows):
+            block = codes[start : start + rows]
+            scores[start : start + len(block)] = tables[block + offsets].sum(axis=1)
+        return scores * scales
+
+    @staticmethod
+    def _lookup_tables(query: np.ndarray) -> np.ndarray:
+        """Get the dot product of each 8-dimension slice of a query with every sign byte."""
+        width = (len(query) + 7) // 8
+        padded = np.zeros(width * 8, dtype=np.float32)
+        padded[: len(query)] = query
+        signs = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+        return padded.reshape(width, 8) @ (signs.astype(np.float32) * 2 - 1).T
+
+
+def get_quantizer(method: Optional[str]) -> Optional[VectorQuantizer]:
+    """
+    Get the quantizer of a method name.
+
+    Args:
+        method: "none", "int8", "binary" or None
+
+    Returns:
+        VectorQuantizer instance, or None for full-precision storage
+    """
+    if not method or method == "none":
+        return None
+    return VectorQuantizer(method)
@@ -0,0 +1,409 @@
+import asyncio
+import hashlib
+import math
+import random
+import re
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from .local_index import matches_filter
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for a 429 response from the embedding or Pinecone API."""
+
+    status = 429
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embeddings for benchmarks and local development."""
+
+    def __init__(
+        self,
+        dimension: int = 3072,
+        latency: float = 0.0,
+        per_text_latency: float = 0.0,
+        rate_limit_probability: float = 0.0,
+        seed: int = 0,
+        semantic: bool = False,
+    ):
+        """
+        Initialize the fake embeddings.
+
+        Args:
+            dimension: Number of dimensions of each vector
+            latency: Simulated seconds per request
+            per_text_latency: Additional simulated seconds per embedded text
+            rate_limit_probability: Chance that a request fails with a 429
+            seed: Seed of the failure injection
+            semantic: Embed texts as hashed bags of words, so texts sharing
+                words get similar vectors and retrieval quality can be measured
+        """
+        self.dimension = dimension
+        self.semantic = semantic
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.rate_limit_probability = rate_limit_probability
+        self.requests = 0
+        self.texts = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            List of unit-length vectors derived from a hash of each text
+        """
+        self._simulate_request(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query.
+
+        Args:
+            text: The query text
+
+        Returns:
+            Unit-length vector derived from a hash of the text
+        """
+        self._simulate_request(1)
+        return self._vector(text)
+
+    def _simulate_request(self, num_texts: int):
+        """Count the request, sleep for the simulated latency and maybe fail."""
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.rate_limit_probability
+        if self.latency or self.per_text_latency:
+            time.sleep(self.latency + self.per_text_latency * num_texts)
+        if fail:
+            raise FakeRateLimitError("429 Too Many Requests (simulated)")
+        with self._lock:
+            self.texts += num_texts
+
+    def _vector(self, text: str) -> List[float]:
+        """Expand a hash of the text into a unit-length vector."""
+        if self.semantic:
+            return self._bag_of_words_vector(text)
+        values = []
+        counter = 0
+        while len(values) < self.dimension:
+            block = hashlib.sha256(f"{counter}\0{text}".encode("utf-8")).digest()
+            values.extend(v / 32768.0 for v in struct.unpack("<16h", block))
+            counter += 1
+        values = values[: self.dimension]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def _bag_of_words_vector(self, text: str) -> List[float]:
+        """Sum a signed hashed feature per word into a unit-length vector."""
+        values = [0.0] * self.dimension
+        for word in _WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            values[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for benchmarks and local development.
+
+    Condensing prompts are answered with the follow-up question unchanged;
+    any other prompt is answered with the sentence of the prompt's context
+    sharing the most words with the question, so answer quality tracks
+    retrieval quality. With streaming set, answers are streamed word by word
+    to callbacks.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    streaming: bool = False
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        time.sleep(self.latency)
+        answer = self._respond(messages)
+        for token in self._tokens(answer) if self.streaming else []:
+            time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        answer = self._respond(messages)
+        for token in self._tokens(answer) if self.streaming else []:
+            await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    @staticmethod
+    def _tokens(answer: str) -> List[str]:
+        """Split an answer into streamed tokens."""
+        return re.findall(r"\S+\s*", answer)
+
+    @staticmethod
+    def _respond(messages: List[BaseMessage]) -> str:
+        """Build the deterministic answer to a prompt."""
+        prompt = "\n".join(message.content for message in messages)
+        if "Follow Up Input:" in prompt:
+            question = prompt.split("Follow Up Input:", 1)[1]
+            return question.split("Standalone question:", 1)[0].strip()
+
+        question = messages[-1].content
+        context = prompt[: -len(question)] if prompt.endswith(question) else prompt
+        context = context.split("----------------", 1)[-1]
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", context)]
+        question_words = set(_WORD_PATTERN.findall(question.lower()))
+        best, best_overlap = "I don't know.", 0
+        for sentence in sentences:
+            overlap = len(question_words & set(_WORD_PATTERN.findall(sentence.lower())))
+            if overlap > best_overlap:
+                best, best_overlap = sentence, overlap
+        return best
+
+
+class FakePineconeIndex:
+    """In-memory stand-in for a Pinecone index with simulated latency and 429s."""
+
+    def __init__(
+        self,
+        dimension: int = 3072,
+        latency: float = 0.0,
+        rate_limit_probability: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Initialize the fake index.
+
+        Args:
+            dimension: Number of dimensions of each vector
+            latency: Simulated seconds per request
+            rate_limit_probability: Chance that a request fails with a 429
+            seed: Seed of the failure injection
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.requests = 0
+
+        self._namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace: Optional[str] = None, **kwargs):
+        """
+        Insert or update vectors.
+
+        Args:
+            vectors: List of dicts with "id", "values" and "metadata", or tuples
+            namespace: Optional namespace for the vectors
+
+        Returns:
+            Dict with the number of upserted vectors
+        """
+        self._simulate_request()
+        with self._lock:
+            records = self._namespaces.setdefault(namespace or "", {})
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    vector_id, values = vector["id"], vector["values"]
+                    metadata = vector.get("metadata") or {}
+                else:
+                    vector_id, values = vector[0], vector[1]
+                    metadata = vector[2] if len(vector) > 2 else {}
+                records[vector_id] = {"values": list(values), "metadata": dict(metadata)}
+        return {"upserted_count": len(vectors)}
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        namespace: Optional[str] = None,
+        include_values: bool = False,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+        **kwargs,
+    ):
+        """
+        Find the nearest vectors by cosine similarity.
+
+        Args:
+            vector: The query vector
+            top_k: Number of matches to return
+            namespace: Optional namespace to search in
+            include_values: Whether to return the vector values
+            include_metadata: Whether to return the metadata
+            filter: Optional Pinecone-style metadata filter
+
+        Returns:
+            Dict with a "matches" list in Pinecone's response format
+        """
+        self._simulate_request()
+        with self._lock:
+            records = [
+                (vector_id, record)
+                for vector_id, record in self._namespaces.get(namespace or "", {}).items()
+                if matches_filter(record["metadata"], filter)
+            ]
+
+        query_norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        scored = []
+        for vector_id, record in records:
+            values = record["values"]
+            norm = math.sqrt(sum(v * v for v in values)) or 1.0
+            score = sum(a * b for a, b in zip(vector, values)) / (norm * query_norm)
+            scored.append((score, vector_id, record))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        matches = []
+        for score, vector_id, record in scored[:top_k]:
+            match = {"id": vector_id, "score": score}
+            if include_values:
+                match["values"] = record["values"]
+            if include_metadata:
+                match["metadata"] = record["metadata"]
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace or ""}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs):
+        """
+        Fetch vectors by ID.
+
+        Args:
+            ids: The vector IDs
+            namespace: Optional namespace to fetch from
+
+        Returns:
+            Dict with a "vectors" mapping in Pinecone's response format
+        """
+        self._simulate_request()
+        with self._lock:
+            records = self._namespaces.get(namespace or "", {})
+            vectors = {
+                vector_id: {"id": vector_id, **records[vector_id]}
+                for vector_id in ids
+                if vector_id in records
+            }
+        return {"vectors": vectors, "namespace": namespace or ""}
+
+    def list(
+        self,
+        prefix: Optional[str] = None,
+        limit: int = 100,
+        namespace: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        List vector IDs page by page.
+
+        Args:
+            prefix: Optional prefix the IDs must start with
+            limit: Number of IDs per page
+            namespace: Optional namespace to list
+
+        Yields:
+            Lists of vector IDs in ID order
+        """
+        with self._lock:
+            ids = sorted(
+                vector_id
+                for vector_id in self._namespaces.get(namespace or "", {})
+                if vector_id.startswith(prefix or "")
+            )
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Delete vectors by ID, or every vector of a namespace.
+
+        Args:
+            ids: The vector IDs to delete
+            delete_all: Whether to delete the whole namespace
+            namespace: Optional namespace to delete from
+        """
+        self._simulate_request()
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace or "", None)
+                return {}
+            records = self._namespaces.get(namespace or "", {})
+            for vector_id in ids or []:
+                records.pop(vector_id, None)
+        return {}
+
+    def describe_index_stats(self, **kwargs):
+        """
+        Describe the index.
+
+        Returns:
+            Dict with the dimension and per-namespace vector counts
+        """
+        with self._lock:
+            namespaces = {
+                name: {"vector_count": len(records)}
+                for name, records in self._namespaces.items()
+            }
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    def _simulate_request(self):
+        """Count the request, sleep for the simulated latency and maybe fail."""
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.rate_limit_probability
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeRateLimitError("429 Too Many Requests (simulated)")
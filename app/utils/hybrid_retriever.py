@@ -0,0 +1,167 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.retrievers import BaseRetriever
+
+from .async_utils import run_blocking
+from .lexical_index import tokenize
+from .tracing import trace
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Document]], k: int = 4, rrf_k: int = 60
+) -> List[Document]:
+    """
+    Merge ranked result lists with reciprocal rank fusion.
+
+    Each document scores the sum of 1 / (rrf_k + rank) over the lists it
+    appears in. Documents are matched by their text, since vector search
+    results carry no IDs.
+
+    Args:
+        result_lists: Ranked lists of documents, best first
+        k: Number of documents to return
+        rrf_k: Rank offset damping the weight of the top ranks
+
+    Returns:
+        The k documents with the highest fused score
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, document in enumerate(results):
+            key = document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, document)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+def keep_rare_match(
+    fused: List[Document], lexical: List[Document], rare_terms: Set[str], k: int = 4
+) -> List[Document]:
+    """
+    Put the best lexical match first when it contains a rare query term.
+
+    Rank fusion weighs both lists equally, so a document ranked first by
+    BM25 for an exact code or identifier is outvoted by documents ranked
+    moderately well in both lists, and a question asking for that
+    identifier loses the one chunk that answers it.
+
+    Args:
+        fused: The fused results, best first
+        lexical: The lexical results, best first
+        rare_terms: Query terms rare enough to identify documents
+        k: Number of documents to return
+
+    Returns:
+        The k documents to return
+    """
+    if not lexical or not rare_terms or rare_terms.isdisjoint(
+        tokenize(lexical[0].page_content)
+    ):
+        return fused[:k]
+    best = lexical[0]
+    rest = [document for document in fused if document.page_content != best.page_content]
+    return [best] + rest[: k - 1]
+
+
+def is_keyword_query(query: str, max_terms: int = 3) -> bool:
+    """
+    Check whether a query looks like a keyword lookup rather than a question.
+
+    Args:
+        query: The query string
+        max_terms: Maximum number of words of a keyword query
+
+    Returns:
+        True for short queries that are not phrased as a question
+    """
+    return (
+        0 < len(query.split()) <= max_terms
+        and bool(tokenize(query))
+        and not query.rstrip().endswith("?")
+    )
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing vector search with BM25 search of the lexical index.
+
+    Keyword-style queries are answered from the lexical index alone when it
+    has matches, so looking up an identifier needs no embedding call. The
+    best lexical match always comes first when it contains a query term
+    rare enough to identify documents, such as an error code.
+    """
+
+    vector_store: Any
+    lexical_index: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    namespace: Optional[str] = None
+    filter: Optional[Dict] = None
+    lexical_fast_path: bool = True
+    rare_idf_ratio: float = 0.75
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        lexical, rare_terms = self._lexical_search(query)
+        if self._use_fast_path(query, lexical):
+            return lexical[: self.k]
+
+        vector = self.vector_store.similarity_search(
+            query, k=self.fetch_k, namespace=self.namespace, filter=self.filter
+        )
+        return self._fuse(vector, lexical, rare_terms)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        lexical_search = asyncio.ensure_future(run_blocking(self._lexical_search, query))
+        if self.lexical_fast_path and is_keyword_query(query):
+            lexical, _ = await lexical_search
+            if self._use_fast_path(query, lexical):
+                return lexical[: self.k]
+
+        # Both searches run concurrently unless the fast path was tried
+        vector, (lexical, rare_terms) = await asyncio.gather(
+            self.vector_store.asimilarity_search(
+                query, k=self.fetch_k, namespace=self.namespace, filter=self.filter
+            ),
+            lexical_search,
+        )
+        return self._fuse(vector, lexical, rare_terms)
+
+    def _lexical_search(self, query: str) -> Tuple[List[Document], Set[str]]:
+        """Get the best lexical matches of a query and its rare terms."""
+        with trace("lexical.search", top_k=self.fetch_k) as span:
+            results = self.lexical_index.search(
+                query, k=self.fetch_k, namespace=self.namespace, filter=self.filter
+            )
+            rare_terms = (
+                self.lexical_index.rare_terms(
+                    query, namespace=self.namespace, idf_ratio=self.rare_idf_ratio
+                )
+                if results
+                else set()
+            )
+            span.set_attributes(matches=len(results), rare_terms=len(rare_terms))
+        return [document for document, _ in results], rare_terms
+
+    def _fuse(
+        self, vector: List[Document], lexical: List[Document], rare_terms: Set[str]
+    ) -> List[Document]:
+        """Merge the vector and lexical results."""
+        fused = reciprocal_rank_fusion([vector, lexical], k=self.k, rrf_k=self.rrf_k)
+        return keep_rare_match(fused, lexical, rare_terms, k=self.k)
+
+    def _use_fast_path(self, query: str, lexical: List[Document]) -> bool:
+        """Check whether the lexical results alone can answer the query."""
+        return self.lexical_fast_path and bool(lexical) and is_keyword_query(query)
@@ -0,0 +1,472 @@
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .document_processor import DocumentProcessor
+from .ingest_manifest import hash_bytes
+from .tracing import trace
+
+# Job states; a job ends in one of the last three
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = (
+    "queued",
+    "running",
+    "completed",
+    "failed",
+    "cancelled",
+)
+
+# States of a job's files besides QUEUED and FAILED; a written file is in the
+# index but not yet on disk, so it is processed again if its job is resumed
+WRITTEN, DONE, SKIPPED = "written", "done", "skipped"
+
+_JOB_COLUMNS = (
+    "job_id, namespace, status, error, cancel_requested, created, updated, "
+    "heartbeat, worker, chunks_added, chunks_unchanged, chunks_deleted"
+)
+
+
+class IngestJobQueue:
+    """
+    Persistent queue of ingestion jobs processed by background worker threads.
+
+    Uploads are spooled to disk and recorded with their files in a SQLite
+    database, so the load, split, embed and upsert pipeline runs outside the
+    request that submitted it and survives restarts. Workers claim queued
+    jobs, parse their files in a low-priority process pool and write whole
+    files at a time, so a cancelled or crashed job never leaves a file half
+    ingested. Running jobs renew a heartbeat; a job whose worker stopped
+    renewing it is resumed from its unfinished files by any worker of the
+    same index, in this process or another.
+    """
+
+    def __init__(
+        self,
+        manager,
+        path: str = ".cache/ingest_jobs.sqlite",
+        spool_dir: str = ".cache/ingest_spool",
+        workers: int = 1,
+        parse_workers: Optional[int] = None,
+        batch_size: int = 256,
+        poll_interval: float = 1.0,
+        stale_after: float = 60.0,
+        flush_interval: float = 30.0,
+    ):
+        """
+        Initialize the job queue and start its workers.
+
+        Args:
+            manager: VectorStoreManager the jobs ingest into
+            path: Path to the SQLite database
+            spool_dir: Directory uploaded files are kept in until their job ends
+            workers: Number of worker threads, i.e. jobs processed at once
+            parse_workers: Number of processes parsing the files of a job
+                (defaults to one less than the CPU count, leaving a core for
+                serving)
+            batch_size: Target number of chunks written per batch
+            poll_interval: Seconds an idle worker waits before checking for jobs
+            stale_after: Seconds without a heartbeat after which a running job
+                is taken over
+            flush_interval: Seconds between writes of the indexes to disk while
+                a job runs. Flushing rewrites a namespace's index files, so
+                doing it per batch would make large jobs quadratic
+        """
+        self.manager = manager
+        self.path = path
+        self.spool_dir = spool_dir
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 1) - 1)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.flush_interval = flush_interval
+        self.index_key = f"{manager.backend}:{manager.pinecone_index_name}"
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._running: Dict[str, float] = {}
+        self._running_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        os.makedirs(spool_dir, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, index_key TEXT NOT NULL, namespace TEXT, "
+            "status TEXT NOT NULL, error TEXT, cancel_requested INTEGER DEFAULT 0, "
+            "created REAL NOT NULL, updated REAL NOT NULL, heartbeat REAL, "
+            "worker TEXT, chunks_added INTEGER DEFAULT 0, "
+            "chunks_unchanged INTEGER DEFAULT 0, chunks_deleted INTEGER DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (index_key, status, created);"
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, file_name TEXT NOT NULL, "
+            "path TEXT NOT NULL, file_hash TEXT NOT NULL, bytes INTEGER NOT NULL, "
+            "status TEXT NOT NULL, chunks INTEGER DEFAULT 0, error TEXT, "
+            "PRIMARY KEY (job_id, position));"
+        )
+        conn.commit()
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._threads.append(
+            threading.Thread(target=self._keep_alive, name="ingest-heartbeat", daemon=True)
+        )
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self, files: Iterable[Tuple[str, Any]], namespace: Optional[str] = None
+    ) -> str:
+        """
+        Queue files for ingestion.
+
+        Args:
+            files: (file name, contents) pairs, the contents as bytes or a
+                buffer such as an upload's getbuffer()
+            namespace: Optional namespace to ingest into
+
+        Returns:
+            ID of the job
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        rows = []
+        for position, (file_name, data) in enumerate(files):
+            file_name = os.path.basename(file_name)
+            # Each file gets its own directory so its name is kept as is
+            file_path = os.path.join(job_dir, str(position), file_name)
+            os.makedirs(os.path.dirname(file_path))
+            with open(file_path, "wb") as f:
+                f.write(data)
+            rows.append(
+                (job_id, position, file_name, file_path, hash_bytes(data), len(data), QUEUED)
+            )
+
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, index_key, namespace, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, self.index_key, namespace, QUEUED, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, position, file_name, path, file_hash, "
+                "bytes, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state and per-file progress of a job.
+
+        Args:
+            job_id: ID of the job
+
+        Returns:
+            Dict of the job with its "files" and "progress" (the fraction of
+            its bytes processed), or None if the job does not exist
+        """
+        conn = self._connection()
+        row = conn.execute(
+            f"SELECT {_JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = self._job(row)
+        job["files"] = [
+            {
+                "file_name": file_name,
+                "bytes": size,
+                "status": status,
+                "chunks": chunks,
+                "error": error,
+            }
+            for file_name, size, status, chunks, error in conn.execute(
+                "SELECT file_name, bytes, status, chunks, error FROM job_files "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            )
+        ]
+        total = sum(f["bytes"] for f in job["files"]) or 1
+        done = sum(f["bytes"] for f in job["files"] if f["status"] != QUEUED)
+        job["progress"] = 1.0 if job["status"] == COMPLETED else done / total
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        List the most recent jobs of the index.
+
+        Args:
+            limit: Maximum number of jobs
+
+        Returns:
+            List of job dicts, newest first, without their files
+        """
+        rows = self._connection().execute(
+            f"SELECT {_JOB_COLUMNS} FROM jobs WHERE index_key = ? "
+            "ORDER BY created DESC LIMIT ?",
+            (self.index_key, limit),
+        )
+        return [self._job(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job.
+
+        A queued job is cancelled at once. A running job stops after the file
+        or batch in progress; files already written stay ingested.
+
+        Args:
+            job_id: ID of the job
+
+        Returns:
+            True if the job had not ended yet
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row[0] not in (QUEUED, RUNNING):
+                return False
+            # The worker of a running job ends it once it sees the request
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, status = ?, updated = ? "
+                "WHERE job_id = ?",
+                (CANCELLED if row[0] == QUEUED else RUNNING, time.time(), job_id),
+            )
+        if row[0] == QUEUED:
+            self._remove_spool(job_id)
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the workers after their current batch.
+
+        Jobs still running are left to be resumed by the next queue started on
+        the same database.
+
+        Args:
+            timeout: Seconds to wait for each worker
+        """
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        """Claim and run jobs until stopped."""
+        while not self._stop.is_set():
+            job_id = self._claim()
+            if job_id is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            with self._running_lock:
+                self._running[job_id] = time.time()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Ingest job {job_id} failed: {e}")
+                self._finish(job_id, FAILED, str(e))
+            finally:
+                with self._running_lock:
+                    self._running.pop(job_id, None)
+
+    def _claim(self) -> Optional[str]:
+        """Take the oldest queued job, or a running one whose worker went silent."""
+        now = time.time()
+        # The transaction holds the write lock, so no two workers claim a job
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE index_key = ? AND "
+                "(status = ? OR (status = ? AND heartbeat < ?)) "
+                "ORDER BY created LIMIT 1",
+                (self.index_key, QUEUED, RUNNING, now - self.stale_after),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, updated = ? "
+                    "WHERE job_id = ?",
+                    (RUNNING, self.worker_id, now, now, row[0]),
+                )
+        return row[0] if row else None
+
+    def _run(self, job_id: str):
+        """Ingest the unfinished files of a job."""
+        conn = self._connection()
+        namespace = conn.execute(
+            "SELECT namespace FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        pending = conn.execute(
+            "SELECT position, file_name, path, file_hash FROM job_files "
+            "WHERE job_id = ? AND status IN (?, ?) ORDER BY position",
+            (job_id, QUEUED, WRITTEN),
+        ).fetchall()
+
+        with trace("ingest.job", job_id=job_id, files=len(pending)) as span:
+            # Files the namespace already holds unchanged, e.g. written before
+            # a crash, are not parsed again
+            positions = {}
+            for position, file_name, path, file_hash in pending:
+                if not os.path.exists(path):
+                    self._file_done(job_id, position, FAILED, "Spooled file missing")
+                elif self.manager.is_file_current(file_name, file_hash, namespace=namespace):
+                    self._file_done(job_id, position, SKIPPED)
+                else:
+                    positions[path] = position
+            span.set_attribute("skipped", len(pending) - len(positions))
+
+            batch, batch_files = [], []
+            interrupted = False
+            flushed = time.monotonic()
+            results = DocumentProcessor().iter_file_chunks(
+                list(positions), max_workers=self.parse_workers, low_priority=True
+            )
+            with closing(results):
+                for path, chunks, error in results:
+                    if self._stop.is_set() or self._cancel_requested(job_id):
+                        interrupted = True
+                        break
+                    if error or not chunks:
+                        self._file_done(
+                            job_id, positions[path], FAILED, error or "No text found"
+                        )
+                        continue
+                    if batch and len(batch) + len(chunks) > self.batch_size:
+                        self._write(job_id, namespace, batch, batch_files)
+                        batch, batch_files = [], []
+                        if time.monotonic() - flushed >= self.flush_interval:
+                            self._checkpoint(job_id)
+                            flushed = time.monotonic()
+                    batch.extend(chunks)
+                    batch_files.append((positions[path], len(chunks)))
+
+            cancelled = self._cancel_requested(job_id)
+            if batch and not cancelled:
+                self._write(job_id, namespace, batch, batch_files)
+            self._checkpoint(job_id)
+            span.set_attributes(cancelled=cancelled, interrupted=interrupted)
+
+        # A job interrupted by stop() stays running and is resumed later
+        if interrupted and not cancelled:
+            return
+        self._finish(job_id, CANCELLED if cancelled else COMPLETED)
+
+    def _write(self, job_id: str, namespace: Optional[str], batch, batch_files):
+        """Upsert a batch of whole files and record their progress."""
+        result = self.manager.add_documents(batch, namespace=namespace, flush=False)
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE job_files SET status = ?, chunks = ? "
+                "WHERE job_id = ? AND position = ?",
+                [(WRITTEN, chunks, job_id, position) for position, chunks in batch_files],
+            )
+            conn.execute(
+                "UPDATE jobs SET chunks_added = chunks_added + ?, "
+                "chunks_unchanged = chunks_unchanged + ?, "
+                "chunks_deleted = chunks_deleted + ?, updated = ?, heartbeat = ? "
+                "WHERE job_id = ?",
+                (
+                    result["added"],
+                    result["unchanged"],
+                    result["deleted"],
+                    time.time(),
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def _checkpoint(self, job_id: str):
+        """Write the indexes to disk and mark the files written so far as done."""
+        with trace("ingest.flush", job_id=job_id):
+            self.manager.flush()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = ? WHERE job_id = ? AND status = ?",
+                (DONE, job_id, WRITTEN),
+            )
+
+    def _file_done(
+        self, job_id: str, position: int, status: str, error: Optional[str] = None
+    ):
+        """Record the outcome of a file that was not written."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = ?, error = ? WHERE job_id = ? AND position = ?",
+                (status, error, job_id, position),
+            )
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None):
+        """Record the end of a job and delete its spooled files."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+        self._remove_spool(job_id)
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        """Check whether a job was asked to stop."""
+        row = self._connection().execute(
+            "SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def _keep_alive(self):
+        """Renew the heartbeat of the jobs this queue is running."""
+        interval = self.stale_after / 4
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE jobs SET heartbeat = ? WHERE job_id = ? AND worker = ?",
+                    [(time.time(), job_id, self.worker_id) for job_id in job_ids],
+                )
+
+    def _remove_spool(self, job_id: str):
+        """Delete the spooled files of a job."""
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+    @staticmethod
+    def _job(row) -> Dict[str, Any]:
+        """Turn a row of the jobs table into a dict."""
+        keys = [column.strip() for column in _JOB_COLUMNS.split(",")]
+        return dict(zip(keys, row))
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements atomically, holding the database's write lock."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection to the database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Let the UI read progress while a worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
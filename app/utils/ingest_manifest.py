@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from langchain_core.documents import Document
+
+
+def hash_bytes(data) -> str:
+    """
+    Hash the contents of a file held in memory.
+
+    Args:
+        data: bytes, bytearray or memoryview with the file contents
+
+    Returns:
+        Hex SHA-256 digest of the data
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Hash the contents of a file on disk without reading it all at once.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Hex SHA-256 digest of the file contents
+    """
+    with open(file_path, "rb") as f:
+        return hash_stream(f)
+
+
+def hash_stream(stream) -> str:
+    """
+    Hash the contents of a binary file-like object from its start.
+
+    Args:
+        stream: Seekable binary file-like object
+
+    Returns:
+        Hex SHA-256 digest of the stream's contents
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1024 * 1024), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(document: Document) -> str:
+    """
+    Get the stable name of the file a chunk came from.
+
+    Uploads are loaded from memory or from a per-job spool directory, so the
+    file name is used instead of the full path.
+
+    Args:
+        document: A chunk produced by DocumentProcessor
+
+    Returns:
+        The file name of the chunk's source
+    """
+    if "file_name" in document.metadata:
+        return document.metadata["file_name"]
+    return os.path.basename(str(document.metadata.get("source", "")))
+
+
+def chunk_ids(source: str, documents: List[Document]) -> List[str]:
+    """
+    Build deterministic vector IDs for the chunks of one file.
+
+    The ID is a hash of the file name followed by a hash of the chunk text, so
+    an unchanged chunk keeps its ID across uploads. Repeated chunk texts within
+    a file get an occurrence suffix to keep the IDs unique.
+
+    Args:
+        source: The file name the chunks came from
+        documents: The chunks of that file, in order
+
+    Returns:
+        List of vector IDs, one per chunk
+    """
+    prefix = source_prefix(source)
+    seen: Dict[str, int] = {}
+    ids = []
+    for document in documents:
+        text_hash = hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+        occurrence = seen.get(text_hash, 0)
+        seen[text_hash] = occurrence + 1
+        ids.append(f"{prefix}{text_hash[:32]}-{occurrence}")
+    return ids
+
+
+def source_prefix(source: str) -> str:
+    """
+    Get the vector ID prefix shared by every chunk of a file.
+
+    Args:
+        source: The file name
+
+    Returns:
+        ID prefix for the file's chunks
+    """
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16] + "#"
+
+
+class IngestManifest:
+    """Per-namespace record of ingested files and the vector IDs of their chunks."""
+
+    def __init__(self, manifest_dir: str = ".cache/manifests", index_name: str = ""):
+        """
+        Initialize the manifest.
+
+        Args:
+            manifest_dir: Directory holding one JSON manifest per namespace
+            index_name: Name of the index, so different indexes don't share manifests
+        """
+        self.directory = os.path.join(manifest_dir, quote(index_name or "default", safe=""))
+        self._cache: Dict[str, Dict[str, Dict]] = {}
+        self._unsaved = set()
+        self._lock = threading.RLock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, namespace: Optional[str], source: str) -> Optional[Dict]:
+        """
+        Get the manifest entry of a file.
+
+        Args:
+            namespace: The namespace the file was ingested into
+            source: The file name
+
+        Returns:
+            Dict with "file_hash" and "chunk_ids", or None if the file is unknown
+        """
+        return self._load(namespace).get(source)
+
+    def is_current(self, namespace: Optional[str], source: str, file_hash: str) -> bool:
+        """
+        Check whether a file was already ingested with exactly this content.
+
+        Args:
+            namespace: The namespace to check
+            source: The file name
+            file_hash: Hash of the file contents
+
+        Returns:
+            True if the namespace already holds the chunks of this file version
+        """
+        entry = self.get(namespace, source)
+        return entry is not None and entry.get("file_hash") == file_hash
+
+    def sources(self, namespace: Optional[str]) -> List[str]:
+        """
+        List the files ingested into a namespace.
+
+        Args:
+            namespace: The namespace to list
+
+        Returns:
+            List of file names
+        """
+        return list(self._load(namespace))
+
+    def update(
+        self,
+        namespace: Optional[str],
+        source: str,
+        file_hash: Optional[str],
+        chunk_ids: List[str],
+        save: bool = True,
+    ):
+        """
+        Record the chunks currently stored for a file.
+
+        Args:
+            namespace: The namespace the file was ingested into
+            source: The file name
+            file_hash: Hash of the file contents
+            chunk_ids: Vector IDs of the file's chunks
+            save: Whether to write the manifest to disk now, or on the next
+                flush
+        """
+        with self._lock:
+            entries = self._load(namespace)
+            entries[source] = {"file_hash": file_hash, "chunk_ids": list(chunk_ids)}
+            if save:
+                self._save(namespace, entries)
+            else:
+                self._unsaved.add(namespace or "")
+
+    def flush(self):
+        """Write the manifests of updates made with save=False to disk."""
+        with self._lock:
+            for key in self._unsaved:
+                self._save(key or None, self._cache[key])
+            self._unsaved.clear()
+
+    def remove(self, namespace: Optional[str], source: str):
+        """
+        Forget a file.
+
+        Args:
+            namespace: The namespace the file was ingested into
+            source: The file name
+        """
+        with self._lock:
+            entries = self._load(namespace)
+            if entries.pop(source, None) is not None:
+                self._save(namespace, entries)
+
+    def clear(self, namespace: Optional[str]):
+        """
+        Forget every file of a namespace.
+
+        Args:
+            namespace: The namespace to clear
+        """
+        with self._lock:
+            self._cache[namespace or ""] = {}
+            self._unsaved.discard(namespace or "")
+            path = self._path(namespace)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _path(self, namespace: Optional[str]) -> str:
+        """Get the manifest file of a namespace."""
+        name = quote(namespace, safe="") if namespace else "__default__"
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _load(self, namespace: Optional[str]) -> Dict[str, Dict]:
+        """Load a namespace's manifest, reading it from disk only once."""
+        key = namespace or ""
+        with self._lock:
+            if key not in self._cache:
+                path = self._path(namespace)
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._cache[key] = json.load(f)
+                else:
+                    self._cache[key] = {}
+            return self._cache[key]
+
+    def _save(self, namespace: Optional[str], entries: Dict[str, Dict]):
+        """Atomically write a namespace's manifest to disk."""
+        path = self._path(namespace)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,482 @@
+import atexit
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .local_index import matches_filter
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercase terms for the lexical index.
+
+    Identifiers such as error codes or SKUs ("ERR-1042", "sku_7781.b") are
+    kept whole, and their parts are added as terms of their own.
+
+    Args:
+        text: The text to split
+
+    Returns:
+        List of terms
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    parts = [
+        part
+        for token in tokens
+        if not token.isalnum()
+        for part in _PART_PATTERN.findall(token)
+    ]
+    return tokens + parts if parts else tokens
+
+
+class _LexicalNamespace:
+    """Documents and postings of one namespace."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadata: List[Dict] = []
+        self.rows: Dict[str, int] = {}
+        self.lengths = array("i")
+        self.alive = bytearray()
+        self.live_count = 0
+        self.total_length = 0
+        # Term -> (rows, term frequencies) of the documents containing it
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.dirty = False
+
+    def add(self, doc_id: str, text: str, metadata: Dict):
+        """Append a document and its postings."""
+        counts = Counter(tokenize(text))
+        row = len(self.ids)
+        self.ids.append(doc_id)
+        self.texts.append(text)
+        self.metadata.append(metadata)
+        self.rows[doc_id] = row
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.alive.append(1)
+        self.live_count += 1
+        self.total_length += length
+        for term, count in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("i"), array("i"))
+            posting[0].append(row)
+            posting[1].append(count)
+
+    def remove(self, doc_id: str):
+        """Tombstone a document; its postings are dropped on compaction."""
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        self.alive[row] = 0
+        self.live_count -= 1
+        self.total_length -= self.lengths[row]
+
+    @property
+    def dead_count(self) -> int:
+        return len(self.ids) - self.live_count
+
+    def compact(self) -> "_LexicalNamespace":
+        """Rebuild the namespace without its removed documents."""
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        kept = np.flatnonzero(alive).tolist()
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)[alive]
+
+        compacted = _LexicalNamespace()
+        compacted.ids = [self.ids[row] for row in kept]
+        compacted.texts = [self.texts[row] for row in kept]
+        compacted.metadata = [self.metadata[row] for row in kept]
+        compacted.rows = {doc_id: row for row, doc_id in enumerate(compacted.ids)}
+        compacted.lengths = array("i", lengths.tobytes())
+        compacted.alive = bytearray(b"\x01" * len(kept))
+        compacted.live_count = len(kept)
+        compacted.total_length = int(lengths.sum())
+        compacted.dirty = True
+        if not self.postings:
+            return compacted
+
+        # Filter and renumber the postings in flat arrays instead of
+        # tokenizing every remaining text again
+        terms = list(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(self.postings[term][0]) for term in terms], out=offsets[1:])
+        rows = np.concatenate(
+            [np.frombuffer(self.postings[term][0], dtype=np.int32) for term in terms]
+        )
+        frequencies = np.concatenate(
+            [np.frombuffer(self.postings[term][1], dtype=np.int32) for term in terms]
+        )
+        keep = alive[rows]
+        new_rows = (np.cumsum(alive, dtype=np.int32) - 1)[rows[keep]]
+        frequencies = frequencies[keep]
+        new_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.add.reduceat(keep, offsets[:-1], dtype=np.int64), out=new_offsets[1:])
+
+        for i, term in enumerate(terms):
+            start, end = new_offsets[i], new_offsets[i + 1]
+            if start < end:
+                compacted.postings[term] = (
+                    array("i", new_rows[start:end].tobytes()),
+                    array("i", frequencies[start:end].tobytes()),
+                )
+        return compacted
+
+
+class BM25Index:
+    """Local inverted index with BM25 scoring, one index per namespace."""
+
+    def __init__(
+        self,
+        directory: str = ".cache/lexical_index",
+        k1: float = 1.2,
+        b: float = 0.75,
+        prune_min_documents: int = 10000,
+    ):
+        """
+        Initialize the lexical index.
+
+        Args:
+            directory: Directory the namespaces are persisted to
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            prune_min_documents: Namespace size from which query terms found
+                in most documents are skipped when rarer terms match
+        """
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.prune_min_documents = prune_min_documents
+
+        self._namespaces: Dict[str, _LexicalNamespace] = {}
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if os.path.isdir(os.path.join(directory, name)):
+                self._load(unquote(name) if name != "__default__" else "")
+
+        atexit.register(self.flush)
+
+    def add(
+        self,
+        ids: List[str],
+        documents: Iterable[Document],
+        namespace: Optional[str] = None,
+    ):
+        """
+        Add or replace documents.
+
+        Args:
+            ids: IDs of the documents, e.g. the vector IDs of the chunks
+            documents: The documents
+            namespace: Optional namespace to add to
+        """
+        with self._lock:
+            ns = self._namespace(namespace, create=True)
+            for doc_id, document in zip(ids, documents):
+                ns.remove(doc_id)
+                ns.add(doc_id, document.page_content, dict(document.metadata))
+            ns.dirty = True
+            self._maybe_compact(namespace)
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: Optional[str] = None,
+    ):
+        """
+        Delete documents by ID, or a whole namespace.
+
+        Args:
+            ids: IDs of the documents to delete
+            delete_all: Delete every document of the namespace
+            namespace: Optional namespace to delete from
+        """
+        with self._lock:
+            name = namespace or ""
+            if delete_all:
+                if name in self._namespaces:
+                    self._namespaces[name] = _LexicalNamespace()
+                    self._namespaces[name].dirty = True
+                return
+            ns = self._namespace(namespace)
+            if ns is None:
+                return
+            for doc_id in ids or []:
+                ns.remove(doc_id)
+            ns.dirty = True
+            self._maybe_compact(namespace)
+
+    def search(
+        self,
+        query: str,
+        k: int = 4,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the documents with the highest BM25 score for a query.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            namespace: Optional namespace to search in
+            filter: Optional Pinecone-style metadata filter
+
+        Returns:
+            List of (Document, score) tuples, best first. In namespaces of
+            at least prune_min_documents documents, documents matching only
+            terms that occur in most documents are left out when rarer terms
+            of the query match.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not ns.live_count or not terms:
+                return []
+
+            count = ns.live_count
+            average_length = ns.total_length / count
+            lengths = np.frombuffer(ns.lengths, dtype=np.int32)
+            postings = [ns.postings[term] for term in terms if term in ns.postings]
+            # In large namespaces, terms in most documents add almost nothing
+            # to the scores but dominate the work, so they only count when no
+            # rarer term matched. In small ones a topic word easily occurs in
+            # half of the documents, so every term is scored and IDF weighs
+            # them. A filter may exclude every match of the rare terms, so
+            # filtered searches score all terms too
+            rare = []
+            if count >= self.prune_min_documents and not filter:
+                rare = [posting for posting in postings if len(posting[0]) <= count // 2]
+            matched_rows, contributions = [], []
+            for posting in rare or postings:
+                rows = np.frombuffer(posting[0], dtype=np.int32)
+                frequencies = np.frombuffer(posting[1], dtype=np.int32).astype(np.float32)
+                # Postings may still list removed documents until compaction
+                document_frequency = min(len(rows), count)
+                idf = math.log(
+                    1 + (count - document_frequency + 0.5) / (document_frequency + 0.5)
+                )
+                norms = self.k1 * (1 - self.b + self.b * lengths[rows] / average_length)
+                matched_rows.append(rows)
+                contributions.append(
+                    idf * frequencies * (self.k1 + 1) / (frequencies + norms)
+                )
+            if not matched_rows:
+                return []
+
+            rows = np.concatenate(matched_rows)
+            contributions = np.concatenate(contributions)
+            if len(rows) * 16 < len(ns.ids):
+                # Rare terms: sum the scores of the matched rows only
+                rows, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=contributions)
+            else:
+                scores = np.bincount(rows, weights=contributions, minlength=len(ns.ids))
+                rows = np.arange(len(ns.ids))
+            scores *= np.frombuffer(ns.alive, dtype=np.uint8)[rows]
+
+            if filter:
+                # Walk the matches best first until k of them pass the filter
+                ranked = np.argsort(-scores)[: np.count_nonzero(scores > 0)]
+                top = list(
+                    islice(
+                        (i for i in ranked if matches_filter(ns.metadata[rows[i]], filter)),
+                        k,
+                    )
+                )
+            else:
+                k = min(k, len(scores))
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+            return [
+                (
+                    Document(
+                        page_content=ns.texts[rows[i]],
+                        metadata=dict(ns.metadata[rows[i]]),
+                    ),
+                    float(scores[i]),
+                )
+                for i in top
+                if scores[i] > 0
+            ]
+
+    def rare_terms(
+        self, query: str, namespace: Optional[str] = None, idf_ratio: float = 0.75
+    ) -> Set[str]:
+        """
+        Get the terms of a query rare enough to identify documents.
+
+        A term is rare when its IDF is at least idf_ratio times the IDF of a
+        term found in a single document, so the cutoff grows with the size
+        of the namespace. Codes and identifiers are rare terms.
+
+        Args:
+            query: The query string
+            namespace: Optional namespace to look the terms up in
+            idf_ratio: Fraction of the highest possible IDF a term must reach
+
+        Returns:
+            Set of rare query terms found in the namespace
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not ns.live_count:
+                return set()
+
+            count = ns.live_count
+            highest = math.log(1 + (count - 0.5) / 1.5)
+            rare = set()
+            for term in terms & ns.postings.keys():
+                document_frequency = min(len(ns.postings[term][0]), count)
+                idf = math.log(
+                    1 + (count - document_frequency + 0.5) / (document_frequency + 0.5)
+                )
+                if idf >= idf_ratio * highest:
+                    rare.add(term)
+            return rare
+
+    def ids(self, namespace: Optional[str] = None, prefix: str = "") -> List[str]:
+        """
+        Get the IDs of the documents of a namespace.
+
+        Args:
+            namespace: Optional namespace to list
+            prefix: Prefix the IDs must start with
+
+        Returns:
+            List of document IDs
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return []
+            return [doc_id for doc_id in ns.rows if doc_id.startswith(prefix)]
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        """
+        Get the number of documents in a namespace.
+
+        Args:
+            namespace: Optional namespace to count
+
+        Returns:
+            Number of documents
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            return ns.live_count if ns else 0
+
+    def flush(self):
+        """Write every modified namespace to disk."""
+        with self._lock:
+            for name in list(self._namespaces):
+                ns = self._namespaces[name]
+                if not ns.dirty:
+                    continue
+                if ns.dead_count:
+                    ns = self._namespaces[name] = ns.compact()
+                self._save(name, ns)
+                ns.dirty = False
+
+    def _namespace(self, namespace: Optional[str], create: bool = False):
+        """Get a namespace, optionally creating it."""
+        name = namespace or ""
+        if name not in self._namespaces and create:
+            self._namespaces[name] = _LexicalNamespace()
+        return self._namespaces.get(name)
+
+    def _maybe_compact(self, namespace: Optional[str]):
+        """Rebuild a namespace once removed documents make up a quarter of it."""
+        name = namespace or ""
+        ns = self._namespaces[name]
+        if ns.dead_count > max(1000, len(ns.ids) // 4):
+            self._namespaces[name] = ns.compact()
+
+    def _path(self, name: str) -> str:
+        """Get the directory of a namespace."""
+        return os.path.join(self.directory, quote(name, safe="") if name else "__default__")
+
+    def _save(self, name: str, ns: _LexicalNamespace):
+        """Atomically write a namespace's documents and postings."""
+        path = self._path(name)
+        os.makedirs(path, exist_ok=True)
+
+        # Store the postings as one flat array per field plus term offsets
+        terms = list(ns.postings)
+        sizes = [len(ns.postings[term][0]) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        rows = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.int32)
+        for i, term in enumerate(terms):
+            rows[offsets[i] : offsets[i + 1]] = ns.postings[term][0]
+            frequencies[offsets[i] : offsets[i + 1]] = ns.postings[term][1]
+
+        with open(os.path.join(path, "postings.npz.tmp"), "wb") as f:
+            np.savez(
+                f,
+                offsets=offsets,
+                rows=rows,
+                frequencies=frequencies,
+                lengths=np.frombuffer(ns.lengths, dtype=np.int32),
+            )
+        with open(os.path.join(path, "docs.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": ns.ids,
+                    "texts": ns.texts,
+                    "metadata": ns.metadata,
+                    "terms": terms,
+                },
+                f,
+            )
+        os.replace(os.path.join(path, "postings.npz.tmp"), os.path.join(path, "postings.npz"))
+        os.replace(os.path.join(path, "docs.json.tmp"), os.path.join(path, "docs.json"))
+
+    def _load(self, name: str):
+        """Load a namespace written by _save."""
+        path = self._path(name)
+        postings_path = os.path.join(path, "postings.npz")
+        docs_path = os.path.join(path, "docs.json")
+        if not (os.path.exists(postings_path) and os.path.exists(docs_path)):
+            return
+        with open(docs_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        arrays = np.load(postings_path)
+
+        ns = _LexicalNamespace()
+        ns.ids = docs["ids"]
+        ns.texts = docs["texts"]
+        ns.metadata = docs["metadata"]
+        ns.rows = {doc_id: row for row, doc_id in enumerate(ns.ids)}
+        ns.lengths = array("i", arrays["lengths"].tobytes())
+        ns.alive = bytearray(b"\x01" * len(ns.ids))
+        ns.live_count = len(ns.ids)
+        ns.total_length = int(arrays["lengths"].sum())
+
+        offsets, rows, frequencies = arrays["offsets"], arrays["rows"], arrays["frequencies"]
+        for i, term in enumerate(docs["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            ns.postings[term] = (
+                array("i", rows[start:end].tobytes()),
+                array("i", frequencies[start:end].tobytes()),
+            )
+        self._namespaces[name] = ns
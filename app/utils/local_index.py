@@ -0,0 +1,871 @@
+import atexit
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .async_utils import AsyncSearchMixin
+from .embedding_compression import VectorQuantizer, get_quantizer
+from .tracing import trace
+
+
+def matches_filter(metadata: Dict[str, Any], metadata_filter: Optional[Dict]) -> bool:
+    """
+    Evaluate a Pinecone-style metadata filter against a record's metadata.
+
+    Supports $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $and, $or and plain
+    values as shorthand for $eq.
+
+    Args:
+        metadata: The record's metadata
+        metadata_filter: The filter, or None to match everything
+
+    Returns:
+        True if the record matches the filter
+    """
+    if not metadata_filter:
+        return True
+
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    """Apply one filter operator to a metadata value."""
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+class _Namespace:
+    """Vectors, IDs and metadata of one namespace of a LocalVectorIndex."""
+
+    def __init__(self, dimension: int, quantizer: Optional[VectorQuantizer] = None):
+        self.dimension = dimension
+        self.quantizer = quantizer
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.count = 0
+        self.dirty = False
+
+        # Quantized copy of the vectors searched first when a quantizer is set
+        self.codes: Optional[np.ndarray] = None
+        self.scales = np.zeros(0, dtype=np.float32)
+        if quantizer is not None:
+            width, dtype = quantizer.code_shape(dimension)
+            self.codes = np.zeros((0, width), dtype=dtype)
+
+        # Rows matching recently used metadata filters, reset on every write
+        self.filter_rows: Dict[str, np.ndarray] = {}
+
+        # Inverted file (IVF) structures, built once the namespace is large
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_count = 0
+        self._list_order: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        """Get the normalized vectors currently stored."""
+        return self.vectors[: self.count]
+
+    def reserve(self, extra: int):
+        """Grow the vector matrix so it can hold `extra` more rows."""
+        needed = self.count + extra
+        if needed <= len(self.vectors) and self.vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self.vectors), 1024)
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        vectors[: self.count] = self.vectors[: self.count]
+        self.vectors = vectors
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        kept = min(self.count, len(self.assignments))
+        assignments[:kept] = self.assignments[:kept]
+        self.assignments = assignments
+        if self.codes is not None:
+            codes = np.zeros((capacity, self.codes.shape[1]), dtype=self.codes.dtype)
+            codes[: self.count] = self.codes[: self.count]
+            self.codes = codes
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[: self.count] = self.scales[: self.count]
+            self.scales = scales
+
+
+class LocalVectorIndex:
+    """In-process vector index with the subset of Pinecone's Index API the app uses."""
+
+    def __init__(
+        self,
+        directory: str = ".cache/local_index",
+        dimension: int = 3072,
+        ivf_lists: int = 0,
+        ivf_probes: int = 8,
+        ivf_min_vectors: int = 20000,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+    ):
+        """
+        Initialize the local index.
+
+        Args:
+            directory: Directory the namespaces are persisted to
+            dimension: Dimension of the embeddings
+            ivf_lists: Number of IVF lists for approximate search (0 for exact search)
+            ivf_probes: Number of IVF lists scanned per query
+            ivf_min_vectors: Namespace size from which the IVF index is used
+            quantization: "int8" or "binary" to search a quantized copy of the
+                vectors held in memory, or "none" to search the float32 vectors
+            rescore_factor: With quantization, the top_k * rescore_factor best
+                coarse matches are scored again with the float32 vectors, which
+                stay memory-mapped from disk (0 to return the coarse scores)
+        """
+        self.directory = directory
+        self.dimension = dimension
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.ivf_min_vectors = ivf_min_vectors
+        self.quantizer = get_quantizer(quantization)
+        self.rescore_factor = rescore_factor
+
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if os.path.isdir(os.path.join(directory, name)):
+                self._load(unquote(name) if name != "__default__" else "")
+
+        atexit.register(self.flush)
+
+    def upsert(self, vectors, namespace: Optional[str] = None, **kwargs):
+        """
+        Insert or update vectors.
+
+        Args:
+            vectors: List of dicts with "id", "values" and "metadata", or tuples
+            namespace: Optional namespace for the vectors
+
+        Returns:
+            Dict with the number of upserted vectors
+        """
+        records = []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                records.append(
+                    (vector["id"], vector["values"], vector.get("metadata") or {})
+                )
+            else:
+                records.append(
+                    (vector[0], vector[1], vector[2] if len(vector) > 2 else {})
+                )
+
+        values = np.asarray([values for _, values, _ in records], dtype=np.float32)
+        values = self._normalize(values.reshape(len(records), -1))
+
+        with self._lock:
+            ns = self._namespace(namespace, create=True)
+            ns.reserve(len(records))
+            if ns.codes is not None:
+                codes, scales = self.quantizer.encode(values)
+            for i, ((vector_id, _, metadata), row_values) in enumerate(
+                zip(records, values)
+            ):
+                row = ns.rows.get(vector_id)
+                if row is None:
+                    row = ns.count
+                    ns.count += 1
+                    ns.rows[vector_id] = row
+                    ns.ids.append(vector_id)
+                    ns.metadata.append(dict(metadata))
+                else:
+                    ns.metadata[row] = dict(metadata)
+                ns.vectors[row] = row_values
+                if ns.codes is not None:
+                    ns.codes[row] = codes[i]
+                    ns.scales[row] = scales[i]
+                ns.assignments[row] = -1
+            ns.dirty = True
+            ns.filter_rows = {}
+            self._update_ivf(ns)
+        return {"upserted_count": len(records)}
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        namespace: Optional[str] = None,
+        include_values: bool = False,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+        **kwargs,
+    ):
+        """
+        Find the nearest vectors by cosine similarity.
+
+        Args:
+            vector: The query vector
+            top_k: Number of matches to return
+            namespace: Optional namespace to search in
+            include_values: Whether to return the vector values
+            include_metadata: Whether to return the metadata
+            filter: Optional Pinecone-style metadata filter
+
+        Returns:
+            Dict with a "matches" list in Pinecone's response format
+        """
+        query = self._normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or ns.count == 0:
+                return {"matches": [], "namespace": namespace or ""}
+
+            # Filtered queries only score the matching rows, all of them, so
+            # selective filters still fill top_k and search less
+            if filter:
+                candidates = self._filter_rows(ns, filter)
+            else:
+                candidates = self._candidates(ns, query)
+            rows = np.arange(ns.count) if candidates is None else candidates
+            scores = self._scores(ns, query, candidates)
+            if ns.codes is not None and self.rescore_factor:
+                # Re-score the best coarse matches at full precision, reading
+                # only their rows of the float32 vectors
+                shortlist = self._top(scores, top_k * self.rescore_factor)
+                rows = rows[shortlist]
+                scores = ns.vectors[rows] @ query
+
+            matches = []
+            for position in self._top(scores, top_k):
+                row = int(rows[position])
+                match = {"id": ns.ids[row], "score": float(scores[position])}
+                if include_values:
+                    match["values"] = ns.vectors[row].tolist()
+                if include_metadata:
+                    match["metadata"] = ns.metadata[row]
+                matches.append(match)
+                if len(matches) == top_k:
+                    break
+        return {"matches": matches, "namespace": namespace or ""}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs):
+        """
+        Fetch vectors by ID.
+
+        Args:
+            ids: The vector IDs
+            namespace: Optional namespace to fetch from
+
+        Returns:
+            Dict with a "vectors" mapping in Pinecone's response format
+        """
+        vectors = {}
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is not None:
+                for vector_id in ids:
+                    row = ns.rows.get(vector_id)
+                    if row is not None:
+                        vectors[vector_id] = {
+                            "id": vector_id,
+                            "values": ns.vectors[row].tolist(),
+                            "metadata": ns.metadata[row],
+                        }
+        return {"vectors": vectors, "namespace": namespace or ""}
+
+    def list(
+        self,
+        prefix: Optional[str] = None,
+        limit: int = 100,
+        namespace: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        List vector IDs page by page.
+
+        Args:
+            prefix: Optional prefix the IDs must start with
+            limit: Number of IDs per page
+            namespace: Optional namespace to list
+
+        Yields:
+            Lists of vector IDs in ID order
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = sorted(
+                vector_id
+                for vector_id in (ns.ids if ns is not None else [])
+                if vector_id.startswith(prefix or "")
+            )
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict] = None,
+        **kwargs,
+    ):
+        """
+        Delete vectors by ID or filter, or every vector of a namespace.
+
+        Args:
+            ids: The vector IDs to delete
+            delete_all: Whether to delete the whole namespace
+            namespace: Optional namespace to delete from
+            filter: Optional Pinecone-style metadata filter of vectors to delete
+        """
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {}
+            if delete_all:
+                ns.ids, ns.metadata, ns.rows = [], [], {}
+                ns.count = 0
+                ns.centroids = None
+                ns.trained_count = 0
+            else:
+                targets = list(ids or [])
+                if filter:
+                    targets.extend(
+                        ns.ids[row]
+                        for row in range(ns.count)
+                        if matches_filter(ns.metadata[row], filter)
+                    )
+                for vector_id in targets:
+                    self._remove(ns, vector_id)
+            ns.dirty = True
+            ns.filter_rows = {}
+            ns._list_order = None
+        return {}
+
+    def describe_index_stats(self, **kwargs):
+        """
+        Describe the index.
+
+        Returns:
+            Dict with the dimension and per-namespace vector counts
+        """
+        with self._lock:
+            namespaces = {
+                name: {"vector_count": ns.count}
+                for name, ns in self._namespaces.items()
+                if ns.count
+            }
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    def flush(self):
+        """Write every modified namespace to disk."""
+        with self._lock:
+            for name, ns in self._namespaces.items():
+                if ns.dirty:
+                    self._save(name, ns)
+                    ns.dirty = False
+
+    def _namespace(self, namespace: Optional[str], create: bool = False):
+        """Get a namespace, optionally creating it."""
+        name = namespace or ""
+        if name not in self._namespaces and create:
+            self._namespaces[name] = _Namespace(self.dimension, self.quantizer)
+        return self._namespaces.get(name)
+
+    def _remove(self, ns: _Namespace, vector_id: str):
+        """Delete one vector by moving the last row into its place."""
+        row = ns.rows.pop(vector_id, None)
+        if row is None:
+            return
+        if not ns.vectors.flags.writeable:
+            ns.reserve(0)
+        last = ns.count - 1
+        if row != last:
+            moved_id = ns.ids[last]
+            ns.vectors[row] = ns.vectors[last]
+            if ns.codes is not None:
+                ns.codes[row] = ns.codes[last]
+                ns.scales[row] = ns.scales[last]
+            ns.assignments[row] = ns.assignments[last]
+            ns.ids[row] = moved_id
+            ns.metadata[row] = ns.metadata[last]
+            ns.rows[moved_id] = row
+        ns.ids.pop()
+        ns.metadata.pop()
+        ns.count -= 1
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """Scale vectors to unit length so dot products are cosine similarities."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _scores(
+        self, ns: _Namespace, query: np.ndarray, candidates: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """Score the candidate rows, or every row, against a query."""
+        if ns.codes is None:
+            if candidates is None:
+                return ns.matrix() @ query
+            return ns.vectors[candidates] @ query
+        if candidates is None:
+            return self.quantizer.scores(
+                ns.codes[: ns.count], ns.scales[: ns.count], query
+            )
+        return self.quantizer.scores(ns.codes[candidates], ns.scales[candidates], query)
+
+    @staticmethod
+    def _top(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Get the positions of the best scores in descending order."""
+        if top_k < len(scores):
+            # Partial selection is O(n); only the k winners are sorted
+            best = np.argpartition(-scores, top_k)[:top_k]
+            return best[np.argsort(-scores[best])]
+        return np.argsort(-scores)
+
+    def _update_ivf(self, ns: _Namespace):
+        """Train the IVF index when a namespace grows and assign new rows to lists."""
+        if not self.ivf_lists or ns.count < self.ivf_min_vectors:
+            return
+        if ns.centroids is None or ns.count >= 2 * ns.trained_count:
+            self._train_ivf(ns)
+        unassigned = np.flatnonzero(ns.assignments[: ns.count] < 0)
+        for start in range(0, len(unassigned), 4096):
+            rows = unassigned[start : start + 4096]
+            ns.assignments[rows] = np.argmax(ns.vectors[rows] @ ns.centroids.T, axis=1)
+        ns._list_order = None
+
+    def _train_ivf(self, ns: _Namespace, iterations: int = 10):
+        """Run spherical k-means on a sample of the namespace to get the IVF centroids."""
+        rng = np.random.default_rng(0)
+        matrix = ns.matrix()
+        sample_size = min(ns.count, self.ivf_lists * 64)
+        sample = matrix[rng.choice(ns.count, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.ivf_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(self.ivf_lists):
+                members = sample[labels == i]
+                if len(members):
+                    centroids[i] = members.sum(axis=0)
+            centroids = self._normalize(centroids)
+        ns.centroids = centroids.astype(np.float32)
+        ns.trained_count = ns.count
+        ns.assignments[: ns.count] = -1
+
+    @staticmethod
+    def _filter_rows(ns: _Namespace, metadata_filter: Dict) -> np.ndarray:
+        """Get the rows matching a metadata filter, evaluating it once per write."""
+        key = json.dumps(metadata_filter, sort_keys=True, default=str)
+        rows = ns.filter_rows.get(key)
+        if rows is None:
+            rows = np.fromiter(
+                (
+                    row
+                    for row in range(ns.count)
+                    if matches_filter(ns.metadata[row], metadata_filter)
+                ),
+                dtype=np.int64,
+            )
+            # Keep the cache small when filters vary from query to query
+            if len(ns.filter_rows) >= 64:
+                ns.filter_rows.clear()
+            ns.filter_rows[key] = rows
+        return rows
+
+    def _candidates(self, ns: _Namespace, query: np.ndarray) -> Optional[np.ndarray]:
+        """Get the rows in the IVF lists closest to the query, or None for exact search."""
+        if ns.centroids is None or ns.count < self.ivf_min_vectors:
+            return None
+        if ns._list_order is None:
+            assignments = ns.assignments[: ns.count]
+            ns._list_order = np.argsort(assignments, kind="stable")
+            ns._list_offsets = np.searchsorted(
+                assignments[ns._list_order], np.arange(self.ivf_lists + 1)
+            )
+        probes = np.argpartition(
+            -(ns.centroids @ query), min(self.ivf_probes, self.ivf_lists - 1)
+        )[: self.ivf_probes]
+        return np.concatenate(
+            [
+                ns._list_order[ns._list_offsets[i] : ns._list_offsets[i + 1]]
+                for i in probes
+            ]
+        )
+
+    def _path(self, name: str) -> str:
+        """Get the directory of a namespace."""
+        return os.path.join(self.directory, quote(name, safe="") if name else "__default__")
+
+    def _save(self, name: str, ns: _Namespace):
+        """
+        Atomically write a namespace's vectors and metadata.
+
+        Every save writes a new generation directory with all files, then
+        points the CURRENT file at it with a single os.replace, so a crash
+        leaves either the old or the new generation, never a mix of both.
+        """
+        path = self._path(name)
+        os.makedirs(path, exist_ok=True)
+        generation = f"gen-{uuid.uuid4().hex}"
+        generation_path = os.path.join(path, generation)
+        os.makedirs(generation_path)
+        np.save(os.path.join(generation_path, "vectors.npy"), ns.matrix())
+        with open(
+            os.path.join(generation_path, "meta.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump({"ids": ns.ids, "metadata": ns.metadata}, f)
+        if ns.codes is not None:
+            np.savez(
+                os.path.join(generation_path, "codes.npz"),
+                method=self.quantizer.method,
+                codes=ns.codes[: ns.count],
+                scales=ns.scales[: ns.count],
+            )
+
+        current = os.path.join(path, "CURRENT")
+        with open(f"{current}.tmp", "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(f"{current}.tmp", current)
+
+        # Older generations and files of the layout before generations;
+        # vectors still memory-mapped stay readable once unlinked
+        for entry in os.listdir(path):
+            entry_path = os.path.join(path, entry)
+            if entry.startswith("gen-") and entry != generation:
+                shutil.rmtree(entry_path, ignore_errors=True)
+            elif entry in ("vectors.npy", "meta.json", "codes.npz"):
+                os.remove(entry_path)
+
+    def _current_path(self, name: str) -> str:
+        """Get the directory holding the files of a namespace's latest save."""
+        path = self._path(name)
+        current = os.path.join(path, "CURRENT")
+        if not os.path.exists(current):
+            return path
+        with open(current, "r", encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+
+    def _load(self, name: str):
+        """Load a namespace, memory-mapping its vectors read-only until first write."""
+        path = self._current_path(name)
+        vectors_path = os.path.join(path, "vectors.npy")
+        meta_path = os.path.join(path, "meta.json")
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        ns = _Namespace(self.dimension, self.quantizer)
+        ns.vectors = np.load(vectors_path, mmap_mode="r")
+        if ns.vectors.shape[1] != self.dimension:
+            raise ValueError(
+                f"Local index namespace {name!r} holds {ns.vectors.shape[1]}-dimension "
+                f"vectors, not {self.dimension}. Use another index name or directory "
+                "after changing the embedding dimension."
+            )
+        # Saves are atomic, but files edited or copied by hand may still not
+        # belong together. Skip the namespace rather than the whole index
+        if ns.vectors.shape[0] != len(meta["ids"]) or len(meta["metadata"]) != len(
+            meta["ids"]
+        ):
+            print(
+                f"Skipping corrupt local index namespace {name!r}: it holds "
+                f"{ns.vectors.shape[0]} vectors, {len(meta['ids'])} IDs and "
+                f"{len(meta['metadata'])} metadata entries. Delete "
+                f"{self._path(name)} and ingest the namespace again."
+            )
+            return
+        ns.ids = meta["ids"]
+        ns.metadata = meta["metadata"]
+        ns.rows = {vector_id: row for row, vector_id in enumerate(ns.ids)}
+        ns.count = len(ns.ids)
+        ns.assignments = np.full(ns.count, -1, dtype=np.int32)
+        if ns.codes is not None:
+            ns.codes, ns.scales = self._load_codes(path, ns)
+        self._namespaces[name] = ns
+        self._update_ivf(ns)
+
+    def _load_codes(self, path: str, ns: _Namespace) -> Tuple[np.ndarray, np.ndarray]:
+        """Load a namespace's quantized vectors, or quantize them if none are saved."""
+        codes_path = os.path.join(path, "codes.npz")
+        if os.path.exists(codes_path):
+            with np.load(codes_path) as saved:
+                if str(saved["method"]) == self.quantizer.method and len(
+                    saved["codes"]
+                ) == ns.count:
+                    return saved["codes"], saved["scales"]
+
+        # Quantize in blocks so the float32 vectors are never all in memory
+        width, dtype = self.quantizer.code_shape(self.dimension)
+        codes = np.zeros((ns.count, width), dtype=dtype)
+        scales = np.zeros(ns.count, dtype=np.float32)
+        for start in range(0, ns.count, 16384):
+            block = np.asarray(ns.vectors[start : start + 16384])
+            codes[start : start + len(block)], scales[start : start + len(block)] = (
+                self.quantizer.encode(block)
+            )
+        ns.dirty = True
+        return codes, scales
+
+
+class LocalVectorStore(AsyncSearchMixin, VectorStore):
+    """LangChain vector store over a LocalVectorIndex."""
+
+    def __init__(
+        self,
+        index: LocalVectorIndex,
+        embedding: Embeddings,
+        text_key: str = "text",
+        namespace: Optional[str] = None,
+    ):
+        """
+        Initialize the vector store.
+
+        Args:
+            index: The local index holding the vectors
+            embedding: Embeddings model used for texts and queries
+            text_key: Metadata key the chunk text is stored under
+            namespace: Default namespace for reads and writes
+        """
+        self._index = index
+        self._embedding = embedding
+        self._text_key = text_key
+        self._namespace = namespace
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """
+        Embed texts and add them to the index.
+
+        Args:
+            texts: The texts to add
+            metadatas: Optional metadata per text
+            ids: Optional vector IDs per text
+            namespace: Optional namespace for the texts
+
+        Returns:
+            List of vector IDs
+        """
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self._index.upsert(
+            vectors=[
+                {"id": i, "values": v, "metadata": {**m, self._text_key: t}}
+                for i, v, m, t in zip(ids, vectors, metadatas, texts)
+            ],
+            namespace=namespace or self._namespace,
+        )
+        return ids
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the documents closest to an embedding.
+
+        Args:
+            embedding: The query embedding
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of (Document, cosine similarity) tuples
+        """
+        with trace("vector.query", top_k=k) as span:
+            results = self._index.query(
+                vector=embedding,
+                top_k=k,
+                namespace=namespace or self._namespace,
+                include_metadata=True,
+                filter=filter,
+            )
+            span.set_attribute("matches", len(results["matches"]))
+        documents = []
+        for match in results["matches"]:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(self._text_key, "")
+            documents.append(
+                (Document(page_content=text, metadata=metadata), match["score"])
+            )
+        return documents
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the documents closest to a query.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of (Document, cosine similarity) tuples
+        """
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter, namespace=namespace
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        Find the documents closest to a query.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of Document objects
+        """
+        results = self.similarity_search_with_score(
+            query, k=k, filter=filter, namespace=namespace
+        )
+        return [document for document, _ in results]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        Find the documents closest to an embedding.
+
+        Args:
+            embedding: The query embedding
+            k: Number of results to return
+            filter: Optional metadata filter
+            namespace: Optional namespace to search in
+
+        Returns:
+            List of Document objects
+        """
+        results = self.similarity_search_by_vector_with_score(
+            embedding, k=k, filter=filter, namespace=namespace
+        )
+        return [document for document, _ in results]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def delete(
+        self, ids: Optional[List[str]] = None, namespace: Optional[str] = None, **kwargs
+    ) -> Optional[bool]:
+        """
+        Delete vectors by ID.
+
+        Args:
+            ids: The vector IDs to delete
+            namespace: Optional namespace to delete from
+        """
+        self._index.delete(ids=ids, namespace=namespace or self._namespace)
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        directory: str = ".cache/local_index",
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        """
+        Build a local vector store from texts.
+
+        Args:
+            texts: The texts to add
+            embedding: Embeddings model used for texts and queries
+            metadatas: Optional metadata per text
+            ids: Optional vector IDs per text
+            directory: Directory the index is persisted to
+            namespace: Optional namespace for the texts
+
+        Returns:
+            LocalVectorStore instance
+        """
+        vectors = embedding.embed_documents(list(texts)[:1])
+        index = LocalVectorIndex(directory=directory, dimension=len(vectors[0]))
+        store = cls(index, embedding, namespace=namespace)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,200 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.messages import (
+    BaseMessage,
+    SystemMessage,
+    get_buffer_string,
+    messages_from_dict,
+    messages_to_dict,
+)
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from .async_utils import get_executor
+from .bulk_ingest import default_token_counter
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    Chat memory holding recent turns verbatim within a token budget.
+
+    Turns that no longer fit the budget are folded into a running summary by
+    the LLM, in the shared thread pool by default so no chat turn waits for
+    it. Until a summary is done, the turns it covers are still returned
+    verbatim, so nothing is lost in between.
+    """
+
+    llm: Any
+    memory_key: str = "chat_history"
+    max_token_limit: int = 1000
+    summary: str = ""
+    background: bool = True
+    token_counter: Optional[Callable[[str], int]] = None
+
+    _pending: List[BaseMessage] = PrivateAttr(default_factory=list)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _summarizing: bool = PrivateAttr(default=False)
+    _generation: int = PrivateAttr(default=0)
+    _done: Any = PrivateAttr(default_factory=threading.Event)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.token_counter is None:
+            self.token_counter = default_token_counter()
+        self._done.set()
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the conversation history to add to the prompt.
+
+        Args:
+            inputs: The chain's inputs
+
+        Returns:
+            Dict with the summary and the recent messages under the memory key
+        """
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append(
+                    SystemMessage(
+                        content=f"Summary of the earlier conversation: {self.summary}"
+                    )
+                )
+            messages.extend(self._pending)
+            messages.extend(self.chat_memory.messages)
+
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        """
+        Save a turn and move older turns out of the budget into the summary.
+
+        Args:
+            inputs: The chain's inputs
+            outputs: The chain's outputs
+        """
+        with self._lock:
+            super().save_context(inputs, outputs)
+            self._prune()
+
+    def clear(self):
+        """Forget the whole conversation, including its summary."""
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self._pending.clear()
+            self._generation += 1
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every pruned turn has been summarized.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if no summary is in progress anymore
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize the conversation, e.g. to persist a session.
+
+        Returns:
+            JSON-serializable dict with the summary and the messages
+        """
+        with self._lock:
+            return {
+                "summary": self.summary,
+                "pending": messages_to_dict(self._pending),
+                "messages": messages_to_dict(self.chat_memory.messages),
+            }
+
+    def load_dict(self, data: Dict[str, Any]):
+        """
+        Restore a conversation serialized with to_dict.
+
+        Args:
+            data: Dict returned by to_dict
+        """
+        with self._lock:
+            self._generation += 1
+            self.summary = data.get("summary", "")
+            self._pending = messages_from_dict(data.get("pending", []))
+            self.chat_memory.messages = messages_from_dict(data.get("messages", []))
+            if self._pending:
+                self._start_summary()
+
+    def _prune(self):
+        """Move the oldest messages beyond the token budget to the pending list."""
+        messages = self.chat_memory.messages
+        counts = [self.token_counter(message.content) for message in messages]
+        total = sum(counts)
+
+        # Whole turns are pruned, and the latest one is always kept verbatim
+        pruned = 0
+        while total > self.max_token_limit and len(messages) - pruned > 2:
+            total -= sum(counts[pruned : pruned + 2])
+            pruned += 2
+        if not pruned:
+            return
+
+        self._pending.extend(messages[:pruned])
+        del messages[:pruned]
+        self._start_summary()
+
+    def _start_summary(self):
+        """Summarize the pending messages, unless a summary is already running."""
+        if self._summarizing:
+            return
+        self._summarizing = True
+        self._done.clear()
+        if self.background:
+            get_executor().submit(self._summarize)
+        else:
+            self._summarize()
+
+    def _summarize(self):
+        """Fold pending messages into the summary until none are left."""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._finish_summary()
+                    return
+                pending = list(self._pending)
+                summary = self.summary
+                generation = self._generation
+
+            try:
+                result = self.llm.invoke(
+                    SUMMARY_PROMPT.format(
+                        summary=summary, new_lines=get_buffer_string(pending)
+                    )
+                )
+            except Exception as e:
+                # The messages stay pending and are retried on the next prune
+                print(f"Error summarizing conversation: {e}")
+                with self._lock:
+                    self._finish_summary()
+                return
+
+            with self._lock:
+                # Drop the summary if the conversation was cleared or replaced
+                if generation == self._generation:
+                    self.summary = getattr(result, "content", result).strip()
+                    del self._pending[: len(pending)]
+
+    def _finish_summary(self):
+        """Mark the summary as no longer running."""
+        self._summarizing = False
+        self._done.set()
@@ -0,0 +1,347 @@
+import asyncio
+import contextvars
+import re
+from concurrent.futures import wait
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.retrievers import BaseRetriever
+
+from .async_utils import get_executor, run_blocking
+from .hybrid_retriever import keep_rare_match, reciprocal_rank_fusion
+from .tracing import trace
+
+EXPANSION_MODES = ("off", "heuristic", "llm")
+
+# Separators between the parts of a question asking about several things
+_PART_SEPARATORS = re.compile(
+    r"\s*(?:[,;]|\band\b|\bor\b|\bas well as\b|\bversus\b|\bvs\b\.?)\s*",
+    re.IGNORECASE,
+)
+
+# Pairs of capitals that name one thing
+_FIXED_PHRASES = re.compile(r"\b(?:Q and A|R and D|M and A|B and B|AT and T)\b")
+
+# Codes such as "ERR-1042" or "sku_7781.b"
+_IDENTIFIER = re.compile(r"[A-Za-z0-9][-_./:][A-Za-z0-9]")
+
+_EXPANSION_PROMPT = """Write up to {count} short search queries that together \
+cover every part of the question below. Write one query per line, without \
+numbering or any other text.
+
+Question: {question}"""
+
+
+class QueryExpander:
+    """
+    Expands a broad question into sub-queries searched separately.
+
+    The heuristic mode splits questions asking about several things, e.g.
+    "What are the access codes of project A and B?" becomes "What are the
+    access codes of project A" and "What are the access codes of project B".
+    The LLM mode asks a chat model for the sub-queries and falls back to the
+    heuristic when the model fails or exceeds the timeout.
+    """
+
+    def __init__(
+        self,
+        mode: str = "heuristic",
+        llm=None,
+        max_queries: int = 4,
+        timeout: float = 2.0,
+    ):
+        """
+        Initialize the query expander.
+
+        Args:
+            mode: "heuristic" or "llm"
+            llm: Chat model writing the sub-queries in "llm" mode
+            max_queries: Maximum number of queries, including the question itself
+            timeout: Seconds the LLM may take before the heuristic is used
+        """
+        if mode not in EXPANSION_MODES[1:]:
+            raise ValueError(f"Unsupported query expansion mode: {mode}")
+        if mode == "llm" and llm is None:
+            raise ValueError("The llm query expansion mode needs a chat model")
+        self.mode = mode
+        self.llm = llm
+        self.max_queries = max_queries
+        self.timeout = timeout
+
+    def expand(self, question: str) -> List[str]:
+        """
+        Expand a question into sub-queries.
+
+        Args:
+            question: The (standalone) question
+
+        Returns:
+            List of queries starting with the question itself
+        """
+        if self.mode == "llm":
+            future = get_executor().submit(
+                contextvars.copy_context().run, self._ask_llm, question
+            )
+            try:
+                return self._queries(question, future.result(timeout=self.timeout))
+            except Exception as e:
+                future.cancel()
+                print(f"Query expansion failed, splitting the question instead: {e!r}")
+        return self._queries(question, split_question(question))
+
+    async def aexpand(self, question: str) -> List[str]:
+        """
+        Expand a question into sub-queries with the chat model's async client.
+
+        Args:
+            question: The (standalone) question
+
+        Returns:
+            List of queries starting with the question itself
+        """
+        if self.mode == "llm":
+            try:
+                message = await asyncio.wait_for(
+                    self.llm.ainvoke(self._prompt(question)), self.timeout
+                )
+                return self._queries(question, message.content.splitlines())
+            except Exception as e:
+                print(f"Query expansion failed, splitting the question instead: {e!r}")
+        return self._queries(question, split_question(question))
+
+    def _ask_llm(self, question: str) -> List[str]:
+        """Ask the chat model for sub-queries of a question."""
+        return self.llm.invoke(self._prompt(question)).content.splitlines()
+
+    def _prompt(self, question: str) -> str:
+        """Build the prompt asking for sub-queries of a question."""
+        return _EXPANSION_PROMPT.format(count=self.max_queries - 1, question=question)
+
+    def _queries(self, question: str, candidates: List[str]) -> List[str]:
+        """Deduplicate sub-queries and put the question first."""
+        queries = [question]
+        seen = {question.strip().lower()}
+        for candidate in candidates:
+            candidate = candidate.strip().lstrip("-*0123456789.) ").strip()
+            if candidate and candidate.lower() not in seen:
+                seen.add(candidate.lower())
+                queries.append(candidate)
+        return queries[: self.max_queries]
+
+
+def split_question(question: str, max_tail_words: int = 3) -> List[str]:
+    """
+    Split a question asking about several things into one query per thing.
+
+    Only names are split off: every part after the first must be a short
+    tail ending in a capitalized word, a number or an identifier, and so
+    must the first part, as in "access codes of project A and B" or "ERR-1042
+    and ERR-2001". Pairs of common words such as "pros and cons", "install
+    and configure" or "black and white" usually belong together and are left
+    as they are. Tails replace as many trailing words of the first part, so
+    "project A and B" yields a query for project B rather than for "B" alone.
+
+    Args:
+        question: The question
+        max_tail_words: Maximum number of words of a part after the first
+
+    Returns:
+        List of sub-queries, empty if the question has a single part
+    """
+    if _FIXED_PHRASES.search(question):
+        return []
+    parts = [
+        part.strip(" ?.!")
+        for part in _PART_SEPARATORS.split(question)
+        if part and part.strip(" ?.!")
+    ]
+    if len(parts) < 2:
+        return []
+
+    head = parts[0].split()
+    tails = [part.split() for part in parts[1:]]
+    if not _is_name(head[-1]) or not all(
+        len(words) <= max_tail_words and _is_name(words[-1]) for words in tails
+    ):
+        return []
+
+    queries = [parts[0]]
+    for words in tails:
+        if len(words) < len(head):
+            queries.append(" ".join(head[: -len(words)] + words))
+        else:
+            queries.append(" ".join(words))
+    return queries
+
+
+def _is_name(word: str) -> bool:
+    """Check whether a word looks like a name, number or identifier."""
+    word = word.strip("\"'()[]")
+    return bool(word) and (
+        word[0].isupper()
+        or any(c.isdigit() for c in word)
+        or _IDENTIFIER.search(word) is not None
+    )
+
+
+def interleave(
+    result_lists: List[List[Document]], k: int = 4, lead: int = 0
+) -> List[Document]:
+    """
+    Merge ranked result lists by taking their documents rank by rank.
+
+    Every list contributes its best document before any contributes its
+    second best, so each sub-query of a question is covered. Summing ranks
+    instead, as reciprocal rank fusion does, favors what all sub-queries have
+    in common over what each adds. Documents are matched by their text.
+
+    Args:
+        result_lists: Ranked lists of documents, best first
+        k: Number of documents to return
+        lead: Number of top documents of the first list placed before any
+            document of the other lists
+
+    Returns:
+        Up to k distinct documents
+    """
+    seen = set()
+    documents = []
+    for document in result_lists[0][:lead] if result_lists else []:
+        if document.page_content not in seen:
+            seen.add(document.page_content)
+            documents.append(document)
+            if len(documents) == k:
+                return documents
+    for rank in range(max(map(len, result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank].page_content not in seen:
+                seen.add(results[rank].page_content)
+                documents.append(results[rank])
+                if len(documents) == k:
+                    return documents
+    return documents
+
+
+class FanOutRetriever(BaseRetriever):
+    """
+    Retriever searching several sub-queries of a question concurrently.
+
+    The sub-queries are embedded in one batch and searched in parallel, and
+    their results interleaved without duplicates, the question's own results
+    first: the top k // 2 results of the question come before any result
+    of a sub-query. Sub-searches still running after `timeout` seconds are
+    dropped, except the search for the question itself, so the latency stays
+    close to that of a single search. Questions with no sub-queries go to the
+    wrapped retriever unchanged.
+    """
+
+    retriever: Any
+    vector_store: Any
+    expander: Any
+    lexical_index: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    timeout: float = 2.0
+    namespace: Optional[str] = None
+    filter: Optional[Dict] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        queries = self.expander.expand(query)
+        if len(queries) == 1:
+            return self.retriever.get_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+
+        with trace("retrieve.fan_out", queries=len(queries), top_k=self.k) as span:
+            vectors = self.vector_store.embeddings.embed_documents(queries)
+            executor = get_executor()
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._search, *pair)
+                for pair in zip(queries, vectors)
+            ]
+            _, pending = wait(futures, timeout=self.timeout)
+
+            # The question's own results are waited for however long they take
+            result_lists = [futures[0].result()]
+            failed = 0
+            for future in futures[1:]:
+                if future in pending:
+                    future.cancel()
+                elif future.exception() is None:
+                    result_lists.append(future.result())
+                else:
+                    failed += 1
+            return self._merge(result_lists, len(pending - {futures[0]}), failed, span)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        queries = await self.expander.aexpand(query)
+        if len(queries) == 1:
+            return await self.retriever.aget_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+
+        with trace("retrieve.fan_out", queries=len(queries), top_k=self.k) as span:
+            vectors = await self.vector_store.embeddings.aembed_documents(queries)
+            searches = [run_blocking(self._search, queries[0], vectors[0])] + [
+                asyncio.wait_for(run_blocking(self._search, *pair), self.timeout)
+                for pair in zip(queries[1:], vectors[1:])
+            ]
+            results = await asyncio.gather(*searches, return_exceptions=True)
+
+            if isinstance(results[0], BaseException):
+                raise results[0]
+            result_lists = [results[0]]
+            timed_out = failed = 0
+            for result in results[1:]:
+                if isinstance(result, asyncio.TimeoutError):
+                    timed_out += 1
+                elif isinstance(result, BaseException):
+                    failed += 1
+                else:
+                    result_lists.append(result)
+            return self._merge(result_lists, timed_out, failed, span)
+
+    def _search(self, query: str, vector: List[float]) -> List[Document]:
+        """Search the vector store, and the lexical index if any, for one sub-query."""
+        results = self.vector_store.similarity_search_by_vector_with_score(
+            vector, k=self.fetch_k, namespace=self.namespace, filter=self.filter
+        )
+        documents = [document for document, _ in results]
+        if self.lexical_index is None:
+            return documents
+
+        lexical = [
+            document
+            for document, _ in self.lexical_index.search(
+                query, k=self.fetch_k, namespace=self.namespace, filter=self.filter
+            )
+        ]
+        fused = reciprocal_rank_fusion(
+            [documents, lexical], k=self.fetch_k, rrf_k=self.rrf_k
+        )
+        if not lexical:
+            return fused
+        rare_terms = self.lexical_index.rare_terms(query, namespace=self.namespace)
+        return keep_rare_match(fused, lexical, rare_terms, k=self.fetch_k)
+
+    def _merge(
+        self, result_lists: List[List[Document]], timed_out: int, failed: int, span
+    ) -> List[Document]:
+        """Interleave the results of the sub-searches and record them on the span."""
+        documents = interleave(result_lists, k=self.k, lead=self.k // 2)
+        span.set_attributes(
+            timed_out=timed_out,
+            failed=failed,
+            candidates=sum(map(len, result_lists)),
+            results=len(documents),
+        )
+        return documents
@@ -0,0 +1,208 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Bump when parsing changes, so pages extracted the old way are not reused
+PARSER_VERSION = 1
+
+_MAGIC = b"RAGPAGE1"
+_HEADER = struct.Struct("<8sI")
+_SUFFIX = ".pages"
+
+
+class ParseCache:
+    """
+    On-disk cache of the pages extracted from documents, keyed by file content.
+
+    Each document is one file: a JSON index of its pages' metadata and
+    offsets followed by every page's zlib-compressed text. Files are
+    memory-mapped on a hit and pages decompressed straight from the mapping.
+    The least recently used files are evicted once the cache outgrows its
+    size limit.
+    """
+
+    def __init__(self, cache_dir: str = ".cache/parsed", max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initialize the parse cache.
+
+        Args:
+            cache_dir: Directory holding one file per parsed document
+            max_bytes: Size limit of the cache before eviction
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        # Worker processes create a cache per file, so the directory is only
+        # scanned when something is stored
+        self._bytes: Optional[int] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(file_hash: str, file_extension: str) -> str:
+        """
+        Build the cache key of a file.
+
+        Args:
+            file_hash: Hash of the file contents
+            file_extension: Extension selecting the parser, e.g. ".pdf"
+
+        Returns:
+            Key of the file's parsed pages
+        """
+        return f"{file_hash}-{file_extension.lstrip('.').lower()}-v{PARSER_VERSION}"
+
+    def load(self, key: str, source: str) -> Optional[List[Document]]:
+        """
+        Get the parsed pages of a file.
+
+        Args:
+            key: Key built by ParseCache.key
+            source: File name set as the "source" metadata of every page
+
+        Returns:
+            List of Document objects, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                documents = _read_pages(mapped, source)
+            # The modification time orders files for eviction
+            os.utime(path)
+        except (OSError, ValueError, struct.error, zlib.error):
+            # Missing, evicted by another process or truncated
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return documents
+
+    def store(self, key: str, documents: List[Document]):
+        """
+        Cache the parsed pages of a file.
+
+        Args:
+            key: Key built by ParseCache.key
+            documents: Pages returned by the parser
+        """
+        pages, blobs, offset = [], [], 0
+        for document in documents:
+            blob = zlib.compress(document.page_content.encode("utf-8"))
+            metadata = {k: v for k, v in document.metadata.items() if k != "source"}
+            pages.append([offset, len(blob), metadata])
+            blobs.append(blob)
+            offset += len(blob)
+        header = json.dumps({"pages": pages}).encode("utf-8")
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters of the cache.
+
+        Returns:
+            Dict with hits, misses, evictions and the size of the cache in bytes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["bytes"] = self._scan_bytes()
+        return stats
+
+    def clear(self):
+        """Remove every cached file."""
+        with self._lock:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(_SUFFIX):
+                    _remove(entry.path)
+            self._bytes = 0
+
+    def _path(self, key: str) -> str:
+        """Get the file holding the pages of a key."""
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """List the cached files as (modification time, size, path) tuples."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_bytes(self) -> int:
+        """Get the total size of the cached files on disk."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop the least recently used files until the cache is at 90% of its limit."""
+        entries = sorted(self._entries())
+
+        # Other processes share the directory, so start from its actual size
+        remaining = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if remaining <= target:
+                break
+            if _remove(path):
+                self._stats["evictions"] += 1
+            remaining -= size
+        self._bytes = remaining
+
+
+def _read_pages(mapped: mmap.mmap, source: str) -> List[Document]:
+    """Decode the pages of a memory-mapped cache file."""
+    magic, header_length = _HEADER.unpack_from(mapped, 0)
+    if magic != _MAGIC:
+        raise ValueError("Not a parse cache file")
+    start = _HEADER.size + header_length
+    header = json.loads(mapped[_HEADER.size : start].decode("utf-8"))
+
+    documents = []
+    # Release every view of the mapping before it is closed
+    with memoryview(mapped) as view:
+        for offset, length, metadata in header["pages"]:
+            with view[start + offset : start + offset + length] as blob:
+                if len(blob) != length:
+                    raise ValueError("Truncated parse cache file")
+                text = zlib.decompress(blob).decode("utf-8")
+            documents.append(
+                Document(page_content=text, metadata={"source": source, **metadata})
+            )
+    return documents
+
+
+def _remove(path: str) -> bool:
+    """Delete a file another process may have deleted already."""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
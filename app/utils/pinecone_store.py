@@ -0,0 +1,26 @@
+from typing import List, Optional
+
+from langchain_pinecone import PineconeVectorStore
+
+from .async_utils import AsyncSearchMixin
+from .tracing import trace
+
+
+class AsyncPineconeVectorStore(AsyncSearchMixin, PineconeVectorStore):
+    """PineconeVectorStore whose async search embeds with the async OpenAI client."""
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        *,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        namespace: Optional[str] = None,
+    ):
+        """Query the index for the documents closest to an embedding."""
+        with trace("vector.query", top_k=k) as span:
+            results = super().similarity_search_by_vector_with_score(
+                embedding, k=k, filter=filter, namespace=namespace
+            )
+            span.set_attribute("matches", len(results))
+            return results
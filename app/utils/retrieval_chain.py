@@ -0,0 +1,288 @@
+import asyncio
+import contextvars
+import re
+from typing import Any, Dict, List, Optional
+
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.documents import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+)
+
+from .async_utils import get_executor
+from .tracing import current_span
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Words that point back at something said earlier in the conversation
+_REFERENCE_WORDS = frozenset(
+    """
+    it its it's itself they them their theirs themselves this that these those
+    he him his she her hers there then former latter above previous earlier
+    same one ones another other others else also too again more
+    """.split()
+)
+
+# Openings of questions that continue the previous turn
+_CONTINUATION_STARTS = (
+    "and",
+    "but",
+    "or",
+    "so",
+    "also",
+    "what about",
+    "how about",
+    "then",
+    "only",
+    "except",
+)
+
+_STOPWORDS = frozenset(
+    """
+    a an the is are was were be been am do does did of in on at to for from by
+    with about as and or but if what which who whom whose when where why how
+    can could should would will shall may might must i me my we our you your
+    tell give show list explain describe please
+    """.split()
+)
+
+
+def content_terms(text: str) -> List[str]:
+    """Get the words of a text that are not stopwords."""
+    return [word for word in _WORD_PATTERN.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def is_standalone_question(question: str, min_terms: int = 2) -> bool:
+    """
+    Check whether a follow-up question can be answered without the conversation.
+
+    A question is taken as standalone when it has no pronouns or other words
+    referring back to earlier turns, does not open like a continuation ("and",
+    "what about"), and names at least min_terms content words.
+
+    Args:
+        question: The follow-up question
+        min_terms: Minimum number of non-stopwords of a standalone question
+
+    Returns:
+        True if the question can be used for retrieval as it is
+    """
+    text = question.lower().strip()
+    words = _WORD_PATTERN.findall(text)
+    if any(word in _REFERENCE_WORDS for word in words):
+        return False
+    if any(re.match(rf"{start}\b", text) for start in _CONTINUATION_STARTS):
+        return False
+    return len(content_terms(text)) >= min_terms
+
+
+def adds_no_terms(question: str, condensed: str) -> bool:
+    """
+    Check whether condensing a question added no content words to it.
+
+    Args:
+        question: The follow-up question as asked
+        condensed: The question rewritten by the condensing LLM
+
+    Returns:
+        True if results retrieved for the question also serve the rewrite
+    """
+    return set(content_terms(condensed)) <= set(content_terms(question))
+
+
+class FastConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    ConversationalRetrievalChain that only condenses questions when needed.
+
+    With condense_mode "auto", first turns and standalone follow-ups are
+    retrieved for as asked, without the condensing LLM round trip. Other
+    follow-ups are condensed, then the rewrite is retrieved for. With "always",
+    every follow-up is condensed like in ConversationalRetrievalChain.
+
+    With speculative_retrieval, a retrieval for the raw question runs while
+    the question is condensed, and its results are used when the rewrite
+    added no new terms. Rewrites replacing a pronoun with what it refers to
+    always add terms, so it rarely pays off and is off by default. The
+    speculative retrieval is traced as a child run of its own, tagged
+    "speculative", since a discarded one cannot be stopped once it runs.
+    """
+
+    condense_mode: str = "auto"
+    speculative_retrieval: bool = False
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        chat_history_str = (self.get_chat_history or _get_chat_history)(
+            inputs["chat_history"]
+        )
+
+        if not self._needs_condensing(question, chat_history_str):
+            new_question = question
+            docs = self._get_docs(question, inputs, run_manager=_run_manager)
+        elif not self._speculate():
+            new_question = self._condense(question, chat_history_str, _run_manager)
+            docs = self._get_docs(new_question, inputs, run_manager=_run_manager)
+        else:
+            # Retrieve for the raw question while the LLM condenses it
+            context = contextvars.copy_context()
+            speculative = get_executor().submit(
+                context.run,
+                self._speculative_docs,
+                question,
+                _run_manager.get_child(tag="speculative"),
+            )
+            try:
+                new_question = self._condense(question, chat_history_str, _run_manager)
+            except BaseException:
+                speculative.cancel()
+                raise
+            if self._speculation_hit(question, new_question):
+                docs = speculative.result()
+            else:
+                speculative.cancel()
+                docs = self._get_docs(new_question, inputs, run_manager=_run_manager)
+
+        output = self._answer(inputs, new_question, chat_history_str, docs, _run_manager)
+        return self._output(output, new_question, docs)
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        chat_history_str = (self.get_chat_history or _get_chat_history)(
+            inputs["chat_history"]
+        )
+
+        if not self._needs_condensing(question, chat_history_str):
+            new_question = question
+            docs = await self._aget_docs(question, inputs, run_manager=_run_manager)
+        elif not self._speculate():
+            new_question = await self._acondense(question, chat_history_str, _run_manager)
+            docs = await self._aget_docs(new_question, inputs, run_manager=_run_manager)
+        else:
+            speculative = asyncio.ensure_future(
+                self._aspeculative_docs(
+                    question, _run_manager.get_child(tag="speculative")
+                )
+            )
+            try:
+                new_question = await self._acondense(
+                    question, chat_history_str, _run_manager
+                )
+            except BaseException:
+                speculative.cancel()
+                raise
+            if self._speculation_hit(question, new_question):
+                docs = await speculative
+            else:
+                speculative.cancel()
+                docs = await self._aget_docs(new_question, inputs, run_manager=_run_manager)
+
+        output = await self._aanswer(
+            inputs, new_question, chat_history_str, docs, _run_manager
+        )
+        return self._output(output, new_question, docs)
+
+    def _needs_condensing(self, question: str, chat_history_str: str) -> bool:
+        """Decide whether the question goes through the condensing LLM."""
+        if not chat_history_str:
+            return False
+        needed = self.condense_mode == "always" or not is_standalone_question(question)
+        self._trace(condensed=needed)
+        return needed
+
+    def _speculate(self) -> bool:
+        """Check whether to retrieve for the raw question while condensing."""
+        return self.condense_mode != "always" and self.speculative_retrieval
+
+    def _speculation_hit(self, question: str, new_question: str) -> bool:
+        """Check whether the speculative results serve the condensed question."""
+        hit = adds_no_terms(question, new_question)
+        self._trace(speculation_hit=hit)
+        return hit
+
+    def _speculative_docs(self, question: str, callbacks) -> List[Document]:
+        """Retrieve for the raw question under the speculative child run."""
+        docs = self.retriever.get_relevant_documents(question, callbacks=callbacks)
+        return self._reduce_tokens_below_limit(docs)
+
+    async def _aspeculative_docs(self, question: str, callbacks) -> List[Document]:
+        """Async counterpart of _speculative_docs."""
+        docs = await self.retriever.aget_relevant_documents(question, callbacks=callbacks)
+        return self._reduce_tokens_below_limit(docs)
+
+    def _condense(self, question: str, chat_history_str: str, run_manager) -> str:
+        """Rewrite a follow-up question into a standalone one."""
+        return self.question_generator.run(
+            question=question,
+            chat_history=chat_history_str,
+            callbacks=run_manager.get_child(),
+        )
+
+    async def _acondense(self, question: str, chat_history_str: str, run_manager) -> str:
+        """Async counterpart of _condense."""
+        return await self.question_generator.arun(
+            question=question,
+            chat_history=chat_history_str,
+            callbacks=run_manager.get_child(),
+        )
+
+    def _answer_inputs(
+        self, inputs: Dict[str, Any], new_question: str, chat_history_str: str
+    ) -> Dict[str, Any]:
+        """Build the inputs of the documents-combining chain."""
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        return new_inputs
+
+    def _answer(self, inputs, new_question, chat_history_str, docs, run_manager) -> str:
+        """Generate the answer from the retrieved documents."""
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self.response_if_no_docs_found
+        return self.combine_docs_chain.run(
+            input_documents=docs,
+            callbacks=run_manager.get_child(),
+            **self._answer_inputs(inputs, new_question, chat_history_str),
+        )
+
+    async def _aanswer(
+        self, inputs, new_question, chat_history_str, docs, run_manager
+    ) -> str:
+        """Async counterpart of _answer."""
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self.response_if_no_docs_found
+        return await self.combine_docs_chain.arun(
+            input_documents=docs,
+            callbacks=run_manager.get_child(),
+            **self._answer_inputs(inputs, new_question, chat_history_str),
+        )
+
+    def _output(
+        self, answer: str, new_question: str, docs: List[Document]
+    ) -> Dict[str, Any]:
+        """Assemble the chain's outputs."""
+        output: Dict[str, Any] = {self.output_key: answer}
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = new_question
+        return output
+
+    @staticmethod
+    def _trace(**attributes: Any):
+        """Record how the question was handled on the current tracing span."""
+        span = current_span()
+        if span is not None:
+            span.set_attributes(**attributes)
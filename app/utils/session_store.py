@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class SQLiteSessionStore:
+    """
+    Conversation histories kept in a SQLite database.
+
+    The database lives outside process memory, so every server worker sees
+    the same sessions.
+    """
+
+    def __init__(self, path: str = ".cache/sessions.sqlite", ttl: float = 86400):
+        """
+        Initialize the session store.
+
+        Args:
+            path: Path to the SQLite database
+            ttl: Seconds a session is kept after its last use
+        """
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "updated REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the conversation state of a session.
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            The session's state, or None if it does not exist or expired
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT state, updated FROM sessions WHERE session_id = ?",
+                (session_id,),
+            )
+            .fetchone()
+        )
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        """
+        Save the conversation state of a session.
+
+        Args:
+            session_id: ID of the session
+            state: JSON-serializable state, e.g. RAGChatbot.memory_state()
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, state, updated) "
+            "VALUES (?, ?, ?)",
+            (session_id, json.dumps(state), now),
+        )
+        # Expired sessions are swept on write, so reads stay a single lookup
+        conn.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+        conn.commit()
+
+    def delete(self, session_id: str):
+        """
+        Delete a session.
+
+        Args:
+            session_id: ID of the session
+        """
+        conn = self._connection()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection to the database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # Let readers in other workers proceed while one of them writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+class RedisSessionStore:
+    """Conversation histories kept in Redis, expiring by key TTL."""
+
+    def __init__(self, url: str, ttl: float = 86400, prefix: str = "rag:session:"):
+        """
+        Initialize the session store.
+
+        Args:
+            url: Redis URL, e.g. redis://localhost:6379/0
+            ttl: Seconds a session is kept after its last use
+            prefix: Prefix of the session keys
+        """
+        try:
+            import redis
+        except ImportError:
+            raise ValueError(
+                "Redis session store requires the redis package. "
+                "Install it with: pip install redis"
+            )
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the conversation state of a session.
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            The session's state, or None if it does not exist or expired
+        """
+        value = self.client.get(self.prefix + session_id)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        """
+        Save the conversation state of a session.
+
+        Args:
+            session_id: ID of the session
+            state: JSON-serializable state, e.g. RAGChatbot.memory_state()
+        """
+        self.client.set(
+            self.prefix + session_id,
+            json.dumps(state),
+            ex=int(self.ttl),
+        )
+
+    def delete(self, session_id: str):
+        """
+        Delete a session.
+
+        Args:
+            session_id: ID of the session
+        """
+        self.client.delete(self.prefix + session_id)
+
+
+def create_session_store(url: Optional[str] = None, ttl: Optional[float] = None):
+    """
+    Create the session store configured by a URL.
+
+    Args:
+        url: redis://... for Redis, sqlite:///path or a plain path for SQLite
+            (optional, will use SESSION_STORE_URL if not provided)
+        ttl: Seconds a session is kept after its last use
+            (optional, will use SESSION_TTL if not provided)
+
+    Returns:
+        SQLiteSessionStore or RedisSessionStore
+    """
+    url = url or os.getenv("SESSION_STORE_URL", ".cache/sessions.sqlite")
+    ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL", "86400"))
+
+    if url.startswith(("redis://", "rediss://")):
+        return RedisSessionStore(url, ttl=ttl)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///") :]
+    return SQLiteSessionStore(url, ttl=ttl)
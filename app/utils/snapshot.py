@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Bump when the columns change, so old readers reject new snapshots
+SNAPSHOT_VERSION = 1
+
+# Every column is a .npy member of a zip file, so numpy.load opens a
+# snapshot like an .npz file
+_VECTORS = "vectors.npy"
+_IDS = "ids.npy"
+_ID_OFFSETS = "id_offsets.npy"
+_METADATA = "metadata.npy"
+_METADATA_OFFSETS = "metadata_offsets.npy"
+_INFO = "info.npy"
+
+
+class SnapshotWriter:
+    """
+    Streams the vectors, IDs and metadata of a namespace into a snapshot file.
+
+    A snapshot holds one column per field: the vectors as a float32 matrix,
+    stored uncompressed, and the IDs and JSON metadata as deflated UTF-8
+    blobs with the offset of every row. Rows are spooled to temporary files
+    as they are written, so memory stays bounded by one batch however large
+    the namespace is. The file only appears once the writer is closed.
+    """
+
+    def __init__(self, path: str, dimension: int, info: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the snapshot writer.
+
+        Args:
+            path: Path of the snapshot file
+            dimension: Dimension of the vectors
+            info: JSON-serializable description stored with the snapshot,
+                e.g. the namespace and embedding model
+        """
+        self.path = path
+        self.dimension = dimension
+        self.info = dict(info or {})
+        self.count = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._spool = tempfile.TemporaryDirectory(dir=directory, prefix=".snapshot-")
+        self._vectors = open(os.path.join(self._spool.name, "vectors"), "wb")
+        self._ids = open(os.path.join(self._spool.name, "ids"), "wb")
+        self._metadata = open(os.path.join(self._spool.name, "metadata"), "wb")
+        self._id_offsets = array("q", [0])
+        self._metadata_offsets = array("q", [0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, ids: List[str], vectors, metadatas: List[Dict[str, Any]]):
+        """
+        Append rows to the snapshot.
+
+        Args:
+            ids: Vector IDs
+            vectors: One vector per ID, as lists or a NumPy matrix
+            metadatas: One metadata dict per ID
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(ids), self.dimension) or len(metadatas) != len(ids):
+            raise ValueError(
+                f"Expected {len(ids)} vectors of dimension {self.dimension} "
+                f"and {len(ids)} metadata dicts."
+            )
+
+        self._vectors.write(vectors.tobytes())
+        for vector_id, metadata in zip(ids, metadatas):
+            _append(self._ids, self._id_offsets, vector_id.encode("utf-8"))
+            _append(
+                self._metadata,
+                self._metadata_offsets,
+                json.dumps(metadata, separators=(",", ":")).encode("utf-8"),
+            )
+        self.count += len(ids)
+
+    def close(self):
+        """Write the snapshot file from the spooled rows."""
+        for spooled in (self._vectors, self._ids, self._metadata):
+            spooled.close()
+
+        info = {
+            **self.info,
+            "version": SNAPSHOT_VERSION,
+            "count": self.count,
+            "dimension": self.dimension,
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with zipfile.ZipFile(tmp_path, "w", allowZip64=True) as archive:
+                # Vectors barely compress, so they are stored as they are
+                _copy_column(
+                    archive,
+                    _VECTORS,
+                    self._vectors.name,
+                    np.float32,
+                    (self.count, self.dimension),
+                    zipfile.ZIP_STORED,
+                )
+                _copy_column(
+                    archive,
+                    _IDS,
+                    self._ids.name,
+                    np.uint8,
+                    (self._id_offsets[-1],),
+                    zipfile.ZIP_DEFLATED,
+                )
+                _copy_column(
+                    archive,
+                    _METADATA,
+                    self._metadata.name,
+                    np.uint8,
+                    (self._metadata_offsets[-1],),
+                    zipfile.ZIP_DEFLATED,
+                )
+                _write_column(
+                    archive, _ID_OFFSETS, np.frombuffer(self._id_offsets, np.int64)
+                )
+                _write_column(
+                    archive,
+                    _METADATA_OFFSETS,
+                    np.frombuffer(self._metadata_offsets, np.int64),
+                )
+                _write_column(
+                    archive,
+                    _INFO,
+                    np.frombuffer(json.dumps(info).encode("utf-8"), np.uint8),
+                )
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._spool.cleanup()
+
+    def abort(self):
+        """Discard the spooled rows without writing the snapshot file."""
+        for spooled in (self._vectors, self._ids, self._metadata):
+            spooled.close()
+        self._spool.cleanup()
+
+
+class SnapshotReader:
+    """Reads a snapshot file written by SnapshotWriter batch by batch."""
+
+    def __init__(self, path: str):
+        """
+        Open a snapshot file.
+
+        Args:
+            path: Path of the snapshot file
+        """
+        self.path = path
+        self._archive = zipfile.ZipFile(path)
+        try:
+            self.info = json.loads(_read_column(self._archive, _INFO).tobytes())
+        except KeyError:
+            self._archive.close()
+            raise ValueError(f"Not a vector snapshot: {path}")
+        if self.info.get("version") != SNAPSHOT_VERSION:
+            self._archive.close()
+            raise ValueError(
+                f"Unsupported snapshot version {self.info.get('version')}: {path}"
+            )
+        self.count = self.info["count"]
+        self.dimension = self.info["dimension"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def batches(
+        self, batch_size: int = 1000
+    ) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """
+        Read the rows of the snapshot in order.
+
+        Args:
+            batch_size: Number of rows per batch
+
+        Yields:
+            Tuples of IDs, a float32 matrix of their vectors and their
+            metadata dicts
+        """
+        id_offsets = _read_column(self._archive, _ID_OFFSETS).tolist()
+        metadata_offsets = _read_column(self._archive, _METADATA_OFFSETS).tolist()
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+
+        with _open_column(self._archive, _VECTORS) as vectors, _open_column(
+            self._archive, _IDS
+        ) as ids, _open_column(self._archive, _METADATA) as metadata:
+            for start in range(0, self.count, batch_size):
+                end = min(start + batch_size, self.count)
+                matrix = np.frombuffer(
+                    _read_exact(vectors, (end - start) * row_bytes), dtype=np.float32
+                ).reshape(end - start, self.dimension)
+                batch_ids = _split(ids, id_offsets, start, end)
+                batch_metadata = _split(metadata, metadata_offsets, start, end)
+                yield (
+                    [value.decode("utf-8") for value in batch_ids],
+                    matrix,
+                    [json.loads(value) for value in batch_metadata],
+                )
+
+    def close(self):
+        """Close the snapshot file."""
+        self._archive.close()
+
+
+def _append(spooled, offsets: array, data: bytes):
+    """Append one value to a spooled blob column and record its end offset."""
+    spooled.write(data)
+    offsets.append(offsets[-1] + len(data))
+
+
+def _member(name: str, compress_type: int) -> zipfile.ZipInfo:
+    """Describe a zip member written now."""
+    member = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    member.compress_type = compress_type
+    return member
+
+
+def _copy_column(archive, name: str, source: str, dtype, shape, compress_type: int):
+    """Write a .npy member whose data is copied from a spooled file."""
+    header = {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": tuple(shape),
+    }
+    with archive.open(_member(name, compress_type), "w", force_zip64=True) as out:
+        np.lib.format.write_array_header_1_0(out, header)
+        with open(source, "rb") as f:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+
+
+def _write_column(archive, name: str, values: np.ndarray):
+    """Write a small array as a deflated .npy member."""
+    member = _member(name, zipfile.ZIP_DEFLATED)
+    with archive.open(member, "w", force_zip64=True) as out:
+        np.lib.format.write_array(out, values)
+
+
+def _open_column(archive, name: str):
+    """Open a .npy member positioned at the start of its data."""
+    member = archive.open(name)
+    version = np.lib.format.read_magic(member)
+    if version == (1, 0):
+        np.lib.format.read_array_header_1_0(member)
+    else:
+        np.lib.format.read_array_header_2_0(member)
+    return member
+
+
+def _read_column(archive, name: str) -> np.ndarray:
+    """Read a whole .npy member."""
+    with archive.open(name) as member:
+        return np.lib.format.read_array(member)
+
+
+def _read_exact(stream, size: int) -> bytes:
+    """Read exactly `size` bytes of a column."""
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated snapshot file")
+    return data
+
+
+def _split(stream, offsets: List[int], start: int, end: int) -> List[bytes]:
+    """Read the values of rows start to end of a blob column."""
+    base = offsets[start]
+    blob = _read_exact(stream, offsets[end] - base)
+    return [
+        blob[a - base : b - base]
+        for a, b in zip(offsets[start:end], offsets[start + 1 : end + 1])
+    ]
@@ -0,0 +1,473 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import get_buffer_string
+
+# The span new spans are children of, and the list collecting finished spans
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "rag_current_span", default=None
+)
+_collector: contextvars.ContextVar = contextvars.ContextVar(
+    "rag_span_collector", default=None
+)
+
+
+class Span:
+    """One timed stage of a trace, with attributes such as token counts."""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes: Any):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.depth = parent.depth + 1 if parent else 0
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.duration_ms: Optional[float] = None
+        # Exporter state attached to the span, e.g. the OpenTelemetry span
+        self.handles: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any):
+        """Set one attribute of the span."""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        """Set several attributes of the span."""
+        self.attributes.update(attributes)
+
+    def increment(self, key: str, amount: float = 1):
+        """Add to a counter attribute of the span."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error: BaseException):
+        """Mark the span as failed."""
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def elapsed_ms(self) -> float:
+        """Get the milliseconds since the span started."""
+        return (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the span as a JSON-serializable dict.
+
+        Returns:
+            Dict with the span's IDs, name, timing, status and attributes
+        """
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "depth": self.depth,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonLinesSink:
+    """Sink appending every finished span to a JSON-lines file."""
+
+    def __init__(self, path: str = ".cache/traces.jsonl"):
+        """
+        Initialize the sink.
+
+        Args:
+            path: Path of the JSON-lines file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OpenTelemetrySink:
+    """
+    Sink exporting spans through the OpenTelemetry API.
+
+    Spans go to whatever tracer provider and exporter the process configured,
+    e.g. an OTLP exporter set up by opentelemetry-instrument.
+    """
+
+    def __init__(self, tracer_name: str = "rag-chatbot"):
+        """
+        Initialize the sink.
+
+        Args:
+            tracer_name: Name of the OpenTelemetry tracer
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ValueError(
+                "OpenTelemetry tracing requires the opentelemetry-api package. "
+                "Install it with: pip install opentelemetry-sdk"
+            )
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def on_start(self, span: Span):
+        parent = span.parent.handles.get("otel") if span.parent else None
+        context = self._trace.set_span_in_context(parent) if parent else None
+        span.handles["otel"] = self._tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9)
+        )
+
+    def on_end(self, span: Span):
+        otel_span = span.handles.pop("otel", None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if isinstance(value, (bool, int, float, str)):
+                otel_span.set_attribute(key, value)
+        if span.status == "error":
+            otel_span.set_status(
+                self._trace.Status(self._trace.StatusCode.ERROR, span.error)
+            )
+        otel_span.end(end_time=int((span.start_time + span.duration_ms / 1000) * 1e9))
+
+
+class Tracer:
+    """Creates spans and hands finished spans to the configured sinks."""
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            sinks: Objects with on_start(span) and on_end(span) methods, e.g.
+                JsonLinesSink or OpenTelemetrySink
+        """
+        self.sinks = list(sinks or [])
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """
+        Start a span without making it the current span.
+
+        Args:
+            name: Name of the stage
+            parent: Parent span (defaults to the current span)
+            **attributes: Initial attributes of the span
+
+        Returns:
+            The started Span; pass it to end_span when the stage is done
+        """
+        span = Span(name, parent or _current_span.get(), **attributes)
+        span.handles["collector"] = _collector.get()
+        for sink in self.sinks:
+            try:
+                sink.on_start(span)
+            except Exception as e:
+                print(f"Error starting span {name}: {e}")
+        return span
+
+    def end_span(self, span: Span):
+        """
+        Finish a span and export it.
+
+        Args:
+            span: A span returned by start_span
+        """
+        if span.duration_ms is not None:
+            return
+        span.duration_ms = span.elapsed_ms()
+        collector = span.handles.pop("collector", None)
+        if collector is not None:
+            collector.append(span.to_dict())
+        for sink in self.sinks:
+            try:
+                sink.on_end(span)
+            except Exception as e:
+                print(f"Error exporting span {span.name}: {e}")
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Time a stage as a child of the current span.
+
+        Args:
+            name: Name of the stage
+            **attributes: Initial attributes of the span
+
+        Yields:
+            The Span, current until the block exits
+        """
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    @contextlib.contextmanager
+    def use_span(self, span: Span) -> Iterator[Span]:
+        """
+        Make a started span the current span, e.g. inside a worker thread.
+
+        Args:
+            span: A span returned by start_span
+        """
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Get the process-wide tracer.
+
+    Returns:
+        Tracer exporting to the sinks named by the TRACE_SINK environment
+        variable: "jsonl" (to TRACE_PATH), "otel", both comma-separated, or
+        none. Spans are always timed, so collect_spans works without a sink.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            sinks = []
+            for name in os.getenv("TRACE_SINK", "").split(","):
+                name = name.strip().lower()
+                if name == "jsonl":
+                    sinks.append(
+                        JsonLinesSink(os.getenv("TRACE_PATH", ".cache/traces.jsonl"))
+                    )
+                elif name == "otel":
+                    sinks.append(OpenTelemetrySink())
+                elif name:
+                    raise ValueError(f"Unknown trace sink: {name}")
+            _tracer = Tracer(sinks)
+    return _tracer
+
+
+def trace(name: str, **attributes: Any):
+    """
+    Time a stage with the process-wide tracer.
+
+    Args:
+        name: Name of the stage
+        **attributes: Initial attributes of the span
+
+    Returns:
+        Context manager yielding the Span
+    """
+    return get_tracer().span(name, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    """Get the span of the stage running in this context, if any."""
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def collect_spans() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collect the spans finished in this context, e.g. for a timing panel.
+
+    Spans started in threads that copied this context, such as the chain
+    thread of RAGChatbot.stream_chat, are collected as well.
+
+    Yields:
+        List the finished spans are appended to as dicts, children first
+    """
+    spans: List[Dict[str, Any]] = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler turning LangChain runs into spans.
+
+    Chains, retrievers and LLM calls become child spans of the span current
+    when the run started. LLM spans are named by the step they serve,
+    "llm.condense" for question condensing and "llm.generate" for answering,
+    and carry prompt and completion token counts and the time to first token.
+    """
+
+    # Run inline in async chains too, so spans nest in the caller's context
+    run_inline = True
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        """
+        Initialize the handler.
+
+        Args:
+            tracer: Tracer to create the spans with (defaults to get_tracer())
+        """
+        # Imported here since the ingest engine itself is traced
+        from .bulk_ingest import default_token_counter
+
+        self.tracer = tracer or get_tracer()
+        self.token_counter = default_token_counter()
+        self._spans: Dict[UUID, Span] = {}
+        self._names: Dict[UUID, str] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], **attributes):
+        """Start the span of a run and make it current."""
+        parent = self._spans.get(parent_run_id) if parent_run_id else None
+        span = self.tracer.start_span(name, parent=parent, **attributes)
+        self._spans[run_id] = span
+        self._parents[run_id] = parent_run_id
+        _current_span.set(span)
+        return span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        """End the span of a run and restore its parent as current."""
+        span = self._spans.pop(run_id, None)
+        self._names.pop(run_id, None)
+        self._parents.pop(run_id, None)
+        if span is None:
+            return None
+        if error is not None:
+            span.record_error(error)
+        self.tracer.end_span(span)
+        _current_span.set(span.parent)
+        return span
+
+    def _llm_step(self, parent_run_id: Optional[UUID]) -> str:
+        """Name an LLM call by the chain it answers for."""
+        # The answering LLMChain runs inside the documents-combining chain
+        grandparent = self._parents.get(parent_run_id) if parent_run_id else None
+        if grandparent and "Documents" in self._names.get(grandparent, ""):
+            return "llm.generate"
+        return "llm.condense"
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        name = (serialized or {}).get("id", ["chain"])[-1]
+        self._start(f"chain.{name}", run_id, parent_run_id)
+        self._names[run_id] = name
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        prompt = "\n".join(get_buffer_string(batch) for batch in messages)
+        self._start_llm(prompt, run_id, parent_run_id)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        self._start_llm("\n".join(prompts), run_id, parent_run_id)
+
+    def _start_llm(self, prompt: str, run_id: UUID, parent_run_id: Optional[UUID]):
+        """Start the span of an LLM call with its prompt size."""
+        self._start(
+            self._llm_step(parent_run_id),
+            run_id,
+            parent_run_id,
+            prompt_chars=len(prompt),
+            prompt_tokens=self.token_counter(prompt),
+        )
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None and "time_to_first_token_ms" not in span.attributes:
+            span.set_attribute("time_to_first_token_ms", span.elapsed_ms())
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None:
+            completion = "".join(
+                generation.text
+                for generations in response.generations
+                for generation in generations
+            )
+            span.set_attribute("completion_chars", len(completion))
+            # Streamed responses report no usage, so count the tokens locally
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if usage.get("prompt_tokens"):
+                span.set_attribute("prompt_tokens", usage["prompt_tokens"])
+            span.set_attribute(
+                "completion_tokens",
+                usage.get("completion_tokens") or self.token_counter(completion),
+            )
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_retriever_start(
+        self,
+        serialized: Dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        self._start("retrieve", run_id, parent_run_id, query_chars=len(query))
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None:
+            span.set_attributes(
+                documents=len(documents),
+                context_chars=sum(len(document.page_content) for document in documents),
+            )
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
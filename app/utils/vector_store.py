@@ -1,17 +1,105 @@
 import os
-from typing import List, Dict, Any, Optional
+import time
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from urllib.parse import quote
 from dotenv import load_dotenv
 
-from langchain.docstore.document import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
+from langchain_core.documents import Document
+
+from .async_utils import run_blocking
+from .bulk_ingest import BulkIngestor
+from .clients import (
+    get_cached_embeddings,
+    get_lexical_index,
+    get_local_index,
+    get_manifest,
+    get_pinecone_client,
+    get_pinecone_index,
+)
+from .embedding_cache import CachedEmbeddings
+from .embedding_compression import TruncatedEmbeddings
+from .ingest_manifest import chunk_ids, source_key, source_prefix
+from .local_index import LocalVectorStore
+from .snapshot import SnapshotReader, SnapshotWriter
+from .tracing import trace
 
 load_dotenv()
 
+# Pinecone accepts at most 1000 IDs per delete request
+DELETE_BATCH_SIZE = 1000
+
+
+def batched(items: Iterable, size: int) -> Iterable[List]:
+    """
+    Group items into lists of at most `size`.
+
+    Args:
+        items: Any iterable
+        size: Maximum length of a group
+
+    Yields:
+        Lists of consecutive items
+    """
+    items = iter(items)
+    while True:
+        group = list(islice(items, size))
+        if not group:
+            return
+        yield group
+
+
+def build_filter(
+    sources: Optional[Iterable[str]] = None,
+    file_types: Optional[Iterable[str]] = None,
+    pages: Optional[Tuple[int, int]] = None,
+    ingested_after: Optional[float] = None,
+    ingested_before: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a Pinecone-style metadata filter of chunks.
+
+    Args:
+        sources: File names the chunks must come from
+        file_types: File extensions without the dot, e.g. "pdf"
+        pages: First and last page, counted from 1, a chunk may start on
+        ingested_after: Unix time from which the file was ingested
+        ingested_before: Unix time before which the file was ingested
+
+    Returns:
+        The filter, or None if no condition was given
+    """
+    conditions = []
+    if sources:
+        conditions.append({"file_name": {"$in": list(sources)}})
+    if file_types:
+        file_types = [file_type.lower().lstrip(".") for file_type in file_types]
+        conditions.append({"file_type": {"$in": file_types}})
+    if pages:
+        # PDF loaders number pages from 0
+        first, last = pages
+        conditions.append({"page": {"$gte": first - 1}})
+        conditions.append({"page": {"$lte": last - 1}})
+    if ingested_after is not None:
+        conditions.append({"ingested_at": {"$gte": int(ingested_after)}})
+    if ingested_before is not None:
+        conditions.append({"ingested_at": {"$lt": int(ingested_before)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
 
 class VectorStoreManager:
-    """Utility class for managing the Pinecone vector store."""
+    """
+    Utility class for managing the vector store.
+
+    The backend is either a Pinecone index or a LocalVectorIndex. Both expose
+    the same upsert/query/fetch/delete/describe_index_stats interface as
+    `self.index`, so everything above it is backend-agnostic.
+    """
 
     def __init__(
         self,
@@ -19,8 +107,22 @@ class VectorStoreManager:
         pinecone_api_key=None,
         pinecone_environment=None,
         pinecone_index_name=None,
+        embedding_cache_path=None,
+        manifest_dir=None,
+        backend=None,
+        local_index_dir=None,
+        lexical_index_dir=None,
+        embeddings=None,
+        embedding_dimension=None,
+        truncate_dimension=None,
     ):
-        """Initialize the vector store manager with API keys from environment variables or parameters."""
+        """Initialize the vector store manager with API keys from environment variables or parameters.
+
+        An embeddings model and its dimension can be passed in place of the
+        OpenAI one, e.g. FakeEmbeddings for offline benchmarks. Embeddings are
+        truncated to `truncate_dimension` (or EMBEDDING_TRUNCATE_DIMENSION)
+        leading dimensions when set, which is also the dimension of the index.
+        """
         # Use provided keys or fall back to environment variables
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.pinecone_api_key = pinecone_api_key or os.getenv("PINECONE_API_KEY")
@@ -31,41 +133,133 @@ class VectorStoreManager:
             "PINECONE_INDEX_NAME"
         )
 
-        if not all(
-            [
-                self.openai_api_key,
-                self.pinecone_api_key,
-                self.pinecone_index_name,
-            ]
-        ):
+        # "pinecone" or "local"
+        self.backend = (backend or os.getenv("VECTOR_BACKEND", "pinecone")).lower()
+        if self.backend not in ("pinecone", "local"):
+            raise ValueError(f"Unsupported vector backend: {self.backend}")
+
+        required = [self.openai_api_key or embeddings]
+        if self.backend == "pinecone":
+            required += [self.pinecone_api_key, self.pinecone_index_name]
+        if not all(required):
             raise ValueError(
                 "Missing required environment variables. Please check your .env file."
             )
 
-        # Use text-embedding-3-large which produces 3072-dimension embeddings
-        self.embeddings = OpenAIEmbeddings(
-            api_key=self.openai_api_key, model="text-embedding-3-large"
+        self.embedding_cache_path = embedding_cache_path or os.getenv(
+            "EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite"
         )
-        # Initialize Pinecone client with API key
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
 
-        # Get the index directly
-        try:
-            self.index = self.pc.Index(self.pinecone_index_name)
-            print(
-                f"Successfully connected to Pinecone index: {self.pinecone_index_name}"
+        # Use text-embedding-3-large which produces 3072-dimension embeddings,
+        # behind a persistent cache so unchanged text is never embedded twice.
+        # Clients, caches and indexes come from the process-wide registry so
+        # every session reuses the same connections.
+        self.embedding_model = "text-embedding-3-large"
+        self.embedding_dimension = embedding_dimension or 3072
+        self.embeddings = embeddings or get_cached_embeddings(
+            self.openai_api_key,
+            self.embedding_model,
+            self.embedding_cache_path,
+            quantization=os.getenv("EMBEDDING_CACHE_QUANTIZATION", "none"),
+        )
+        # Kept before any wrapping, so its counters stay reachable
+        self.embedding_cache = (
+            self.embeddings if isinstance(self.embeddings, CachedEmbeddings) else None
+        )
+
+        # Matryoshka truncation, e.g. to 256 of 3072 dimensions, shrinks the
+        # index, upsert payloads and query time; the cache keeps full vectors
+        truncate_dimension = truncate_dimension or int(
+            os.getenv("EMBEDDING_TRUNCATE_DIMENSION", "0")
+        )
+        if truncate_dimension:
+            if truncate_dimension >= self.embedding_dimension:
+                raise ValueError(
+                    f"Cannot truncate {self.embedding_dimension}-dimension "
+                    f"embeddings to {truncate_dimension} dimensions."
+                )
+            self.embeddings = TruncatedEmbeddings(self.embeddings, truncate_dimension)
+            self.embedding_dimension = truncate_dimension
+        # Track which chunks of which files each namespace already holds
+        index_key = (
+            self.pinecone_index_name
+            if self.backend == "pinecone"
+            else f"local-{self.pinecone_index_name or 'default'}"
+        )
+        self.manifest = get_manifest(
+            manifest_dir or os.getenv("INGEST_MANIFEST_DIR", ".cache/manifests"),
+            index_name=index_key,
+        )
+
+        # BM25 index of the chunk texts per namespace for hybrid retrieval
+        self.lexical_index = None
+        if os.getenv("HYBRID_SEARCH", "true").lower() == "true":
+            self.lexical_index = get_lexical_index(
+                os.path.join(
+                    lexical_index_dir
+                    or os.getenv("LEXICAL_INDEX_DIR", ".cache/lexical_index"),
+                    quote(index_key, safe=""),
+                )
             )
-        except Exception as e:
-            print(f"Error connecting to Pinecone index: {e}")
-            self.index = None
 
-    def initialize_index(self, dimension: int = 3072):
+        # Callbacks notified with the namespace whenever its documents change
+        self._change_listeners = []
+        self._vector_store = None
+        self._index_initialized = False
+
+        # Batching, concurrency and checkpointing of bulk uploads
+        self.ingest_batch_tokens = int(os.getenv("INGEST_BATCH_TOKENS", "8000"))
+        self.ingest_concurrency = int(os.getenv("INGEST_CONCURRENCY", "4"))
+        self.ingest_checkpoint_dir = os.getenv(
+            "INGEST_CHECKPOINT_DIR", ".cache/checkpoints"
+        )
+
+        if self.backend == "local":
+            local_index_dir = local_index_dir or os.getenv(
+                "LOCAL_INDEX_DIR", ".cache/local_index"
+            )
+            self.pc = None
+            self.index = get_local_index(
+                os.path.join(
+                    local_index_dir, self.pinecone_index_name or "default"
+                ),
+                dimension=self.embedding_dimension,
+                ivf_lists=int(os.getenv("LOCAL_INDEX_IVF_LISTS", "0")),
+                ivf_probes=int(os.getenv("LOCAL_INDEX_IVF_PROBES", "8")),
+                quantization=os.getenv("LOCAL_INDEX_QUANTIZATION", "none").lower(),
+                rescore_factor=int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "4")),
+            )
+            print(f"Using local vector index in {self.index.directory}")
+        else:
+            # Initialize Pinecone client with API key
+            self.pc = get_pinecone_client(self.pinecone_api_key)
+
+            # Get the index directly
+            try:
+                self.index = get_pinecone_index(
+                    self.pinecone_api_key, self.pinecone_index_name
+                )
+                print(
+                    f"Successfully connected to Pinecone index: {self.pinecone_index_name}"
+                )
+            except Exception as e:
+                print(f"Error connecting to Pinecone index: {e}")
+                self.index = None
+
+    def initialize_index(self, dimension: Optional[int] = None):
         """
         Initialize the Pinecone index if it doesn't exist.
 
         Args:
-            dimension: Dimension of the embeddings (3072 for your existing index)
+            dimension: Dimension of the embeddings (defaults to the dimension of
+                the possibly truncated embeddings, 3072 without truncation)
         """
+        dimension = dimension or self.embedding_dimension
+        # The local index creates namespaces on first write, and a shared
+        # manager only needs to check Pinecone once
+        if self.backend == "local" or self._index_initialized:
+            return
+
         # Check if index exists
         try:
             existing_indexes = [index.name for index in self.pc.list_indexes()]
@@ -79,50 +273,581 @@ class VectorStoreManager:
                 )
                 print(f"Created new Pinecone index: {self.pinecone_index_name}")
                 # Connect to the newly created index
-                self.index = self.pc.Index(self.pinecone_index_name)
+                self.index = get_pinecone_index(
+                    self.pinecone_api_key, self.pinecone_index_name
+                )
             else:
                 print(f"Using existing Pinecone index: {self.pinecone_index_name}")
                 # Make sure we're connected to the index
                 if self.index is None:
-                    self.index = self.pc.Index(self.pinecone_index_name)
+                    self.index = get_pinecone_index(
+                        self.pinecone_api_key, self.pinecone_index_name
+                    )
+            self._index_initialized = True
         except Exception as e:
             raise ValueError(f"Error initializing Pinecone index: {e}")
 
     def get_vector_store(self):
         """
-        Get the Pinecone vector store.
+        Get the vector store.
 
         Returns:
-            PineconeVectorStore instance
+            AsyncPineconeVectorStore or LocalVectorStore instance
         """
         if self.index is None:
             raise ValueError(
                 "Pinecone index not initialized. Call initialize_index() first."
             )
 
-        # Create the vector store using the index directly
-        return PineconeVectorStore(
-            index=self.index,
-            embedding=self.embeddings,
+        # The vector store is stateless, so one instance serves every caller
+        if self._vector_store is None:
+            if self.backend == "local":
+                self._vector_store = LocalVectorStore(
+                    index=self.index, embedding=self.embeddings
+                )
+            else:
+                # langchain_pinecone is only imported by the Pinecone backend
+                from .pinecone_store import AsyncPineconeVectorStore
+
+                # Create the vector store using the index directly
+                self._vector_store = AsyncPineconeVectorStore(
+                    index=self.index,
+                    embedding=self.embeddings,
+                )
+        return self._vector_store
+
+    def get_ingestor(self) -> BulkIngestor:
+        """
+        Get the bulk ingest engine for the index.
+
+        Returns:
+            BulkIngestor instance
+        """
+        if self.index is None:
+            raise ValueError(
+                "Pinecone index not initialized. Call initialize_index() first."
+            )
+
+        return BulkIngestor(
+            self.embeddings,
+            self.index,
+            batch_tokens=self.ingest_batch_tokens,
+            max_concurrency=self.ingest_concurrency,
+            checkpoint_dir=self.ingest_checkpoint_dir,
         )
 
-    def add_documents(self, documents: List[Document], namespace: Optional[str] = None):
+    def add_documents(
+        self,
+        documents: List[Document],
+        namespace: Optional[str] = None,
+        flush: bool = True,
+    ):
         """
         Add documents to the vector store.
 
+        Chunks get deterministic IDs and are diffed per file against the
+        namespace's manifest, so only new or changed chunks are embedded and
+        upserted, and vectors of chunks that disappeared from a file are deleted.
+
         Args:
             documents: List of Document objects to add
             namespace: Optional namespace for the documents
+            flush: Whether to write the local indexes and the manifest to disk
+                now. Callers adding many batches can pass False and call
+                flush() once they are done, since every flush rewrites the
+                namespace's files
+
+        Returns:
+            Dict with the number of added, unchanged and deleted chunks
         """
-        vector_store = self.get_vector_store()
+        with trace("add_documents", chunks=len(documents)) as span:
+            with trace("ingest.plan"):
+                plan = self._plan_changes(documents, namespace)
+
+            if plan["new_documents"]:
+                with trace("ingest.embed_upsert", chunks=len(plan["new_documents"])):
+                    self.get_ingestor().ingest(
+                        plan["new_documents"], plan["new_ids"], namespace=namespace
+                    )
+
+            with trace("ingest.apply", deleted=len(plan["stale_ids"])):
+                result = self._apply_changes(plan, namespace, flush=flush)
+            span.set_attributes(**result)
+            return result
+
+    async def aadd_documents(
+        self, documents: List[Document], namespace: Optional[str] = None
+    ):
+        """
+        Async counterpart of add_documents.
+
+        New chunks are embedded with the async OpenAI client; index writes run
+        in the shared thread pool.
+
+        Args:
+            documents: List of Document objects to add
+            namespace: Optional namespace for the documents
+
+        Returns:
+            Dict with the number of added, unchanged and deleted chunks
+        """
+        with trace("add_documents", chunks=len(documents)) as span:
+            with trace("ingest.plan"):
+                plan = self._plan_changes(documents, namespace)
+
+            if plan["new_documents"]:
+                with trace("ingest.embed_upsert", chunks=len(plan["new_documents"])):
+                    await self.get_ingestor().aingest(
+                        plan["new_documents"], plan["new_ids"], namespace=namespace
+                    )
+
+            with trace("ingest.apply", deleted=len(plan["stale_ids"])):
+                result = await run_blocking(self._apply_changes, plan, namespace)
+            span.set_attributes(**result)
+            return result
+
+    def _plan_changes(self, documents: List[Document], namespace: Optional[str]):
+        """Diff the chunks of each file against the manifest."""
+        # Group the chunks by the file they came from
+        by_source: Dict[str, List[Document]] = {}
+        for document in documents:
+            by_source.setdefault(source_key(document), []).append(document)
+
+        plan = {
+            "new_documents": [],
+            "new_ids": [],
+            "stale_ids": [],
+            "unchanged": 0,
+            "updates": [],
+        }
+        for source, source_documents in by_source.items():
+            ids = chunk_ids(source, source_documents)
+            entry = self.manifest.get(namespace, source)
+            known_ids = set(entry["chunk_ids"]) if entry else set()
+
+            for chunk_id, document in zip(ids, source_documents):
+                if chunk_id in known_ids:
+                    plan["unchanged"] += 1
+                else:
+                    plan["new_ids"].append(chunk_id)
+                    plan["new_documents"].append(document)
+            plan["stale_ids"].extend(known_ids - set(ids))
+
+            file_hash = source_documents[0].metadata.get("file_hash")
+            plan["updates"].append((source, file_hash, ids))
+        return plan
+
+    def _apply_changes(
+        self, plan: Dict[str, Any], namespace: Optional[str], flush: bool = True
+    ):
+        """Delete stale vectors and record the new state once new chunks are upserted."""
+        stale_ids = plan["stale_ids"]
+        self._delete_ids(stale_ids, namespace)
+
+        if self.lexical_index is not None:
+            self.lexical_index.add(
+                plan["new_ids"], plan["new_documents"], namespace=namespace
+            )
+
+        for source, file_hash, ids in plan["updates"]:
+            self.manifest.update(namespace, source, file_hash, ids, save=False)
 
-        # Add documents to the vector store
-        vector_store.add_documents(documents=documents, namespace=namespace)
+        if flush:
+            self.flush()
 
-        print(f"Added {len(documents)} document chunks to Pinecone")
+        added = len(plan["new_documents"])
+        if added or stale_ids:
+            self._notify_change(namespace)
+
+        print(
+            f"Added {added} document chunks to the {self.backend} index "
+            f"({plan['unchanged']} unchanged, {len(stale_ids)} deleted)"
+        )
+
+        return {
+            "added": added,
+            "unchanged": plan["unchanged"],
+            "deleted": len(stale_ids),
+        }
+
+    def _delete_ids(self, ids: List[str], namespace: Optional[str]):
+        """Delete vectors from the index and the lexical index in pages of 1000."""
+        for page in batched(ids, DELETE_BATCH_SIZE):
+            self.index.delete(ids=page, namespace=namespace)
+        if self.lexical_index is not None and ids:
+            self.lexical_index.delete(ids=ids, namespace=namespace)
+
+    def flush(self):
+        """
+        Write the local indexes and the ingest manifest to disk.
+
+        Needed after add_documents was called with flush=False.
+        """
+        if self.backend == "local":
+            self.index.flush()
+        if self.lexical_index is not None:
+            self.lexical_index.flush()
+        self.manifest.flush()
+
+    def add_document_batches(
+        self, batches: Iterable[List[Document]], namespace: Optional[str] = None
+    ):
+        """
+        Add a stream of document batches to the vector store.
+
+        Each batch is embedded and upserted as soon as it arrives, so this can
+        consume DocumentProcessor.iter_chunk_batches while files are still
+        being parsed.
+
+        Args:
+            batches: Iterable of lists of Document objects
+            namespace: Optional namespace for the documents
+
+        Returns:
+            Dict with the total number of added, unchanged and deleted chunks
+        """
+        totals = {"added": 0, "unchanged": 0, "deleted": 0}
+        for batch in batches:
+            result = self.add_documents(batch, namespace=namespace)
+            for key in totals:
+                totals[key] += result[key]
+        return totals
+
+    def add_change_listener(self, callback):
+        """
+        Register a callback to run whenever a namespace's documents change.
+
+        Args:
+            callback: Function called with the namespace
+        """
+        if callback not in self._change_listeners:
+            self._change_listeners.append(callback)
+
+    def _notify_change(self, namespace: Optional[str]):
+        """Tell every change listener that a namespace's documents changed."""
+        for callback in self._change_listeners:
+            callback(namespace)
+
+    def is_file_current(
+        self, file_name: str, file_hash: str, namespace: Optional[str] = None
+    ) -> bool:
+        """
+        Check whether a file was already ingested into a namespace unchanged.
+
+        Args:
+            file_name: Name of the file
+            file_hash: Hash of the file contents
+            namespace: Optional namespace to check
+
+        Returns:
+            True if loading and splitting the file again can be skipped
+        """
+        return self.manifest.is_current(namespace, file_name, file_hash)
+
+    def list_namespaces(self) -> List[str]:
+        """
+        List the namespaces that hold vectors.
+
+        Returns:
+            Sorted list of namespace names
+        """
+        return sorted(self.namespace_stats())
+
+    def namespace_stats(self) -> Dict[str, int]:
+        """
+        Get the number of vectors of every namespace from the index stats.
+
+        Returns:
+            Dict of namespace name to vector count
+        """
+        stats = self.index.describe_index_stats()
+        return {
+            name: summary["vector_count"]
+            for name, summary in stats["namespaces"].items()
+        }
+
+    def list_sources(self, namespace: Optional[str] = None) -> List[str]:
+        """
+        List the files ingested into a namespace.
+
+        Args:
+            namespace: Optional namespace to list
+
+        Returns:
+            Sorted list of file names
+        """
+        return sorted(self.manifest.sources(namespace))
+
+    def delete_source(
+        self, source: str, namespace: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Delete every chunk of a file from a namespace.
+
+        The chunk IDs come from the manifest, or from listing the index by
+        the file's ID prefix if the manifest does not know the file, e.g.
+        because it was ingested on another machine. Indexes that cannot list
+        IDs (pod-based, or pinecone-client before 3.0) delete the chunks by
+        their file_name metadata instead, and the count is taken from the
+        lexical index, 0 without one.
+
+        Args:
+            source: The file name
+            namespace: Optional namespace to delete from
+
+        Returns:
+            Dict with the number of deleted chunks
+        """
+        with trace("delete_source", namespace=namespace or "") as span:
+            entry = self.manifest.get(namespace, source)
+            ids = None
+            if entry is not None:
+                ids = list(entry["chunk_ids"])
+            else:
+                try:
+                    ids = list(self._list_ids(namespace, prefix=source_prefix(source)))
+                except ValueError as e:
+                    print(f"Deleting the chunks of {source} by metadata: {e}")
+            if ids is not None:
+                self._delete_ids(ids, namespace)
+            else:
+                ids = self._delete_by_file_name(source, namespace)
+            self.manifest.remove(namespace, source)
+            self.flush()
+            if ids:
+                self._notify_change(namespace)
+            span.set_attribute("deleted", len(ids))
+
+        print(f"Deleted {len(ids)} chunks of {source} from the {self.backend} index")
+        return {"deleted": len(ids)}
+
+    def delete_namespace(self, namespace: Optional[str] = None) -> Dict[str, int]:
+        """
+        Delete every vector of a namespace, its lexical index and its manifest.
+
+        Args:
+            namespace: Optional namespace to delete
+
+        Returns:
+            Dict with the number of deleted vectors
+        """
+        with trace("delete_namespace", namespace=namespace or "") as span:
+            count = self.namespace_stats().get(namespace or "", 0)
+            # Pinecone answers 404 when deleting a namespace that does not exist
+            if count:
+                self.index.delete(delete_all=True, namespace=namespace)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(delete_all=True, namespace=namespace)
+            self.manifest.clear(namespace)
+            self.flush()
+            self._notify_change(namespace)
+            span.set_attribute("deleted", count)
+
+        print(f"Deleted {count} vectors of namespace {namespace or '(default)'}")
+        return {"deleted": count}
+
+    def export_namespace(
+        self, path: str, namespace: Optional[str] = None, batch_size: int = 200
+    ) -> Dict[str, float]:
+        """
+        Export the vectors and metadata of a namespace to a snapshot file.
+
+        Vectors are fetched by ID in batches, several at a time, and
+        streamed to the file, so namespaces of millions of chunks are
+        exported in bounded memory. The IDs come from the manifest, or from
+        listing the index if the namespace has no manifest.
+
+        Args:
+            path: Path of the snapshot file, e.g. "docs.npz"
+            namespace: Optional namespace to export
+            batch_size: Vectors per fetch request
+
+        Returns:
+            Dict with the number of exported vectors, the file size and throughput
+        """
+        started = time.perf_counter()
+        info = {
+            "namespace": namespace or "",
+            "embedding_model": self.embedding_model,
+            "created_at": int(time.time()),
+        }
+        with trace("export_namespace", namespace=namespace or "") as span:
+            with SnapshotWriter(path, self.embedding_dimension, info) as writer:
+                id_batches = batched(self._iter_ids(namespace), batch_size)
+                for records in self.get_ingestor().fetch_vectors(id_batches, namespace):
+                    writer.write(
+                        [record["id"] for record in records],
+                        [record["values"] for record in records],
+                        [record["metadata"] for record in records],
+                    )
+            span.set_attribute("vectors", writer.count)
+
+        elapsed = time.perf_counter() - started
+        print(
+            f"Exported {writer.count} vectors of namespace "
+            f"{namespace or '(default)'} to {path}"
+        )
+        return {
+            "vectors": writer.count,
+            "bytes": os.path.getsize(path),
+            "seconds": elapsed,
+            "vectors_per_second": writer.count / elapsed if elapsed else 0.0,
+        }
+
+    def import_namespace(
+        self,
+        path: str,
+        namespace: Optional[str] = None,
+        replace: bool = False,
+        batch_size: int = 1000,
+    ) -> Dict[str, float]:
+        """
+        Import a snapshot written by export_namespace into a namespace.
+
+        The vectors are upserted as they are, in concurrent batches, so no
+        embedding calls are made. Once every upsert succeeded, the lexical
+        index and the manifest are rebuilt from the chunk texts and metadata
+        in the snapshot, so re-uploading a file afterwards only upserts its
+        changed chunks.
+
+        Args:
+            path: Path of the snapshot file
+            namespace: Optional namespace to import into, which may differ
+                from the exported one
+            replace: Whether to delete the namespace's vectors first
+            batch_size: Rows read from the snapshot at a time
+
+        Returns:
+            Dict with the number of imported vectors and files, and throughput
+        """
+        with SnapshotReader(path) as snapshot, trace(
+            "import_namespace", namespace=namespace or "", vectors=len(snapshot)
+        ) as span:
+            if snapshot.dimension != self.embedding_dimension:
+                raise ValueError(
+                    f"The snapshot holds {snapshot.dimension}-dimension vectors, "
+                    f"but the index uses {self.embedding_dimension} dimensions."
+                )
+            if snapshot.info.get("embedding_model") != self.embedding_model:
+                print(
+                    f"Warning: the snapshot was embedded with "
+                    f"{snapshot.info.get('embedding_model')}, not {self.embedding_model}"
+                )
+            if replace:
+                self.delete_namespace(namespace)
+
+            ingestor = self.get_ingestor()
+            sources: Dict[str, Dict[str, Any]] = {}
+            lexical_ids: List[str] = []
+            lexical_documents: List[Document] = []
+
+            def records():
+                for ids, vectors, metadatas in snapshot.batches(batch_size):
+                    lexical_ids.extend(ids)
+                    lexical_documents.extend(
+                        self._group_imported(ids, metadatas, sources, ingestor.text_key)
+                    )
+                    yield [
+                        {"id": vector_id, "values": values.tolist(), "metadata": metadata}
+                        for vector_id, values, metadata in zip(ids, vectors, metadatas)
+                    ]
+
+            stats = ingestor.upsert_vectors(records(), namespace=namespace)
+
+            # Only chunks whose vectors are in the index are searchable by keyword
+            if self.lexical_index is not None:
+                self.lexical_index.add(
+                    lexical_ids, lexical_documents, namespace=namespace
+                )
+
+            for source, entry in sources.items():
+                known = self.manifest.get(namespace, source)
+                ids = entry["chunk_ids"]
+                if known:
+                    imported = set(ids)
+                    ids = [i for i in known["chunk_ids"] if i not in imported] + ids
+                self.manifest.update(
+                    namespace, source, entry["file_hash"], ids, save=False
+                )
+            self.flush()
+            self._notify_change(namespace)
+            span.set_attributes(imported=stats["vectors"], sources=len(sources))
+
+        print(
+            f"Imported {stats['vectors']} vectors of {len(sources)} files "
+            f"into namespace {namespace or '(default)'}"
+        )
+        return {"sources": len(sources), **stats}
+
+    def _iter_ids(self, namespace: Optional[str]) -> Iterable[str]:
+        """Get the vector IDs of a namespace from the manifest, or else from the index."""
+        sources = self.manifest.sources(namespace)
+        if not sources:
+            yield from self._list_ids(namespace)
+            return
+        for source in sources:
+            entry = self.manifest.get(namespace, source)
+            if entry is not None:
+                yield from entry["chunk_ids"]
+
+    def _delete_by_file_name(self, source: str, namespace: Optional[str]) -> List[str]:
+        """Delete the chunks of a file by metadata and get their lexical index IDs."""
+        self.index.delete(filter={"file_name": source}, namespace=namespace)
+        if self.lexical_index is None:
+            return []
+        ids = self.lexical_index.ids(namespace, prefix=source_prefix(source))
+        if ids:
+            self.lexical_index.delete(ids=ids, namespace=namespace)
+        return ids
+
+    def _list_ids(self, namespace: Optional[str], prefix: str = "") -> Iterable[str]:
+        """
+        List the vector IDs of a namespace from the index.
+
+        Only serverless Pinecone indexes list IDs, from pinecone-client 3.0 on.
+
+        Raises:
+            ValueError: If the index cannot list IDs, so the manifest is needed
+        """
+        unsupported = ValueError(
+            f"The {self.backend} index cannot list vector IDs, so the IDs of "
+            f"namespace {namespace or '(default)'} must come from the ingest "
+            f"manifest, which has no entry for them. Use a serverless index "
+            f"with pinecone-client 3.0 or later, or the manifest of the "
+            f"machine that ingested the files."
+        )
+        if not hasattr(self.index, "list"):
+            raise unsupported
+        try:
+            for page in self.index.list(prefix=prefix or None, namespace=namespace):
+                yield from page
+        except Exception as e:
+            # Pod-based indexes answer 400 Bad Request
+            if getattr(e, "status", None) == 400:
+                raise unsupported from e
+            raise
+
+    def _group_imported(self, ids, metadatas, sources, text_key) -> List[Document]:
+        """Build the documents of imported chunks and group their IDs by file."""
+        documents = []
+        for vector_id, metadata in zip(ids, metadatas):
+            metadata = dict(metadata)
+            text = metadata.pop(text_key, "")
+            document = Document(page_content=text, metadata=metadata)
+            documents.append(document)
+            entry = sources.setdefault(
+                source_key(document),
+                {"file_hash": metadata.get("file_hash"), "chunk_ids": []},
+            )
+            entry["chunk_ids"].append(vector_id)
+        return documents
 
     def similarity_search(
-        self, query: str, k: int = 4, namespace: Optional[str] = None
+        self,
+        query: str,
+        k: int = 4,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
     ):
         """
         Perform a similarity search in the vector store.
@@ -131,10 +856,61 @@ class VectorStoreManager:
             query: The query string
             k: Number of results to return
             namespace: Optional namespace to search in
+            filter: Optional metadata filter, e.g. from build_filter, applied
+                by the index during the query
+
+        Returns:
+            List of Document objects
+        """
+        vector_store = self.get_vector_store()
+
+        with trace(
+            "similarity_search", k=k, query_chars=len(query), filtered=bool(filter)
+        ) as span:
+            results = vector_store.similarity_search(
+                query=query, k=k, namespace=namespace, filter=filter
+            )
+            span.set_attribute("results", len(results))
+            return results
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Async counterpart of similarity_search.
+
+        Args:
+            query: The query string
+            k: Number of results to return
+            namespace: Optional namespace to search in
+            filter: Optional metadata filter, e.g. from build_filter
 
         Returns:
             List of Document objects
         """
         vector_store = self.get_vector_store()
 
-        return vector_store.similarity_search(query=query, k=k, namespace=namespace)
+        with trace(
+            "similarity_search", k=k, query_chars=len(query), filtered=bool(filter)
+        ) as span:
+            results = await vector_store.asimilarity_search(
+                query=query, k=k, namespace=namespace, filter=filter
+            )
+            span.set_attribute("results", len(results))
+            return results
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, float]]:
+        """
+        Get the hit and miss counters of the embedding cache.
+
+        Returns:
+            Dict with hit, miss and size counters, or None if the embeddings
+            are not cached, e.g. injected fakes
+        """
+        if self.embedding_cache is None:
+            return None
+        return self.embedding_cache.stats
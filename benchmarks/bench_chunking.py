@@ -0,0 +1,126 @@
+"""
+Throughput and chunk density benchmark of the document chunkers.
+
+Writes a synthetic corpus of Markdown, text and CSV files and splits it with
+DocumentProcessor's character splitter and its token-aware structural
+chunker, at the same nominal chunk size (--chunk-tokens tokens against four
+characters per token). Prints one JSON result per chunker and file type with
+MB per second, number of chunks, and the mean, p95 and maximum tokens per
+chunk.
+
+Usage:
+    python benchmarks/bench_chunking.py --files 50 --chunk-tokens 256
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+
+from utils.chunker import count_tokens
+from utils.document_processor import DocumentProcessor
+
+
+def paragraph(rng, vocabulary, sentences):
+    """Generate a paragraph of random sentences."""
+    return " ".join(
+        " ".join(rng.choices(vocabulary, k=rng.randint(6, 24))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def write_corpus(directory, files, seed=0):
+    """
+    Write synthetic Markdown, text and CSV files.
+
+    Returns:
+        Dict of file type to list of file paths
+    """
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ter", "sun", "ba", "rel", "vo", "dix", "pra"]
+    vocabulary = ["".join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(5000)]
+
+    paths = {".md": [], ".txt": [], ".csv": []}
+    for i in range(files):
+        lines = []
+        for chapter in range(4):
+            lines.append(f"# Chapter {chapter}\n")
+            for section in range(4):
+                lines.append(f"## Section {chapter}.{section}\n")
+                for _ in range(rng.randint(2, 6)):
+                    lines.append(paragraph(rng, vocabulary, rng.randint(1, 8)) + "\n")
+        paths[".md"].append(os.path.join(directory, f"doc-{i}.md"))
+        with open(paths[".md"][-1], "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+        paths[".txt"].append(os.path.join(directory, f"doc-{i}.txt"))
+        with open(paths[".txt"][-1], "w", encoding="utf-8") as f:
+            f.write(
+                "\n\n".join(
+                    paragraph(rng, vocabulary, rng.randint(1, 12)) for _ in range(60)
+                )
+            )
+
+        paths[".csv"].append(os.path.join(directory, f"doc-{i}.csv"))
+        with open(paths[".csv"][-1], "w", encoding="utf-8") as f:
+            f.write("id,name,description\n")
+            for row in range(300):
+                f.write(f"{row},{rng.choice(vocabulary)},{paragraph(rng, vocabulary, 1)}\n")
+    return paths
+
+
+def run(processor, file_paths):
+    """Load and split files, timing only the splitting."""
+    documents = [processor.load_document(path) for path in file_paths]
+    size = sum(len(d.page_content) for docs in documents for d in docs)
+
+    started = time.perf_counter()
+    chunks = [chunk for docs in documents for chunk in processor.split_documents(docs)]
+    seconds = time.perf_counter() - started
+
+    tokens = np.asarray(count_tokens([chunk.page_content for chunk in chunks]))
+    return {
+        "mb_per_second": round(size / seconds / 1e6, 2),
+        "chunks": len(chunks),
+        "mean_tokens": round(float(tokens.mean()), 1),
+        "p95_tokens": int(np.percentile(tokens, 95)),
+        "max_tokens": int(tokens.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    processors = {
+        "characters": DocumentProcessor(
+            chunking="characters",
+            chunk_size=args.chunk_tokens * 4,
+            chunk_overlap=args.overlap_tokens * 4,
+        ),
+        "tokens": DocumentProcessor(
+            chunking="tokens",
+            chunk_tokens=args.chunk_tokens,
+            chunk_overlap_tokens=args.overlap_tokens,
+        ),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_corpus(directory, args.files)
+        for file_type, file_paths in paths.items():
+            for name, processor in processors.items():
+                result = run(processor, file_paths)
+                print(json.dumps({"chunking": name, "file_type": file_type, **result}))
+
+
+if __name__ == "__main__":
+    main()
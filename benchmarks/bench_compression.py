@@ -0,0 +1,132 @@
+"""
+Recall, memory and latency benchmark of embedding compression.
+
+Builds synthetic embeddings that mimic Matryoshka-trained models: documents
+cluster around topics and the variance of the dimensions decays, so leading
+dimensions carry most of the signal. For every combination of truncated
+dimension, quantization and re-scoring, the vectors are written to a
+LocalVectorIndex, reloaded from disk and queried. Prints one JSON result per
+setting with recall@k against exact search over the full float32 vectors, the
+bytes per vector of the copy searched in memory, and p50/p95 query latency.
+
+Usage:
+    python benchmarks/bench_compression.py --vectors 20000 --dimension 3072
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+
+from utils.embedding_compression import truncate
+from utils.local_index import LocalVectorIndex
+
+
+def percentile(values, q):
+    """Get a percentile of a list of latencies in milliseconds."""
+    return float(np.percentile(np.asarray(values) * 1000, q))
+
+
+def synthetic_embeddings(count, queries, dimension, topics, seed=0):
+    """Generate unit-length documents and queries with decaying dimension variance."""
+    rng = np.random.default_rng(seed)
+    spectrum = (1 + np.arange(dimension, dtype=np.float32)) ** -0.5
+    centroids = rng.normal(size=(topics, dimension)).astype(np.float32)
+    labels = rng.integers(0, topics, count)
+    documents = centroids[labels] + rng.normal(size=(count, dimension)).astype(np.float32)
+    documents *= spectrum
+    # Queries paraphrase a document: same topic, different wording
+    sources = rng.choice(count, queries, replace=False)
+    noise = rng.normal(scale=0.8, size=(queries, dimension)).astype(np.float32)
+    questions = documents[sources] + noise * spectrum
+    return truncate(documents, dimension), truncate(questions, dimension)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=[3072, 1024, 512, 256]
+    )
+    parser.add_argument(
+        "--quantizations", nargs="+", default=["none", "int8", "binary"]
+    )
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[0, 4, 16])
+    args = parser.parse_args()
+
+    documents, queries = synthetic_embeddings(
+        args.vectors, args.queries, args.dimension, args.topics
+    )
+    exact = [
+        set(np.argsort(-(documents @ query))[: args.k].tolist()) for query in queries
+    ]
+
+    for dimension in sorted({min(d, args.dimension) for d in args.dimensions}, reverse=True):
+        vectors = truncate(documents, dimension)
+        shortened = truncate(queries, dimension)
+        for quantization in args.quantizations:
+            rescore_factors = [0] if quantization == "none" else args.rescore_factors
+            for rescore_factor in rescore_factors:
+                with tempfile.TemporaryDirectory() as directory:
+                    settings = dict(
+                        directory=directory,
+                        dimension=dimension,
+                        quantization=quantization,
+                        rescore_factor=rescore_factor,
+                    )
+                    index = LocalVectorIndex(**settings)
+                    for start in range(0, len(vectors), 10000):
+                        batch = vectors[start : start + 10000]
+                        index.upsert(
+                            [(str(start + i), values) for i, values in enumerate(batch)],
+                            namespace="bench",
+                        )
+                    index.flush()
+
+                    # Search the index as loaded from disk, with the float32
+                    # vectors memory-mapped
+                    index = LocalVectorIndex(**settings)
+                    ns = index._namespace("bench")
+                    if ns.codes is None:
+                        searched_bytes = ns.matrix().nbytes
+                    else:
+                        searched_bytes = ns.codes.nbytes + ns.scales.nbytes
+
+                    latencies, recalls = [], []
+                    for query, expected in zip(shortened, exact):
+                        started = time.perf_counter()
+                        matches = index.query(query, top_k=args.k, namespace="bench")
+                        latencies.append(time.perf_counter() - started)
+                        found = {int(match["id"]) for match in matches["matches"]}
+                        recalls.append(len(found & expected) / args.k)
+
+                print(
+                    json.dumps(
+                        {
+                            "benchmark": "embedding_compression",
+                            "dimension": dimension,
+                            "quantization": quantization,
+                            "rescore_factor": rescore_factor,
+                            "vectors": args.vectors,
+                            "bytes_per_vector": searched_bytes / args.vectors,
+                            "searched_mb": round(searched_bytes / 2**20, 2),
+                            "p50_ms": percentile(latencies, 50),
+                            "p95_ms": percentile(latencies, 95),
+                            f"recall@{args.k}": float(np.mean(recalls)),
+                        }
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
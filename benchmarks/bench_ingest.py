@@ -0,0 +1,73 @@
+"""
+Offline throughput benchmark of the bulk ingest engine.
+
+Runs BulkIngestor against the fake embedding model and fake Pinecone index
+with simulated latency and rate limits, and prints one JSON result per
+concurrency setting.
+
+Usage:
+    python benchmarks/bench_ingest.py --chunks 5000 --concurrency 1 4 8
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langchain_core.documents import Document
+
+from utils.bulk_ingest import BulkIngestor
+from utils.fakes import FakeEmbeddings, FakePineconeIndex
+
+
+def make_documents(num_chunks: int):
+    """Build synthetic chunks of about 250 tokens each."""
+    return [
+        Document(
+            page_content=f"chunk {i} " + "lorem ipsum dolor sit amet " * 50,
+            metadata={"source": f"doc-{i // 100}.txt"},
+        )
+        for i in range(num_chunks)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--batch-tokens", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--upsert-latency", type=float, default=0.02)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.02)
+    args = parser.parse_args()
+
+    documents = make_documents(args.chunks)
+    ids = [f"chunk-{i}" for i in range(args.chunks)]
+
+    for concurrency in args.concurrency:
+        embeddings = FakeEmbeddings(
+            dimension=args.dimension,
+            latency=args.embed_latency,
+            rate_limit_probability=args.rate_limit_probability,
+        )
+        index = FakePineconeIndex(
+            dimension=args.dimension,
+            latency=args.upsert_latency,
+            rate_limit_probability=args.rate_limit_probability,
+        )
+        ingestor = BulkIngestor(
+            embeddings,
+            index,
+            batch_tokens=args.batch_tokens,
+            max_concurrency=concurrency,
+            base_delay=0.01,
+        )
+        stats = ingestor.ingest(documents, ids, namespace="bench")
+        print(json.dumps({"benchmark": "ingest", "concurrency": concurrency, **stats}))
+
+
+if __name__ == "__main__":
+    main()
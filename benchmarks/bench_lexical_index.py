@@ -0,0 +1,115 @@
+"""
+Build and query benchmark of the BM25 lexical index.
+
+Indexes a synthetic corpus of chunks drawn from a Zipf-distributed vocabulary,
+each carrying a unique error code, and prints one JSON result with build
+throughput, p50/p95/p99 query latency for identifier and multi-word queries,
+the top-1 hit rate of identifier lookups, and peak memory.
+
+Usage:
+    python benchmarks/bench_lexical_index.py --chunks 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.lexical_index import BM25Index
+
+
+def percentile(values, q):
+    """Get a percentile of a list of latencies in milliseconds."""
+    return float(np.percentile(np.asarray(values) * 1000, q))
+
+
+def synthetic_chunks(count, words_per_chunk, vocabulary_size, seed=0):
+    """Generate chunk texts with a Zipf word distribution and one error code each."""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"w{i}" for i in range(vocabulary_size)]
+    for start in range(0, count, 10000):
+        size = min(10000, count - start)
+        words = rng.zipf(1.2, size=(size, words_per_chunk)) % vocabulary_size
+        for offset, row in enumerate(words):
+            text = " ".join(vocabulary[i] for i in row)
+            yield f"{text} ERR-{start + offset:07d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as directory:
+        index = BM25Index(directory=directory)
+
+        started = time.perf_counter()
+        ids, documents = [], []
+        for i, text in enumerate(synthetic_chunks(args.chunks, args.words, args.vocabulary)):
+            ids.append(str(i))
+            documents.append(Document(page_content=text))
+            if len(ids) == 10000:
+                index.add(ids, documents, namespace="bench")
+                ids, documents = [], []
+        if ids:
+            index.add(ids, documents, namespace="bench")
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.flush()
+        flush_seconds = time.perf_counter() - started
+
+        targets = rng.choice(args.chunks, args.queries)
+        identifier_latencies, hits = [], 0
+        for target in targets:
+            started = time.perf_counter()
+            results = index.search(f"ERR-{target:07d}", k=args.k, namespace="bench")
+            identifier_latencies.append(time.perf_counter() - started)
+            hits += bool(results) and results[0][0].page_content.endswith(
+                f"ERR-{target:07d}"
+            )
+
+        phrase_latencies = []
+        for _ in range(args.queries):
+            words = rng.zipf(1.2, size=3) % args.vocabulary
+            started = time.perf_counter()
+            index.search(" ".join(f"w{i}" for i in words), k=args.k, namespace="bench")
+            phrase_latencies.append(time.perf_counter() - started)
+
+    print(
+        json.dumps(
+            {
+                "chunks": args.chunks,
+                "build_seconds": round(build_seconds, 2),
+                "chunks_per_second": round(args.chunks / build_seconds),
+                "flush_seconds": round(flush_seconds, 2),
+                "identifier_p50_ms": round(percentile(identifier_latencies, 50), 2),
+                "identifier_p95_ms": round(percentile(identifier_latencies, 95), 2),
+                "identifier_p99_ms": round(percentile(identifier_latencies, 99), 2),
+                "identifier_hit_rate": hits / args.queries,
+                "phrase_p50_ms": round(percentile(phrase_latencies, 50), 2),
+                "phrase_p95_ms": round(percentile(phrase_latencies, 95), 2),
+                "phrase_p99_ms": round(percentile(phrase_latencies, 99), 2),
+                "peak_rss_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                ),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
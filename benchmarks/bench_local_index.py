@@ -0,0 +1,98 @@
+"""
+Query latency benchmark of the local vector index.
+
+Fills a LocalVectorIndex with random unit vectors and prints one JSON result
+per search mode (exact and IVF) with p50/p95/p99 query latency and recall@k
+of the approximate search against the exact one.
+
+Usage:
+    python benchmarks/bench_local_index.py --vectors 200000 --dimension 256
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+
+from utils.local_index import LocalVectorIndex
+
+
+def percentile(values, q):
+    """Get a percentile of a list of latencies in milliseconds."""
+    return float(np.percentile(np.asarray(values) * 1000, q))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--ivf-lists", type=int, default=256)
+    parser.add_argument("--ivf-probes", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.vectors, args.dimension)).astype(np.float32)
+    queries = vectors[rng.choice(args.vectors, args.queries)] + rng.normal(
+        scale=0.3, size=(args.queries, args.dimension)
+    ).astype(np.float32)
+
+    exact_results = []
+    for mode, ivf_lists in (("exact", 0), ("ivf", args.ivf_lists)):
+        with tempfile.TemporaryDirectory() as directory:
+            index = LocalVectorIndex(
+                directory=directory,
+                dimension=args.dimension,
+                ivf_lists=ivf_lists,
+                ivf_probes=args.ivf_probes,
+                ivf_min_vectors=0,
+            )
+            started = time.perf_counter()
+            for start in range(0, args.vectors, 10000):
+                batch = vectors[start : start + 10000]
+                index.upsert(
+                    [(str(start + i), values) for i, values in enumerate(batch)],
+                    namespace="bench",
+                )
+            build_seconds = time.perf_counter() - started
+
+            latencies, results = [], []
+            for query in queries:
+                started = time.perf_counter()
+                matches = index.query(query, top_k=args.k, namespace="bench")["matches"]
+                latencies.append(time.perf_counter() - started)
+                results.append({match["id"] for match in matches})
+
+        if mode == "exact":
+            exact_results = results
+        recall = float(
+            np.mean(
+                [len(r & e) / args.k for r, e in zip(results, exact_results)]
+            )
+        )
+        print(
+            json.dumps(
+                {
+                    "benchmark": "local_index_query",
+                    "mode": mode,
+                    "vectors": args.vectors,
+                    "dimension": args.dimension,
+                    "build_seconds": build_seconds,
+                    "p50_ms": percentile(latencies, 50),
+                    "p95_ms": percentile(latencies, 95),
+                    "p99_ms": percentile(latencies, 99),
+                    f"recall@{args.k}": recall,
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
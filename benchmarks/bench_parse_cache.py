@@ -0,0 +1,162 @@
+"""
+Benchmark of the parse cache of DocumentProcessor.
+
+Writes a synthetic corpus of text PDFs and loads it without the parse cache,
+with an empty cache (parse and store) and with a warm cache, then re-chunks
+it at several chunk sizes the way a changed CHUNK_TOKENS setting would.
+Prints one JSON result per scenario with the time per file, MB of PDF per
+second and, for the cache, its size against the PDFs and extracted text.
+
+Usage:
+    python benchmarks/bench_parse_cache.py --files 50 --pages 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from utils.document_processor import DocumentProcessor
+
+
+def pdf_bytes(pages):
+    """Build a PDF with one page of Helvetica text per list of lines."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    font = 3
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for lines in pages:
+        text = b"BT /F1 10 Tf 12 TL 50 780 Td " + b" ".join(
+            b"(" + line.encode("latin-1") + b") '" for line in lines
+        ) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (font, len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        len(kids),
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def write_corpus(directory, files, pages, lines, seed=0):
+    """Write synthetic PDFs and get their paths."""
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ter", "sun", "ba", "rel", "vo", "dix", "pra"]
+    vocabulary = ["".join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(5000)]
+    paths = []
+    for i in range(files):
+        document = [
+            [" ".join(rng.choices(vocabulary, k=12)) for _ in range(lines)]
+            for _ in range(pages)
+        ]
+        paths.append(os.path.join(directory, f"doc-{i}.pdf"))
+        with open(paths[-1], "wb") as f:
+            f.write(pdf_bytes(document))
+    return paths
+
+
+def load_all(processor, paths):
+    """Load every file and get the seconds taken and the extracted characters."""
+    started = time.perf_counter()
+    chars = sum(
+        len(document.page_content)
+        for path in paths
+        for document in processor.load_document(path)
+    )
+    return time.perf_counter() - started, chars
+
+
+def result(scenario, seconds, paths, **extra):
+    """Format the result of one scenario."""
+    pdf_mb = sum(os.path.getsize(path) for path in paths) / 2**20
+    return {
+        "benchmark": "parse_cache",
+        "scenario": scenario,
+        "files": len(paths),
+        "ms_per_file": round(seconds * 1000 / len(paths), 2),
+        "pdf_mb_per_second": round(pdf_mb / seconds, 2),
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[128, 256, 512])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_corpus(directory, args.files, args.pages, args.lines)
+        cache_dir = os.path.join(directory, "parsed")
+
+        seconds, chars = load_all(DocumentProcessor(parse_cache_dir=""), paths)
+        print(json.dumps(result("no_cache", seconds, paths)))
+
+        processor = DocumentProcessor(parse_cache_dir=cache_dir)
+        seconds, _ = load_all(processor, paths)
+        print(json.dumps(result("cold_cache", seconds, paths)))
+
+        seconds, _ = load_all(processor, paths)
+        stats = processor.parse_cache.stats()
+        print(
+            json.dumps(
+                result(
+                    "warm_cache",
+                    seconds,
+                    paths,
+                    cache_mb=round(stats["bytes"] / 2**20, 2),
+                    pdf_mb=round(sum(os.path.getsize(p) for p in paths) / 2**20, 2),
+                    text_mb=round(chars / 2**20, 2),
+                )
+            )
+        )
+
+        # Re-chunking with new settings parses nothing when the cache is warm
+        for cache in ("", cache_dir):
+            started = time.perf_counter()
+            chunks = 0
+            for chunk_tokens in args.chunk_tokens:
+                rechunker = DocumentProcessor(
+                    chunk_tokens=chunk_tokens, parse_cache_dir=cache
+                )
+                chunks += len(rechunker.process_documents(paths))
+            print(
+                json.dumps(
+                    result(
+                        "rechunk_cached" if cache else "rechunk_uncached",
+                        time.perf_counter() - started,
+                        paths,
+                        chunk_settings=len(args.chunk_tokens),
+                        chunks=chunks,
+                    )
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+End-to-end benchmark and evaluation of ingestion, retrieval and chat.
+
+Generates synthetic corpora of growing size with labeled facts, then drives
+DocumentProcessor.process_documents, VectorStoreManager.add_documents,
+similarity_search and RAGChatbot.chat against the local vector index, fake
+embeddings and a fake chat model, so no API keys are needed. Every labeled
+question is asked both as a first turn and as a follow-up in a conversation.
+Prints one JSON result per corpus size with chunks per second, p50/p95/p99
+latency, recall@k of the labeled queries, answer accuracy, prompt tokens per
+answer and peak memory. Broad questions asking for the access codes of two
+projects at once measure recall of both facts, e.g. with --multi-query
+heuristic; pass --output to append the results to a JSON-lines file tracked over time.
+
+Usage:
+    python benchmarks/bench_rag.py --documents 100 1000 --chunk-tokens 300 --k 4
+
+Pass --context-tokens 0 to measure without context packing.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+
+from utils.chatbot import RAGChatbot
+from utils.document_processor import DocumentProcessor
+from utils.fakes import FakeChatModel, FakeEmbeddings
+from utils.tracing import collect_spans
+from utils.vector_store import VectorStoreManager
+
+
+def percentile(values, q):
+    """Get a percentile of a list of latencies in milliseconds."""
+    return round(float(np.percentile(np.asarray(values) * 1000, q)), 2)
+
+
+def latency_stats(prefix, values):
+    """Summarize latencies as p50/p95/p99 fields."""
+    return {f"{prefix}_p{q}_ms": percentile(values, q) for q in (50, 95, 99)}
+
+
+def write_corpus(directory, num_documents, facts_per_document, words_per_document, seed=0):
+    """
+    Write synthetic text files with labeled facts.
+
+    Returns:
+        List of file paths and list of (question, fact name, answer) labels
+    """
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ter", "sun", "ba", "rel", "vo", "dix", "pra"]
+    vocabulary = [
+        "".join(rng.choice(syllables) for _ in range(3)) for _ in range(3000)
+    ]
+
+    file_paths, labels = [], []
+    for doc in range(num_documents):
+        sentences = []
+        for _ in range(words_per_document // 12):
+            words = rng.choices(vocabulary, k=12)
+            sentences.append(" ".join(words).capitalize() + ".")
+        for fact in range(facts_per_document):
+            name = f"Orion{doc}x{fact}"
+            answer = f"{rng.choice(vocabulary)}{rng.randint(100, 999)}"
+            position = rng.randint(0, len(sentences))
+            sentences.insert(position, f"The access code of project {name} is {answer}.")
+            labels.append((f"What is the access code of project {name}?", name, answer))
+
+        file_path = os.path.join(directory, f"doc-{doc}.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+        file_paths.append(file_path)
+    return file_paths, labels
+
+
+def run(args, num_documents):
+    """Benchmark one corpus size."""
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_dir = os.path.join(directory, "corpus")
+        os.makedirs(corpus_dir)
+        file_paths, labels = write_corpus(
+            corpus_dir, num_documents, args.facts, args.words
+        )
+        labels = random.Random(1).sample(labels, min(args.queries, len(labels)))
+
+        # Keep checkpoints and indexes out of the working directory
+        os.environ["INGEST_CHECKPOINT_DIR"] = os.path.join(directory, "checkpoints")
+        os.environ["HYBRID_SEARCH"] = "true" if args.retrieval == "hybrid" else "false"
+
+        processor = DocumentProcessor(
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            chunking=args.chunking,
+            chunk_tokens=args.chunk_tokens,
+        )
+        started = time.perf_counter()
+        chunks = processor.process_documents(file_paths)
+        parse_seconds = time.perf_counter() - started
+
+        manager = VectorStoreManager(
+            backend="local",
+            pinecone_index_name="bench",
+            local_index_dir=os.path.join(directory, "local_index"),
+            manifest_dir=os.path.join(directory, "manifests"),
+            lexical_index_dir=os.path.join(directory, "lexical_index"),
+            embeddings=FakeEmbeddings(
+                dimension=args.dimension, latency=args.embed_latency, semantic=True
+            ),
+            embedding_dimension=args.dimension,
+        )
+        started = time.perf_counter()
+        manager.add_documents(chunks, namespace="bench")
+        ingest_seconds = time.perf_counter() - started
+
+        search_latencies, search_hits = [], 0
+        for question, name, _ in labels:
+            started = time.perf_counter()
+            results = manager.similarity_search(question, k=args.k, namespace="bench")
+            search_latencies.append(time.perf_counter() - started)
+            search_hits += any(name in document.page_content for document in results)
+
+        chatbot = RAGChatbot(
+            manager.get_vector_store(),
+            llm=FakeChatModel(latency=args.llm_latency),
+            lexical_index=manager.lexical_index,
+            retriever_k=args.k,
+            condense_mode=args.condense_mode,
+            context_tokens=args.context_tokens,
+            fetch_k=args.fetch_k,
+            multi_query=args.multi_query,
+        )
+        chat_latencies, chat_hits, correct, prompt_tokens = [], 0, 0, []
+        for question, name, answer in labels:
+            chatbot.reset_conversation()
+            with collect_spans() as spans:
+                started = time.perf_counter()
+                response = chatbot.chat(question, namespace="bench")
+                chat_latencies.append(time.perf_counter() - started)
+            prompt_tokens.append(
+                sum(
+                    span["attributes"].get("prompt_tokens", 0)
+                    for span in spans
+                    if span["name"] == "llm.generate"
+                )
+            )
+            chat_hits += any(
+                name in document.page_content
+                for document in response["source_documents"]
+            )
+            correct += answer in response["answer"]
+
+        # Ask every labeled question again as the second turn of a conversation
+        followup_latencies, followup_correct = [], 0
+        for i, (question, _, answer) in enumerate(labels):
+            chatbot.reset_conversation()
+            chatbot.chat(labels[i - 1][0], namespace="bench")
+            started = time.perf_counter()
+            response = chatbot.chat(question, namespace="bench")
+            followup_latencies.append(time.perf_counter() - started)
+            followup_correct += answer in response["answer"]
+
+        # Ask for two facts at once, both of which must be retrieved
+        broad_latencies, broad_hits = [], 0
+        for i, (_, name, _) in enumerate(labels):
+            names = (name, labels[i - 1][1])
+            chatbot.reset_conversation()
+            started = time.perf_counter()
+            response = chatbot.chat(
+                f"What are the access codes of project {names[0]} and {names[1]}?",
+                namespace="bench",
+            )
+            broad_latencies.append(time.perf_counter() - started)
+            broad_hits += sum(
+                any(name in document.page_content for document in response["source_documents"])
+                for name in names
+            ) / len(names)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "documents": num_documents,
+        "chunks": len(chunks),
+        "chunking": args.chunking,
+        "chunk_size": args.chunk_tokens if args.chunking == "tokens" else args.chunk_size,
+        "k": args.k,
+        "retrieval": args.retrieval,
+        "condense_mode": args.condense_mode,
+        "context_tokens": args.context_tokens,
+        "multi_query": args.multi_query,
+        "queries": len(labels),
+        "parse_chunks_per_second": round(len(chunks) / parse_seconds, 1),
+        "ingest_chunks_per_second": round(len(chunks) / ingest_seconds, 1),
+        **latency_stats("search", search_latencies),
+        "search_recall_at_k": round(search_hits / len(labels), 3),
+        **latency_stats("chat", chat_latencies),
+        "chat_recall_at_k": round(chat_hits / len(labels), 3),
+        "answer_accuracy": round(correct / len(labels), 3),
+        "prompt_tokens_mean": round(float(np.mean(prompt_tokens)), 1),
+        **latency_stats("followup", followup_latencies),
+        "followup_accuracy": round(followup_correct / len(labels), 3),
+        **latency_stats("broad", broad_latencies),
+        "broad_recall_at_k": round(broad_hits / len(labels), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--facts", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--chunking", choices=["tokens", "characters"], default="tokens")
+    parser.add_argument("--chunk-tokens", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--retrieval", choices=["hybrid", "vector"], default="hybrid")
+    parser.add_argument("--condense-mode", choices=["auto", "always"], default="auto")
+    parser.add_argument("--context-tokens", type=int, default=800)
+    parser.add_argument("--fetch-k", type=int, default=12)
+    parser.add_argument(
+        "--multi-query", choices=["off", "heuristic", "llm"], default="off"
+    )
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    for num_documents in args.documents:
+        result = run(args, num_documents)
+        print(json.dumps(result))
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Load test of the headless HTTP API.
+
+Sends concurrent requests to a running API server (python main.py serve) and
+prints one JSON result per endpoint with throughput and p50/p95/p99 latency.
+The health and namespace endpoints measure the per-request overhead of the
+server itself; pass --message to also load the chat endpoint.
+
+Usage:
+    python benchmarks/bench_server.py --url http://127.0.0.1:8000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+
+def percentile(values, q):
+    """Get a percentile of a list of latencies in milliseconds."""
+    return float(np.percentile(np.asarray(values) * 1000, q))
+
+
+async def load(client, method, path, body, requests, concurrency):
+    """Send requests with bounded concurrency and collect their latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def send():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send() for _ in range(requests)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run(args):
+    endpoints = [("GET", "/health", None), ("GET", "/namespaces", None)]
+    if args.message:
+        endpoints.append(
+            ("POST", "/chat", {"message": args.message, "namespace": args.namespace})
+        )
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=120
+    ) as client:
+        for method, path, body in endpoints:
+            latencies, errors, seconds = await load(
+                client, method, path, body, args.requests, args.concurrency
+            )
+            print(
+                json.dumps(
+                    {
+                        "endpoint": f"{method} {path}",
+                        "requests": args.requests,
+                        "concurrency": args.concurrency,
+                        "errors": errors,
+                        "requests_per_second": round(args.requests / seconds, 1),
+                        "p50_ms": round(percentile(latencies, 50), 2),
+                        "p95_ms": round(percentile(latencies, 95), 2),
+                        "p99_ms": round(percentile(latencies, 99), 2),
+                    }
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--message", default=None)
+    parser.add_argument("--namespace", default=None)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark of namespace export, import and deletion.
+
+Ingests synthetic chunks into the local index, exports the namespace to a
+snapshot file and imports it into a new namespace, against re-ingesting the
+chunks through the embedding model the way a rebuild without snapshots
+would. Then imports the snapshot into the fake Pinecone index with simulated
+latency at several concurrency settings, and deletes one file's chunks and
+the whole namespace. Prints one JSON result per scenario.
+
+Usage:
+    python benchmarks/bench_snapshot.py --chunks 10000 --dimension 1024 --concurrency 1 4 8
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langchain_core.documents import Document
+
+from utils.bulk_ingest import BulkIngestor
+from utils.fakes import FakeEmbeddings, FakePineconeIndex
+from utils.snapshot import SnapshotReader
+from utils.vector_store import VectorStoreManager
+
+
+def make_chunks(num_chunks, files, seed=0):
+    """Build synthetic chunks of about 200 words spread over several files."""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    return [
+        Document(
+            page_content=" ".join(rng.choices(vocabulary, k=200)),
+            metadata={
+                "file_name": f"doc-{i % files}.txt",
+                "file_hash": f"hash-{i % files}",
+                "file_type": "txt",
+                "ingested_at": 1700000000,
+            },
+        )
+        for i in range(num_chunks)
+    ]
+
+
+def result(scenario, seconds, vectors, **extra):
+    """Format the result of one scenario."""
+    return {
+        "benchmark": "snapshot",
+        "scenario": scenario,
+        "vectors": vectors,
+        "seconds": round(seconds, 3),
+        "vectors_per_second": round(vectors / seconds) if seconds else None,
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--upsert-latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["INGEST_CHECKPOINT_DIR"] = os.path.join(directory, "checkpoints")
+        embeddings = FakeEmbeddings(
+            dimension=args.dimension, latency=args.embed_latency
+        )
+        manager = VectorStoreManager(
+            backend="local",
+            pinecone_index_name="bench",
+            local_index_dir=os.path.join(directory, "local_index"),
+            manifest_dir=os.path.join(directory, "manifests"),
+            lexical_index_dir=os.path.join(directory, "lexical_index"),
+            embedding_cache_path=os.path.join(directory, "embeddings.sqlite"),
+            embeddings=embeddings,
+            embedding_dimension=args.dimension,
+        )
+        chunks = make_chunks(args.chunks, args.files)
+
+        # Rebuilding a namespace from the source files embeds every chunk again
+        started = time.perf_counter()
+        manager.add_documents(chunks, namespace="source")
+        print(
+            json.dumps(
+                result(
+                    "reembed",
+                    time.perf_counter() - started,
+                    args.chunks,
+                    embedding_requests=embeddings.requests,
+                )
+            )
+        )
+
+        path = os.path.join(directory, "source.npz")
+        stats = manager.export_namespace(path, namespace="source")
+        raw_bytes = args.chunks * args.dimension * 4
+        print(
+            json.dumps(
+                result(
+                    "export",
+                    stats["seconds"],
+                    stats["vectors"],
+                    snapshot_mb=round(stats["bytes"] / 2**20, 2),
+                    float32_vectors_mb=round(raw_bytes / 2**20, 2),
+                )
+            )
+        )
+
+        requests = embeddings.requests
+        stats = manager.import_namespace(path, namespace="restored")
+        print(
+            json.dumps(
+                result(
+                    "import_local",
+                    stats["seconds"],
+                    stats["vectors"],
+                    embedding_requests=embeddings.requests - requests,
+                    sources=stats["sources"],
+                )
+            )
+        )
+
+        # Parallel upserts hide the per-request latency of a remote index
+        for concurrency in args.concurrency:
+            index = FakePineconeIndex(
+                dimension=args.dimension, latency=args.upsert_latency
+            )
+            ingestor = BulkIngestor(embeddings, index, max_concurrency=concurrency)
+            with SnapshotReader(path) as snapshot:
+                stats = ingestor.upsert_vectors(
+                    (
+                        [
+                            {"id": i, "values": v.tolist(), "metadata": m}
+                            for i, v, m in zip(ids, vectors, metadatas)
+                        ]
+                        for ids, vectors, metadatas in snapshot.batches()
+                    ),
+                    namespace="restored",
+                )
+            print(
+                json.dumps(
+                    result(
+                        "import_pinecone",
+                        stats["seconds"],
+                        stats["vectors"],
+                        concurrency=concurrency,
+                        upsert_requests=stats["upsert_requests"],
+                    )
+                )
+            )
+
+        started = time.perf_counter()
+        stats = manager.delete_source("doc-0.txt", namespace="restored")
+        seconds = time.perf_counter() - started
+        print(json.dumps(result("delete_source", seconds, stats["deleted"])))
+
+        started = time.perf_counter()
+        stats = manager.delete_namespace("restored")
+        seconds = time.perf_counter() - started
+        print(json.dumps(result("delete_namespace", seconds, stats["deleted"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Cold-start benchmark and import-time profile of the app's entry points.
+
+Starts a fresh interpreter per run and measures how long each entry point
+takes to import, how long `main.py` takes to check its dependencies, and how
+long the HTTP API takes from process start until /health answers. Prints one
+JSON result per target with the minimum and median over --runs, then the
+modules taking the most cumulative import time of --profile, from Python's
+-X importtime report.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --profile server
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_DIR = os.path.join(ROOT, "app")
+
+# Statements timed in a fresh interpreter, and the directory they run in
+IMPORT_TARGETS = {
+    "interpreter": ("pass", ROOT),
+    "main_check": ("import main; main.check_dependencies()", ROOT),
+    "utils": ("import utils", APP_DIR),
+    "document_processor": ("import utils.document_processor", APP_DIR),
+    "vector_store": ("import utils.vector_store", APP_DIR),
+    "chatbot": ("import utils.chatbot", APP_DIR),
+    "server": ("import server", APP_DIR),
+}
+
+
+def time_statement(statement, cwd):
+    """Run a statement in a new interpreter and get its wall-clock seconds."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=cwd, check=True)
+    return time.perf_counter() - started
+
+
+def free_port():
+    """Get a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_server_ready(timeout=60.0):
+    """Start the API server and get the seconds until /health answers."""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port)],
+        cwd=APP_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("The server did not become ready")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_profile(statement, cwd, top):
+    """Get the modules with the largest cumulative import time of a statement."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+    modules.sort(reverse=True)
+    return [
+        {
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "cumulative_ms": round(cumulative / 1000, 1),
+            "self_ms": round(self_time / 1000, 1),
+        }
+        for cumulative, self_time, name in modules[:top]
+    ]
+
+
+def summarize(name, seconds):
+    """Summarize the run times of one target."""
+    return {
+        "benchmark": "startup",
+        "target": name,
+        "runs": len(seconds),
+        "min_ms": round(min(seconds) * 1000, 1),
+        "median_ms": round(statistics.median(seconds) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        default=list(IMPORT_TARGETS) + ["server_ready"],
+        choices=list(IMPORT_TARGETS) + ["server_ready"],
+    )
+    parser.add_argument("--profile", choices=list(IMPORT_TARGETS), default="server")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    for name in args.targets:
+        if name == "server_ready":
+            seconds = [time_server_ready() for _ in range(args.runs)]
+        else:
+            statement, cwd = IMPORT_TARGETS[name]
+            seconds = [time_statement(statement, cwd) for _ in range(args.runs)]
+        print(json.dumps(summarize(name, seconds)))
+
+    if args.profile:
+        statement, cwd = IMPORT_TARGETS[args.profile]
+        for entry in import_profile(statement, cwd, args.top):
+            print(json.dumps({"benchmark": "import_profile", "target": args.profile, **entry}))
+
+
+if __name__ == "__main__":
+    main()
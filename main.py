@@ -1,21 +1,22 @@
+import argparse
+import importlib.util
+import json
 import os
 import subprocess
 import sys
 
+DEPENDENCIES = ("streamlit", "pinecone", "openai", "langchain", "dotenv", "fastapi", "uvicorn")
+
 
 def check_dependencies():
     """Check if all dependencies are installed."""
-    try:
-        import streamlit
-        import pinecone
-        import openai
-        import langchain
-        import dotenv
-
-        return True
-    except ImportError as e:
-        print(f"Missing dependency: {e}")
-        return False
+    # Locate the packages without importing them, which would take seconds
+    # in a process that only starts another interpreter
+    for name in DEPENDENCIES:
+        if importlib.util.find_spec(name) is None:
+            print(f"Missing dependency: No module named '{name}'")
+            return False
+    return True
 
 
 def install_dependencies():
@@ -27,12 +28,116 @@ def install_dependencies():
     print("Dependencies installed successfully!")
 
 
+def serve(host: str, port: int):
+    """Run the headless HTTP API in a single worker process."""
+    import uvicorn
+
+    print(f"Starting RAG Chatbot API on {host}:{port}...")
+    uvicorn.run("server:app", host=host, port=port, app_dir="app")
+
+
+def get_manager():
+    """Get the vector store manager configured by the .env file."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+    from utils.vector_store import VectorStoreManager
+
+    manager = VectorStoreManager()
+    manager.initialize_index()
+    return manager
+
+
+def manage_namespace(args):
+    """Export, import or delete a namespace."""
+    manager = get_manager()
+    if args.command == "export":
+        result = manager.export_namespace(args.output, namespace=args.namespace)
+    elif args.command == "import":
+        result = manager.import_namespace(
+            args.snapshot, namespace=args.namespace, replace=args.replace
+        )
+    elif args.source:
+        result = manager.delete_source(args.source, namespace=args.namespace)
+    else:
+        result = manager.delete_namespace(args.namespace)
+    print(json.dumps(result))
+
+
 def main():
     """Main entry point for the application."""
+    parser = argparse.ArgumentParser(description="RAG Chatbot")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Run the headless HTTP API")
+    serve_parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    serve_parser.add_argument(
+        "--port", type=int, default=int(os.getenv("SERVER_PORT", "8000"))
+    )
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SERVER_WORKERS", "1")),
+        help="Must be 1: the manifest and local indexes are held by one process",
+    )
+    export_parser = subparsers.add_parser(
+        "export", help="Export a namespace's vectors and metadata to a snapshot file"
+    )
+    export_parser.add_argument("--namespace")
+    export_parser.add_argument("--output", required=True)
+    import_parser = subparsers.add_parser(
+        "import", help="Import a snapshot file without embedding calls"
+    )
+    import_parser.add_argument("snapshot")
+    import_parser.add_argument("--namespace")
+    import_parser.add_argument(
+        "--replace", action="store_true", help="Delete the namespace's vectors first"
+    )
+    delete_parser = subparsers.add_parser(
+        "delete", help="Delete a namespace, or one file's chunks with --source"
+    )
+    delete_parser.add_argument("--namespace")
+    delete_parser.add_argument("--source")
+    delete_parser.add_argument(
+        "--default-namespace",
+        action="store_true",
+        help="Delete the default namespace, which has no name (needs --yes)",
+    )
+    delete_parser.add_argument(
+        "--yes", action="store_true", help="Confirm deleting the default namespace"
+    )
+    args = parser.parse_args()
+
+    # The chunk manifest, BM25 index and local vector index are files loaded
+    # into memory and written back on flush. Workers would each hold a copy,
+    # miss each other's ingests and overwrite each other's files
+    if args.command == "serve" and args.workers != 1:
+        serve_parser.error(
+            "the API runs in one worker, since the ingest manifest and the "
+            "local and lexical indexes cannot be shared between processes; "
+            "requests are served concurrently within it"
+        )
+
+    # Deleting a whole namespace needs an explicit target, so a bare delete
+    # cannot wipe the default namespace
+    if args.command == "delete":
+        if args.namespace and args.default_namespace:
+            delete_parser.error("--namespace and --default-namespace exclude each other")
+        if not (args.namespace or args.source or args.default_namespace):
+            delete_parser.error(
+                "give --namespace, --source, or --default-namespace --yes"
+            )
+        if args.default_namespace and not args.source and not args.yes:
+            delete_parser.error("deleting the default namespace needs --yes")
+
     # Check if dependencies are installed
     if not check_dependencies():
         install_dependencies()
 
+    if args.command == "serve":
+        serve(args.host, args.port)
+        return
+    if args.command in ("export", "import", "delete"):
+        manage_namespace(args)
+        return
+
     # Run the Streamlit app
     print("Starting RAG Chatbot...")
     subprocess.call(["streamlit", "run", "app/app.py"])
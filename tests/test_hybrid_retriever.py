@@ -0,0 +1,99 @@
+"""
+Exact identifier lookups through the lexical index and the hybrid retriever.
+
+Every chunk of the synthetic corpus states the access code of one project in
+the same words, so a question naming a project shares most of its terms with
+every chunk and only the project name tells them apart.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from langchain_core.documents import Document
+
+from utils.fakes import FakeEmbeddings
+from utils.hybrid_retriever import HybridRetriever
+from utils.lexical_index import BM25Index
+from utils.vector_store import VectorStoreManager
+
+SIZES = [20, 50, 100, 500]
+
+
+def make_chunks(num_chunks, seed=0):
+    """Build chunks stating one access code each among shared filler words."""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(300)]
+    return [
+        Document(
+            page_content=(
+                " ".join(rng.choices(vocabulary, k=40))
+                + f" The access code of project Orion{i}x{i % 7} is {rng.randrange(10**6)}. "
+                + " ".join(rng.choices(vocabulary, k=40))
+            ),
+            metadata={"file_name": f"doc-{i % 10}.txt", "project": f"Orion{i}x{i % 7}"},
+        )
+        for i in range(num_chunks)
+    ]
+
+
+def questions(num_chunks, count=10):
+    """Pick projects to ask for the access code of."""
+    projects = random.Random(1).sample(range(num_chunks), min(count, num_chunks))
+    return [
+        (f"What is the access code of project Orion{i}x{i % 7}?", f"Orion{i}x{i % 7}")
+        for i in projects
+    ]
+
+
+@pytest.mark.parametrize("prune_min_documents", [10000, 1])
+@pytest.mark.parametrize("num_chunks", SIZES)
+def test_lexical_index_ranks_identifier_first(tmp_path, num_chunks, prune_min_documents):
+    index = BM25Index(str(tmp_path), prune_min_documents=prune_min_documents)
+    chunks = make_chunks(num_chunks)
+    index.add([f"chunk-{i}" for i in range(num_chunks)], chunks)
+
+    for question, project in questions(num_chunks):
+        results = index.search(question, k=4)
+        assert results[0][0].metadata["project"] == project
+        assert project.lower() in index.rare_terms(question)
+
+
+@pytest.mark.parametrize("num_chunks", SIZES)
+def test_hybrid_retriever_keeps_identifier_match(tmp_path, monkeypatch, num_chunks):
+    monkeypatch.setenv("HYBRID_SEARCH", "true")
+    monkeypatch.setenv("INGEST_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    manager = VectorStoreManager(
+        backend="local",
+        pinecone_index_name="test",
+        local_index_dir=str(tmp_path / "local_index"),
+        manifest_dir=str(tmp_path / "manifests"),
+        lexical_index_dir=str(tmp_path / "lexical_index"),
+        embedding_cache_path=str(tmp_path / "embeddings.sqlite"),
+        embeddings=FakeEmbeddings(dimension=64, semantic=True),
+        embedding_dimension=64,
+    )
+    manager.add_documents(make_chunks(num_chunks), namespace="test")
+    retriever = HybridRetriever(
+        vector_store=manager.get_vector_store(),
+        lexical_index=manager.lexical_index,
+        namespace="test",
+        k=4,
+    )
+
+    for question, project in questions(num_chunks):
+        documents = retriever.get_relevant_documents(question)
+        assert project in [document.metadata["project"] for document in documents]
+
+
+def test_common_terms_are_not_rare(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add([f"chunk-{i}" for i in range(50)], make_chunks(50))
+
+    assert index.rare_terms("What is the access code of a project?") == set()
@@ -0,0 +1,109 @@
+"""
+Persistence of the local vector index.
+
+Usage:
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import numpy as np
+import pytest
+
+from utils.local_index import LocalVectorIndex
+
+
+def vectors(count, dimension=8, offset=0):
+    """Build records with distinct IDs and random values."""
+    rng = np.random.default_rng(offset)
+    return [
+        {
+            "id": f"v{offset + i}",
+            "values": rng.standard_normal(dimension).tolist(),
+            "metadata": {"text": f"chunk {offset + i}"},
+        }
+        for i in range(count)
+    ]
+
+
+def counts(index):
+    """Get the vector count of every namespace."""
+    return {
+        name: summary["vector_count"]
+        for name, summary in index.describe_index_stats()["namespaces"].items()
+    }
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_saves_keep_one_complete_generation(tmp_path, quantization):
+    index = LocalVectorIndex(str(tmp_path), dimension=8, quantization=quantization)
+    index.upsert(vectors(5), namespace="docs")
+    index.flush()
+    index.upsert(vectors(3, offset=5), namespace="docs")
+    index.flush()
+
+    namespace_dir = tmp_path / "docs"
+    generations = [entry for entry in os.listdir(namespace_dir) if entry.startswith("gen-")]
+    assert len(generations) == 1
+    assert (namespace_dir / "CURRENT").read_text() == generations[0]
+    reloaded = LocalVectorIndex(str(tmp_path), dimension=8, quantization=quantization)
+    assert counts(reloaded) == {"docs": 8}
+
+
+def test_interrupted_save_keeps_previous_generation(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=8)
+    index.upsert(vectors(5), namespace="docs")
+    index.flush()
+
+    # A save that crashed before switching CURRENT leaves a partial generation
+    partial = tmp_path / "docs" / "gen-partial"
+    partial.mkdir()
+    np.save(partial / "vectors.npy", np.zeros((2, 8), dtype=np.float32))
+
+    reloaded = LocalVectorIndex(str(tmp_path), dimension=8)
+    assert counts(reloaded) == {"docs": 5}
+
+
+def test_loads_and_migrates_files_saved_before_generations(tmp_path):
+    namespace_dir = tmp_path / "docs"
+    namespace_dir.mkdir()
+    records = vectors(4)
+    np.save(
+        namespace_dir / "vectors.npy",
+        np.asarray([record["values"] for record in records], dtype=np.float32),
+    )
+    (namespace_dir / "meta.json").write_text(
+        json.dumps(
+            {
+                "ids": [record["id"] for record in records],
+                "metadata": [record["metadata"] for record in records],
+            }
+        )
+    )
+
+    index = LocalVectorIndex(str(tmp_path), dimension=8)
+    assert counts(index) == {"docs": 4}
+    index.upsert(vectors(1, offset=4), namespace="docs")
+    index.flush()
+
+    assert not (namespace_dir / "vectors.npy").exists()
+    assert counts(LocalVectorIndex(str(tmp_path), dimension=8)) == {"docs": 5}
+
+
+def test_corrupt_namespace_is_skipped(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=8)
+    index.upsert(vectors(5), namespace="docs")
+    index.upsert(vectors(3), namespace="other")
+    index.flush()
+
+    generation = (tmp_path / "docs" / "CURRENT").read_text()
+    meta_path = tmp_path / "docs" / generation / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    meta["ids"] = meta["ids"][:2]
+    meta_path.write_text(json.dumps(meta))
+
+    assert counts(LocalVectorIndex(str(tmp_path), dimension=8)) == {"other": 3}
@@ -0,0 +1,71 @@
+"""
+Splitting of broad questions into sub-queries and merging of their results.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from langchain_core.documents import Document
+
+from utils.multi_query import interleave, split_question
+
+
+@pytest.mark.parametrize(
+    "question, queries",
+    [
+        (
+            "What are the access codes of project A and B?",
+            [
+                "What are the access codes of project A",
+                "What are the access codes of project B",
+            ],
+        ),
+        (
+            "What are the access codes of project Orion and project Vega?",
+            [
+                "What are the access codes of project Orion",
+                "What are the access codes of project Vega",
+            ],
+        ),
+        (
+            "What do ERR-1042, ERR-2001 and ERR-3003 mean?",
+            [],
+        ),
+        (
+            "Explain ERR-1042, ERR-2001 and ERR-3003",
+            ["Explain ERR-1042", "Explain ERR-2001", "Explain ERR-3003"],
+        ),
+        ("Compare Redis and Memcached", ["Compare Redis", "Compare Memcached"]),
+    ],
+)
+def test_split_question_splits_names(question, queries):
+    assert split_question(question) == queries
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What are the pros and cons of caching?",
+        "How do I install and configure the server?",
+        "What is black and white thinking?",
+        "How does our Q and A process work?",
+        "Is it fast, and does it scale?",
+    ],
+)
+def test_split_question_keeps_word_pairs(question):
+    assert split_question(question) == []
+
+
+def test_interleave_keeps_question_results_first():
+    question = [Document(page_content=f"q{i}") for i in range(4)]
+    sub_query = [Document(page_content=f"s{i}") for i in range(4)]
+
+    documents = interleave([question, sub_query], k=4, lead=2)
+
+    assert [document.page_content for document in documents] == ["q0", "q1", "s0", "s1"]
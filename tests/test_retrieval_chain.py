@@ -0,0 +1,78 @@
+"""
+Condensing of follow-up questions by the conversational retrieval chain.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.fakes import FakeChatModel
+from utils.retrieval_chain import FastConversationalRetrievalChain, is_standalone_question
+
+
+class RecordingRetriever(BaseRetriever):
+    """Retriever returning one document per query and recording the run tags."""
+
+    calls: List = []
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        self.calls.append((query, list(run_manager.tags)))
+        return [Document(page_content=f"The answer to {query} is 42.")]
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Why does the embedding cache evict entries early?",
+        "How large is the local index of project Orion?",
+    ],
+)
+def test_standalone_questions(question):
+    assert is_standalone_question(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "And what about project Vega?",
+        "Why is that?",
+        "How large is it?",
+    ],
+)
+def test_follow_ups_need_condensing(question):
+    assert not is_standalone_question(question)
+
+
+@pytest.mark.parametrize("speculative_retrieval", [False, True])
+def test_speculative_retrieval_runs_under_its_own_child(speculative_retrieval):
+    retriever = RecordingRetriever(calls=[])
+    chain = FastConversationalRetrievalChain.from_llm(
+        llm=FakeChatModel(),
+        retriever=retriever,
+        speculative_retrieval=speculative_retrieval,
+    )
+
+    chain({"question": "How large is it?", "chat_history": [("Hi", "Hello")]})
+
+    speculative = [tags for _, tags in retriever.calls if "speculative" in tags]
+    assert len(speculative) == int(speculative_retrieval)
+
+
+def test_speculative_retrieval_is_off_by_default():
+    chain = FastConversationalRetrievalChain.from_llm(
+        llm=FakeChatModel(), retriever=RecordingRetriever(calls=[])
+    )
+
+    assert not chain.speculative_retrieval
@@ -0,0 +1,64 @@
+"""
+Conversation histories of the HTTP API kept in the session store.
+
+Usage:
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langchain_core.documents import Document
+
+import server
+import utils.chatbot
+from utils.fakes import FakeChatModel, FakeEmbeddings
+from utils.session_store import SQLiteSessionStore
+from utils.vector_store import VectorStoreManager
+
+
+def test_sessions_store_summaries_of_older_turns(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setenv("MEMORY_TOKEN_LIMIT", "30")
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+    monkeypatch.setattr(server, "get_session_store", lambda: store)
+    # Summaries take longer than the answers, so they are still running
+    # when the response is done
+    model = FakeChatModel(latency=0.05)
+    monkeypatch.setattr(utils.chatbot, "get_chat_model", lambda *args, **kwargs: model)
+
+    manager = VectorStoreManager(
+        backend="local",
+        openai_api_key="test",
+        pinecone_index_name="test",
+        local_index_dir=str(tmp_path / "local_index"),
+        manifest_dir=str(tmp_path / "manifests"),
+        lexical_index_dir=str(tmp_path / "lexical_index"),
+        embedding_cache_path=str(tmp_path / "embeddings.sqlite"),
+        embeddings=FakeEmbeddings(dimension=16),
+        embedding_dimension=16,
+    )
+    manager.add_documents(
+        [
+            Document(
+                page_content=f"The access code of project Orion{i} is {1000 + i}.",
+                metadata={"file_name": "codes.txt"},
+            )
+            for i in range(5)
+        ],
+        namespace="test",
+    )
+
+    for i in range(5):
+        chatbot = server.create_chatbot(manager, "session")
+        asyncio.run(
+            chatbot.achat(f"What is the access code of project Orion{i}?", namespace="test")
+        )
+        asyncio.run(server.save_session("session", chatbot))
+
+    state = store.load("session")
+    assert state["summary"]
+    assert state["pending"] == []
@@ -0,0 +1,128 @@
+"""
+Deletion, export and import of the chunks of a namespace.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from langchain_core.documents import Document
+
+from utils.embedding_cache import CachedEmbeddings
+from utils.fakes import FakeEmbeddings
+from utils.ingest_manifest import source_prefix
+from utils.vector_store import VectorStoreManager
+
+
+class UnlistableIndex:
+    """Index without a list method, like pinecone-client 2.2.4 or a pod-based index."""
+
+    def __init__(self, index, fail_upserts=False):
+        self._index = index
+        self._fail_upserts = fail_upserts
+
+    def __getattr__(self, name):
+        if name == "list":
+            raise AttributeError(name)
+        return getattr(self._index, name)
+
+    def upsert(self, *args, **kwargs):
+        if self._fail_upserts:
+            raise RuntimeError("upsert failed")
+        return self._index.upsert(*args, **kwargs)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("HYBRID_SEARCH", "true")
+    monkeypatch.setenv("INGEST_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    manager = VectorStoreManager(
+        backend="local",
+        pinecone_index_name="test",
+        local_index_dir=str(tmp_path / "local_index"),
+        manifest_dir=str(tmp_path / "manifests"),
+        lexical_index_dir=str(tmp_path / "lexical_index"),
+        embedding_cache_path=str(tmp_path / "embeddings.sqlite"),
+        embeddings=FakeEmbeddings(dimension=16),
+        embedding_dimension=16,
+    )
+    manager.add_documents(
+        [
+            Document(
+                page_content=f"Chunk {i} of doc-{i % 2}.txt",
+                metadata={"file_name": f"doc-{i % 2}.txt", "file_hash": f"hash-{i % 2}"},
+            )
+            for i in range(10)
+        ],
+        namespace="test",
+    )
+    return manager
+
+
+def test_delete_source_without_list_or_manifest(manager):
+    manager.manifest.remove("test", "doc-0.txt")
+    manager.index = UnlistableIndex(manager.index)
+
+    stats = manager.delete_source("doc-0.txt", namespace="test")
+
+    assert stats == {"deleted": 5}
+    assert manager.namespace_stats()["test"] == 5
+    assert manager.lexical_index.count("test") == 5
+    assert manager.lexical_index.ids("test", prefix=source_prefix("doc-0.txt")) == []
+
+
+def test_export_without_list_or_manifest_needs_manifest(manager, tmp_path):
+    manager.manifest.clear("test")
+    manager.index = UnlistableIndex(manager.index)
+
+    with pytest.raises(ValueError, match="manifest"):
+        manager.export_namespace(str(tmp_path / "test.npz"), namespace="test")
+    assert not os.path.exists(tmp_path / "test.npz")
+
+
+def test_failed_import_leaves_lexical_index_unchanged(manager, tmp_path):
+    path = str(tmp_path / "test.npz")
+    manager.export_namespace(path, namespace="test")
+    manager.index = UnlistableIndex(manager.index, fail_upserts=True)
+
+    with pytest.raises(RuntimeError):
+        manager.import_namespace(path, namespace="restored")
+
+    assert manager.lexical_index.count("restored") == 0
+    assert manager.list_sources("restored") == []
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_embedding_cache_stats_with_truncated_embeddings(tmp_path, monkeypatch, cached):
+    monkeypatch.setenv("INGEST_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    embeddings = FakeEmbeddings(dimension=16)
+    if cached:
+        embeddings = CachedEmbeddings(
+            embeddings, "fake", cache_path=str(tmp_path / "embeddings.sqlite")
+        )
+    manager = VectorStoreManager(
+        backend="local",
+        pinecone_index_name="test",
+        local_index_dir=str(tmp_path / "local_index"),
+        manifest_dir=str(tmp_path / "manifests"),
+        lexical_index_dir=str(tmp_path / "lexical_index"),
+        embeddings=embeddings,
+        embedding_dimension=16,
+        truncate_dimension=8,
+    )
+    manager.add_documents(
+        [Document(page_content="Some text", metadata={"file_name": "a.txt"})],
+        namespace="test",
+    )
+
+    stats = manager.embedding_cache_stats()
+
+    if cached:
+        assert stats["misses"] == 1
+    else:
+        assert stats is None